@@ -1,110 +1,330 @@
-from flask import Flask, render_template, jsonify, request, session
+from flask import Flask, Response, g, render_template, jsonify, request, session, stream_with_context
 import json
+import logging
 import os
-import numpy as np
+import time
 from datetime import datetime
-from voice_analyzer import VoiceAnalyzer
 from study_recommendations import StudyRecommendations
-import base64
-import cv2
-import random
+from micro_batcher import MicroBatcher
+from components import registry
+from session_store import create_session_store
+from session_rollups import ROLLUP_DAYS, ROLLUP_HOURS, window_start
+from emotion_aggregator import EMOTION_LABELS, EmotionAggregatorPool
+from audio_stream import AudioStream
+from inference_executor import InferenceExecutor, ExecutorSaturated
+from image_decode import FrameDecoder, decode_base64
+from frame_gate import FrameChangeGate, frame_signature
+from traffic_capture import TrafficRecorder
+from response_encoding import MSGPACK_MIMETYPE, compress_response, pack, wants_msgpack
+from face_tracker import FACE_DETECT_WIDTH
+from instrumentation import (metrics, timed, configure_logging, get_hot_logger,
+                             REQUEST_SECONDS, REJECTED_REQUESTS, STAGE_SECONDS, FRAMES)
+import queue
+import uuid
+import zlib
+from concurrent.futures import Future
 
-# Flag to track if real DeepFace is available
-DEEPFACE_AVAILABLE = False
+configure_logging()
+logger = logging.getLogger(__name__)
+# Per-request messages are sampled (LOG_SAMPLE_EVERY) so logging stays cheap under load
+request_logger = get_hot_logger(__name__)
 
 try:
-    from deepface import DeepFace
-    DEEPFACE_AVAILABLE = True
-    print("DeepFace loaded successfully!")
+    from flask_sock import Sock, ConnectionClosed
 except ImportError:
-    print("Warning: Could not import DeepFace. Using OpenCV-based emotion analysis.")
-    
-    class MockDeepFace:
-        """Fallback emotion analyzer using OpenCV face detection and image analysis"""
-        
-        # Load OpenCV's pre-trained face detector
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
-        @staticmethod
-        def analyze(img, actions=None, enforce_detection=True, detector_backend='opencv'):
-            """Analyze image for emotions using OpenCV-based heuristics"""
-            emotions = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
-            
-            # Convert to grayscale for analysis
-            if len(img.shape) == 3:
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = img
-            
-            # Detect faces
-            faces = MockDeepFace.face_cascade.detectMultiScale(gray, 1.1, 4)
-            
-            if len(faces) == 0:
-                # No face detected - return neutral with some variation
-                emotion_scores = {e: random.uniform(5, 15) for e in emotions}
-                emotion_scores['neutral'] = random.uniform(40, 60)
-            else:
-                # Face detected - analyze based on image properties
-                x, y, w, h = faces[0]
-                face_roi = gray[y:y+h, x:x+w]
-                
-                # Calculate image metrics
-                brightness = np.mean(face_roi)
-                contrast = np.std(face_roi)
-                
-                # Generate emotion scores based on image analysis
-                # Higher brightness tends toward happy, lower toward sad
-                # Higher contrast could indicate surprise or anger
-                
-                base_scores = {
-                    'happy': max(10, min(70, (brightness - 80) * 0.5 + random.uniform(10, 30))),
-                    'sad': max(5, min(50, (150 - brightness) * 0.3 + random.uniform(5, 15))),
-                    'surprise': max(5, min(40, (contrast - 40) * 0.5 + random.uniform(5, 15))),
-                    'angry': max(5, min(35, (contrast - 30) * 0.4 + random.uniform(5, 12))),
-                    'fear': max(3, min(25, random.uniform(5, 15))),
-                    'disgust': max(2, min(20, random.uniform(3, 10))),
-                    'neutral': max(10, min(50, (120 - abs(brightness - 120)) * 0.3 + random.uniform(10, 25)))
-                }
-                
-                # Normalize to sum to 100
-                total = sum(base_scores.values())
-                emotion_scores = {k: (v / total) * 100 for k, v in base_scores.items()}
-            
-            # Find dominant emotion
-            dominant = max(emotion_scores, key=emotion_scores.get)
-            
-            return [{
-                'dominant_emotion': dominant,
-                'emotion': emotion_scores,
-                'face_detected': len(faces) > 0
-            }]
-    
-    DeepFace = MockDeepFace()
+    logger.warning("flask-sock not installed. WebSocket streaming (/ws/emotion) disabled.")
+    Sock = None
 
-try:
-    from emotion_detector import EmotionDetector
-except ImportError:
-    print("Warning: Could not import EmotionDetector (DeepFace missing?). Using mock class.")
-    class EmotionDetector:
-        def analyze_webcam_emotion(self, duration):
-            return {
-                'dominant_emotion': 'neutral',
-                'emotion_percentages': {'neutral': 100.0},
-                'total_detections': 1,
-                'session_timestamp': datetime.now().isoformat()
-            }
+def warm_up():
+    """Load all models and run one dummy inference; call once per worker before serving"""
+    registry.warm_up()
+    inference_executor.start()
+    logger.info(registry.format_startup_report())
+
+# Inference worker processes are spawned, and a spawned process re-imports the
+# script that started the parent. Under `python app.py` that is this module,
+# imported as __mp_main__: the workers only need the model code, so the
+# session store, traffic log and preload are skipped there. (serve.py's web
+# workers are spawned too but import this module as 'app', so they are not.)
+SPAWNED_CHILD = __name__ == '__mp_main__'
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Change this in production
 
-# Initialize components
-emotion_detector = EmotionDetector()
-voice_analyzer = VoiceAnalyzer()
-study_recommender = StudyRecommendations()
+# Set TRAFFIC_LOG to record a sample (TRAFFIC_SAMPLE_RATE) of requests for
+# traffic_replay.py; '{pid}' in the path gives each worker its own file
+TRAFFIC_LOG = os.environ.get('TRAFFIC_LOG')
+TRAFFIC_SAMPLE_RATE = float(os.environ.get('TRAFFIC_SAMPLE_RATE', 1.0))
+traffic_recorder = None
+if TRAFFIC_LOG and not SPAWNED_CHILD:
+    # asgi.py records the routes it serves natively through the same recorder
+    traffic_recorder = TrafficRecorder(app.wsgi_app, TRAFFIC_LOG, sample_rate=TRAFFIC_SAMPLE_RATE)
+    app.wsgi_app = traffic_recorder
+
+# Initialize components (emotion and voice models load lazily via the registry)
+# RECOMMENDATIONS_FILE adds a JSON catalogue to the built-in recommendations;
+# RECOMMENDATION_MODE=blended draws them from every emotion in proportion to
+# its recent score instead of from the dominant emotion only;
+# RECOMMENDATION_SEED makes the picked items repeatable (e.g. for tests)
+RECOMMENDATIONS_FILE = os.environ.get('RECOMMENDATIONS_FILE')
+RECOMMENDATION_MODE = os.environ.get('RECOMMENDATION_MODE', 'dominant')
+RECOMMENDATION_SEED = os.environ.get('RECOMMENDATION_SEED')
+MAX_RECOMMENDATION_SESSIONS = 500
+study_recommender = StudyRecommendations(
+    catalogue_path=RECOMMENDATIONS_FILE,
+    seed=int(RECOMMENDATION_SEED) if RECOMMENDATION_SEED else None
+)
+
+# Session storage: 'memory' keeps bounded per-user partitions (lost on restart),
+# 'sqlite:<path>' persists sessions to disk
+SESSION_STORE = os.environ.get('SESSION_STORE', 'memory')
+MAX_STORED_SESSIONS = int(os.environ.get('MAX_STORED_SESSIONS', 10000))
+MAX_SESSIONS_PER_USER = int(os.environ.get('MAX_SESSIONS_PER_USER', 1000))
+# Locks the in-memory store's user partitions are spread over
+SESSION_STORE_SHARDS = int(os.environ.get('SESSION_STORE_SHARDS', 16))
+DEFAULT_HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
+# Buckets returned by /session_rollups unless ?hours= / ?days= ask for others
+# (up to ROLLUP_HOURS / ROLLUP_DAYS, the retention of the buckets)
+DEFAULT_ROLLUP_HOURS = 24
+DEFAULT_ROLLUP_DAYS = 7
+
+session_store = create_session_store('memory' if SPAWNED_CHILD else SESSION_STORE,
+                                     max_sessions=MAX_STORED_SESSIONS, max_sessions_per_user=MAX_SESSIONS_PER_USER,
+                                     shards=SESSION_STORE_SHARDS)
+
+def get_user_id():
+    """Identify the caller by X-User-Id header, or by an id kept in the Flask session cookie"""
+    user_id = request.headers.get('X-User-Id')
+    if user_id:
+        return user_id
+    if 'user_id' not in session:
+        session['user_id'] = uuid.uuid4().hex
+    return session['user_id']
+
+# Micro-batching of emotion inference: frames from concurrent requests are
+# grouped and analyzed together, flushing on batch size or a short deadline
+EMOTION_BATCH_SIZE = int(os.environ.get('EMOTION_BATCH_SIZE', 16))
+EMOTION_BATCH_WAIT_MS = float(os.environ.get('EMOTION_BATCH_WAIT_MS', 5))
+MAX_FRAMES_PER_REQUEST = 64
+MAX_TRANSCRIPTS_PER_REQUEST = 1000
+
+# Streamed voice uploads are read and analyzed this many bytes at a time
+AUDIO_STREAM_CHUNK_BYTES = 64 * 1024
+
+# Per-client running emotion statistics (sliding windows and EMA)
+emotion_aggregators = EmotionAggregatorPool()
+
+# Minimum seconds between saved sessions for a WebSocket emotion stream
+STREAM_SESSION_INTERVAL = float(os.environ.get('STREAM_SESSION_INTERVAL', 10))
 
-# Global in-memory storage for sessions
-# Data will be lost when server restarts
-user_sessions = []
+# Model inference runs on an executor: INFERENCE_WORKERS=0 runs it inline in
+# this process, N > 0 uses N worker processes with their own preloaded models
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 0))
+INFERENCE_MAX_PENDING = int(os.environ.get('INFERENCE_MAX_PENDING', 32))
+INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 10))
+EMOTION_MAX_QUEUED_FRAMES = int(os.environ.get('EMOTION_MAX_QUEUED_FRAMES', 256))
+RETRY_AFTER_SECONDS = 1
+
+inference_executor = InferenceExecutor(workers=INFERENCE_WORKERS, max_pending=INFERENCE_MAX_PENDING)
+
+def run_emotion_batch(items):
+    # Each queued item is an (image, client_id) pair
+    images = [image for image, _ in items]
+    client_ids = [client_id for _, client_id in items]
+    start = time.perf_counter()
+    future = inference_executor.submit('emotion_batch', images, client_ids=client_ids)
+    future.add_done_callback(lambda _: STAGE_SECONDS.observe(time.perf_counter() - start, 'emotion_batch'))
+    return future
+
+emotion_batcher = MicroBatcher(
+    run_emotion_batch,
+    max_batch_size=EMOTION_BATCH_SIZE,
+    max_wait_ms=EMOTION_BATCH_WAIT_MS,
+    max_pending=EMOTION_MAX_QUEUED_FRAMES
+)
+
+# Errors meaning the server is too busy; answered with 503/504 instead of 200
+OVERLOAD_ERRORS = (ExecutorSaturated, queue.Full, TimeoutError)
+
+def overload_error(error):
+    """Count a shed request and return its (payload, status): 504 if inference timed out, else 503"""
+    REJECTED_REQUESTS.inc('timeout' if isinstance(error, TimeoutError) else 'saturated')
+    if isinstance(error, TimeoutError):
+        return {
+            'success': False,
+            'error': 'Analysis timed out'
+        }, 504
+    return {
+        'success': False,
+        'error': 'Server busy, please retry',
+        'retry_after': RETRY_AFTER_SECONDS
+    }, 503
+
+def overload_response(error):
+    """503 + Retry-After when inference is saturated, 504 when it timed out"""
+    payload, status = overload_error(error)
+    response = api_response(payload, status)
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
+
+def api_response(payload, status=200):
+    """JSON response, or compact MessagePack if the client's Accept header prefers it"""
+    if wants_msgpack(request.accept_mimetypes):
+        response = Response(pack(payload, study_recommender.catalogue_version), status=status,
+                            mimetype=MSGPACK_MIMETYPE)
+        # Recommendations are sent as catalogue ids; see /recommendation_catalogue
+        response.headers['X-Catalogue-Version'] = study_recommender.catalogue_version
+    else:
+        response = jsonify(payload)
+        response.status_code = status
+    response.vary.add('Accept')
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, request.method, str(response.status_code))
+    return response
+
+@app.after_request
+def compress_large_response(response):
+    # Registered after the latency hook, so it runs first and is included in the latency
+    return compress_response(response, request.accept_encodings)
+
+# Frames are decoded per client at a reduced size chosen from its last face
+frame_decoder = FrameDecoder(FACE_DETECT_WIDTH)
+
+def decode_image(image_data, client_id=None):
+    """Decode a base64 data URL (or bare base64 string) into an image"""
+    try:
+        with timed('base64_decode'):
+            image_bytes = decode_base64(image_data)
+    except ValueError:
+        return None
+    return decode_image_bytes(image_bytes, client_id)
+
+def decode_image_bytes(image_bytes, client_id=None):
+    """
+    Decode raw JPEG/PNG bytes into an image for the emotion detector
+
+    Frames are decoded straight to grayscale when the detector only needs
+    gray, and at a reduced resolution once the client's face size is known.
+    """
+    grayscale = getattr(registry.get('emotion_detector'), 'grayscale_input', False)
+    with timed('imdecode'):
+        return frame_decoder.decode(image_bytes, client_id, grayscale=grayscale)
+
+# A client's frame that barely differs from its last analyzed one reuses
+# that result (FRAME_CHANGE_THRESHOLD / FRAME_REUSE_MAX_AGE)
+frame_gate = FrameChangeGate()
+
+def submit_frame(img, client_id):
+    """
+    Queue one decoded frame for batched emotion analysis
+
+    Returns:
+        Future: Resolves to the emotion result; already resolved, with
+        'reused': True, when the frame is unchanged since the client's last one
+    """
+    if frame_gate.enabled:
+        with timed('frame_gate'):
+            signature = frame_signature(img)
+            cached = frame_gate.lookup(client_id, signature)
+        if cached is not None:
+            FRAMES.inc('reused')
+            future = Future()
+            future.set_result(cached)
+            return future
+    else:
+        signature = None
+
+    future = emotion_batcher.submit((img, client_id))
+    FRAMES.inc('analyzed')
+
+    def remember(done):
+        if done.exception() is None:
+            result = done.result()
+            # With several faces the smallest one limits how far frames may be reduced
+            faces = result.get('faces')
+            region = min((face['region'] for face in faces), key=lambda r: r['w']) if faces else result.get('region')
+            frame_decoder.observe(client_id, img.shape, region)
+            if signature is not None:
+                frame_gate.store(client_id, signature, result)
+
+    future.add_done_callback(remember)
+    return future
+
+def analyze_frame(img, client_id):
+    """Analyze one decoded frame and wait for the result"""
+    return submit_frame(img, client_id).result(timeout=INFERENCE_TIMEOUT)
+
+def build_emotion_response(emotion_result, client_id=None, user_id=None, save_session=True, stress_level=None):
+    """Attach recommendations to an emotion result and save it as a session"""
+    # Convert numpy float32 to regular Python float for JSON serialization
+    emotion_percentages = {k: float(v) for k, v in emotion_result['emotion_percentages'].items()}
+    reused = emotion_result.get('reused', False)
+    faces = emotion_result.get('faces')
+    emotion_result = {
+        'dominant_emotion': emotion_result['dominant_emotion'],
+        'emotion_percentages': emotion_percentages,
+        'total_detections': 1,
+        'session_timestamp': emotion_result['session_timestamp']
+    }
+    
+    # Smooth over the client's recent frames so the dominant emotion doesn't flicker
+    aggregator = emotion_aggregators.get(client_id or user_id or get_user_id())
+    aggregator.update(emotion_percentages)
+    temporal = aggregator.summary()
+    
+    # Get study recommendations for the stable (windowed) emotion
+    with timed('recommendation'):
+        if RECOMMENDATION_MODE == 'blended':
+            recommendations = study_recommender.get_blended_recommendations(
+                temporal['last_10s'] or emotion_percentages, stress_level
+            )
+        else:
+            recommendations = study_recommender.get_recommendations(
+                temporal['dominant_emotion'] or emotion_result['dominant_emotion'], stress_level
+            )
+    
+    # Create session data object
+    session_data = {
+        'emotion_analysis': emotion_result,
+        'recommendations': recommendations,
+        'timestamp': datetime.now().isoformat()
+    }
+    
+    if save_session:
+        with timed('session_append'):
+            session_store.append(session_data, user_id=user_id or get_user_id())
+    
+    response = {
+        'success': True,
+        'emotion': emotion_result['dominant_emotion'],
+        'emotions': emotion_percentages,
+        'stable_emotion': temporal['dominant_emotion'],
+        'temporal': temporal,
+        'recommendations': recommendations,
+        'reused': reused
+    }
+    
+    # Multi-face mode (MAX_FACES_PER_FRAME > 1): 'emotion'/'emotions' are the group's
+    if faces is not None:
+        response['faces'] = [{
+            'emotion': face['dominant_emotion'],
+            'emotions': {k: float(v) for k, v in face['emotion_percentages'].items()},
+            'region': face['region']
+        } for face in faces]
+        response['face_count'] = len(faces)
+    
+    return response
 
 @app.route('/')
 def index():
@@ -118,83 +338,241 @@ def dashboard():
 
 @app.route('/analyze_emotion', methods=['POST'])
 def analyze_emotion():
-    """Analyze emotion from webcam image"""
+    """Analyze emotion from webcam image (base64 JSON, or a raw image/* body)"""
     try:
-        data = request.json
-        image_data = data['image'].split(',')[1]
-        
-        # Decode image
-        image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if request.mimetype.startswith('image/'):
+            data = {}
+            client_id = request.headers.get('X-Client-Id') or get_user_id()
+            img = decode_image_bytes(request.get_data(cache=False), client_id)
+        else:
+            data = request.json
+            client_id = data.get('client_id') or get_user_id()
+            img = decode_image(data['image'], client_id)
         
         # Debug: Check if image was decoded properly
-        if img is None or img.size == 0:
-            print("Error: Image could not be decoded")
-            return jsonify({
+        if img is None:
+            request_logger.warning("Image could not be decoded")
+            return api_response({
                 'success': False,
                 'error': 'Invalid image data'
             })
         
-        print(f"Image shape: {img.shape}")  # Debug output
+        request_logger.debug("Image shape: %s", img.shape)
         
-        # Analyze with DeepFace - using opencv detector for better accuracy
-        result = DeepFace.analyze(
-            img, 
-            actions=['emotion'], 
-            enforce_detection=False,
-            detector_backend='opencv'
-        )
+        # Queue the frame so it shares a model invocation with concurrent requests
+        # Frames are tagged with the client so its face can be tracked between frames
+        result = analyze_frame(img, client_id)
         
-        if isinstance(result, list):
-            result = result[0]
+        request_logger.debug("Dominant emotion: %s", result['dominant_emotion'])
         
-        print(f"DeepFace result: {result}")  # Debug output
+        response = build_emotion_response(result, client_id=client_id, stress_level=data.get('stress_level'))
+        request_logger.info("Emotion session saved")
         
-        # Convert numpy float32 to regular Python float for JSON serialization
-        emotion_percentages = {k: float(v) for k, v in result['emotion'].items()}
+        return api_response(response)
+            
+    except OVERLOAD_ERRORS as e:
+        return overload_response(e)
         
-        # Debug: Print emotion percentages
-        print(f"Emotion percentages: {emotion_percentages}")
-        print(f"Dominant emotion: {result['dominant_emotion']}")
+    except Exception as e:
+        logger.exception("Error in emotion analysis")
+        return api_response({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/analyze_emotion_frame', methods=['POST'])
+def analyze_emotion_frame():
+    """Analyze emotion from a raw binary JPEG body (no base64/JSON wrapping)"""
+    try:
+        client_id = request.headers.get('X-Client-Id') or get_user_id()
+        img = decode_image_bytes(request.get_data(cache=False), client_id)
         
-        emotion_result = {
-            'dominant_emotion': result['dominant_emotion'],
-            'emotion_percentages': emotion_percentages,
-            'total_detections': 1,
-            'session_timestamp': datetime.now().isoformat()
-        }
+        if img is None:
+            return api_response({
+                'success': False,
+                'error': 'Invalid image data'
+            })
         
-        # Get study recommendations
-        recommendations = study_recommender.get_recommendations(
-            emotion_result['dominant_emotion']
-        )
+        result = analyze_frame(img, client_id)
         
-        # Create session data object
-        session_data = {
-            'emotion_analysis': emotion_result,
-            'recommendations': recommendations,
-            'timestamp': datetime.now().isoformat()
-        }
+        return api_response(build_emotion_response(result, client_id=client_id))
         
-        # Save to in-memory list instead of file
-        user_sessions.append(session_data)
-        print("Emotion session saved to memory")
+    except OVERLOAD_ERRORS as e:
+        return overload_response(e)
         
-        return jsonify({
-            'success': True,
-            'emotion': emotion_result['dominant_emotion'],
-            'emotions': emotion_percentages,
-            'recommendations': recommendations
+    except Exception as e:
+        logger.exception("Error in emotion analysis")
+        return api_response({
+            'success': False,
+            'error': str(e)
         })
+
+class EmotionStream:
+    """
+    State of one WebSocket emotion stream
+
+    Frames are numbered as they arrive, and a session is saved at most every
+    STREAM_SESSION_INTERVAL seconds so continuous monitoring doesn't flood
+    the history.
+    """
+
+    def __init__(self, user_id, client_id):
+        self.user_id = user_id
+        self.client_id = client_id
+        self.frame_number = 0
+        self.last_saved = None
+
+    def submit(self, message):
+        """Decode a binary frame and queue it; returns a Future, or None if the frame is invalid"""
+        self.frame_number += 1
+        img = decode_image_bytes(message, self.client_id)
+        if img is None:
+            return None
+        return submit_frame(img, self.client_id)
+
+    def respond(self, result):
+        """Response message for an analyzed frame"""
+        now = datetime.now()
+        save_session = self.last_saved is None or (now - self.last_saved).total_seconds() >= STREAM_SESSION_INTERVAL
+        if save_session:
+            self.last_saved = now
+        
+        response = build_emotion_response(result, client_id=self.client_id, user_id=self.user_id,
+                                          save_session=save_session)
+        response['frame'] = self.frame_number
+        return response
+
+    def error(self, error):
+        """Error message for a frame that could not be analyzed"""
+        if isinstance(error, OVERLOAD_ERRORS):
+            overload_error(error)
+            return {'success': False, 'frame': self.frame_number, 'error': 'Server busy, frame skipped',
+                    'retry_after': RETRY_AFTER_SECONDS}
+        return {'success': False, 'frame': self.frame_number, 'error': str(error)}
+
+# Reply to text messages on /ws/emotion, which only serve as keep-alives
+STREAM_PONG = {'success': True, 'type': 'pong'}
+
+if Sock is not None:
+    sock = Sock(app)
+    
+    @sock.route('/ws/emotion')
+    def emotion_stream(ws):
+        """
+        Stream emotion analysis over a WebSocket
+        
+        The client sends binary JPEG frames and receives one JSON text message
+        per frame. A session is saved at most every STREAM_SESSION_INTERVAL
+        seconds so continuous monitoring doesn't flood the history.
+        """
+        user_id = get_user_id()
+        stream = EmotionStream(user_id, request.args.get('client_id') or user_id)
+        
+        while True:
+            try:
+                message = ws.receive()
+            except ConnectionClosed:
+                break
+            if message is None:
+                break
+            if isinstance(message, str):
+                # Text messages are ignored apart from a keep-alive reply
+                ws.send(json.dumps(STREAM_PONG))
+                continue
             
+            try:
+                future = stream.submit(message)
+                if future is None:
+                    ws.send(json.dumps(stream.error('Invalid image data')))
+                    continue
+                
+                result = future.result(timeout=INFERENCE_TIMEOUT)
+                ws.send(json.dumps(stream.respond(result)))
+            except ConnectionClosed:
+                break
+            except Exception as e:
+                if not isinstance(e, OVERLOAD_ERRORS):
+                    logger.exception("Error in emotion stream")
+                ws.send(json.dumps(stream.error(e)))
+
+@app.route('/analyze_emotion_batch', methods=['POST'])
+def analyze_emotion_batch():
+    """Analyze emotion for several webcam frames in one request"""
+    try:
+        data = request.json
+        images = data.get('images') or []
+        
+        if not images:
+            return api_response({
+                'success': False,
+                'error': 'No images provided'
+            })
+        
+        if len(images) > MAX_FRAMES_PER_REQUEST:
+            return api_response({
+                'success': False,
+                'error': f'Too many images (max {MAX_FRAMES_PER_REQUEST} per request)'
+            })
+        
+        # Frames may come from different cameras; default to the caller's id for all of them
+        client_ids = data.get('client_ids') or [get_user_id()] * len(images)
+        if len(client_ids) != len(images):
+            return api_response({
+                'success': False,
+                'error': 'client_ids must have one entry per image'
+            })
+        
+        frames = [decode_image(image, client_id) for image, client_id in zip(images, client_ids)]
+        futures = iter([
+            submit_frame(img, client_id) for img, client_id in zip(frames, client_ids) if img is not None
+        ])
+        
+        results = []
+        for img, client_id in zip(frames, client_ids):
+            if img is None:
+                results.append({
+                    'success': False,
+                    'error': 'Invalid image data'
+                })
+            else:
+                result = next(futures).result(timeout=INFERENCE_TIMEOUT)
+                results.append(build_emotion_response(result, client_id=client_id,
+                                                      stress_level=data.get('stress_level')))
+        
+        request_logger.info("Batch of %d frames analyzed", len(images))
+        
+        return api_response({
+            'success': True,
+            'results': results
+        })
+        
+    except OVERLOAD_ERRORS as e:
+        return overload_response(e)
+        
     except Exception as e:
-        print(f"Error in emotion analysis: {str(e)}")
-        return jsonify({
+        logger.exception("Error in batch emotion analysis")
+        return api_response({
             'success': False,
             'error': str(e)
         })
 
+@app.route('/emotion_summary')
+def emotion_summary():
+    """Windowed emotion statistics (last 10s, last minute, session) for a client"""
+    client_id = request.args.get('client_id') or get_user_id()
+    aggregator = emotion_aggregators.peek(client_id)
+    
+    if aggregator is None:
+        return api_response({
+            'success': False,
+            'error': 'No emotion data for this client'
+        })
+    
+    return api_response({
+        'success': True,
+        'summary': aggregator.summary()
+    })
+
 @app.route('/analyze_voice', methods=['POST'])
 def analyze_voice():
     """Analyze voice from uploaded audio"""
@@ -203,18 +581,41 @@ def analyze_voice():
         if request.content_type and 'multipart/form-data' in request.content_type:
             # Audio file uploaded
             if 'audio' not in request.files:
-                return jsonify({
+                return api_response({
                     'success': False,
                     'error': 'No audio file provided'
                 })
             
-            # For now, return a simple analysis since we can't easily process audio on server
-            return jsonify({
-                'success': True,
+            audio_bytes = request.files['audio'].read()
+            try:
+                analysis = inference_executor.run('voice_file', audio_bytes, timeout=INFERENCE_TIMEOUT)
+            except ValueError as e:
+                return api_response({
+                    'success': False,
+                    'error': f'Could not decode audio: {e}'
+                })
+            
+            voice_result = {
                 'text': 'Audio received (server-side transcription not implemented)',
-                'stress_level': 'Medium',
-                'energy_level': 50.0,
-                'message': 'Voice recording successful. Please use browser-based speech recognition for full analysis.'
+                'stress_level': analysis['estimated_stress'],
+                'energy_level': analysis['energy_level'],
+                'features': analysis['features'],
+                'timestamp': analysis['timestamp']
+            }
+            
+            session_store.append({
+                'voice_analysis': voice_result,
+                'timestamp': datetime.now().isoformat()
+            }, user_id=get_user_id())
+            request_logger.info("Voice session saved")
+            
+            return api_response({
+                'success': True,
+                'text': voice_result['text'],
+                'stress_level': voice_result['stress_level'],
+                'energy_level': voice_result['energy_level'],
+                'features': voice_result['features'],
+                'message': 'Voice tone analyzed on the server. Use browser-based speech recognition for a transcript.'
             })
         else:
             # JSON data with transcript (from browser speech recognition)
@@ -222,94 +623,387 @@ def analyze_voice():
             transcript = data.get('transcript', '')
             
             if not transcript:
-                return jsonify({
+                return api_response({
                     'success': False,
                     'error': 'No transcript provided'
                 })
             
-            # Simple stress analysis based on text
-            word_count = len(transcript.split())
-            stress_level = 'Low' if word_count < 10 else ('Medium' if word_count < 20 else 'High')
+            # Lexicon-based stress and sentiment scoring of the words
+            analysis = registry.get('text_analyzer').analyze(transcript)
             
             voice_result = {
                 'text': transcript,
-                'stress_level': stress_level,
-                'energy_level': word_count * 5.0,
+                'stress_level': analysis['stress_level'],
+                'stress_score': analysis['stress_score'],
+                'sentiment': analysis['sentiment'],
+                'energy_level': analysis['energy_level'],
                 'timestamp': datetime.now().isoformat()
             }
             
-            # Create session data object
-            session_data = {
-                'voice_analysis': voice_result,
-                'timestamp': datetime.now().isoformat()
-            }
+            # Interim speech-recognition results are scored but not saved
+            if not data.get('interim'):
+                session_store.append({
+                    'voice_analysis': voice_result,
+                    'timestamp': datetime.now().isoformat()
+                }, user_id=get_user_id())
+                request_logger.info("Voice session saved")
             
-            # Save to in-memory list instead of file
-            user_sessions.append(session_data)
-            print("Voice session saved to memory")
+            return api_response(dict(voice_result, success=True, terms=analysis['terms']))
             
-            return jsonify({
-                'success': True,
-                'text': transcript,
-                'stress_level': stress_level,
-                'energy_level': word_count * 5.0,
-                'timestamp': datetime.now().isoformat()
+    except OVERLOAD_ERRORS as e:
+        return overload_response(e)
+        
+    except Exception as e:
+        logger.exception("Error in voice analysis")
+        return api_response({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/analyze_transcripts', methods=['POST'])
+def analyze_transcripts():
+    """
+    Score many transcripts at once without saving sessions
+    
+    Expects {"transcripts": ["...", ...]} and returns one result per
+    transcript with 'stress_level', 'stress_score', 'sentiment',
+    'energy_level', 'word_count' and the matched lexicon 'terms'.
+    """
+    try:
+        transcripts = (request.json or {}).get('transcripts')
+        if not isinstance(transcripts, list) or not transcripts:
+            return api_response({
+                'success': False,
+                'error': 'No transcripts provided'
             })
-            
+        if len(transcripts) > MAX_TRANSCRIPTS_PER_REQUEST:
+            return api_response({
+                'success': False,
+                'error': f'Too many transcripts (max {MAX_TRANSCRIPTS_PER_REQUEST} per request)'
+            })
+        
+        with timed('text_analysis'):
+            results = registry.get('text_analyzer').analyze_batch([str(text or '') for text in transcripts])
+        return api_response({
+            'success': True,
+            'results': results
+        })
+        
     except Exception as e:
-        print(f"Error in voice analysis: {str(e)}")
-        return jsonify({
+        logger.exception("Error in transcript analysis")
+        return api_response({
             'success': False,
             'error': str(e)
         })
 
+def open_audio_stream(args):
+    """Create an AudioStream from 'format' ('wav' or 'pcm16'), 'rate' and 'channels' parameters"""
+    return AudioStream(
+        registry.get('voice_analyzer'),
+        audio_format=args.get('format', 'wav'),
+        sample_rate=int(args.get('rate', 16000)),
+        channels=int(args.get('channels', 1))
+    )
+
+def save_voice_stream_result(result, user_id):
+    session_store.append({
+        'voice_analysis': {
+            'text': f"Streamed recording ({result['seconds']:.0f} s)",
+            'stress_level': result['stress_level'],
+            'energy_level': result['energy_level'],
+            'features': result['features'],
+            'timestamp': datetime.now().isoformat()
+        },
+        'timestamp': datetime.now().isoformat()
+    }, user_id=user_id)
+
+@app.route('/analyze_voice_stream', methods=['POST'])
+def analyze_voice_stream():
+    """
+    Analyze a long recording uploaded as a (chunked) request body
+    
+    The body is read in chunks and analyzed incrementally; the response is
+    newline-delimited JSON with interim results followed by a final one.
+    Query parameters: format ('wav' or 'pcm16'), rate and channels (pcm16 only).
+    An unsupported format, rate or channel count, or a bad WAV header, is
+    answered with 400 before any result is streamed.
+    """
+    first_interim = None
+    try:
+        audio_stream = open_audio_stream(request.args)
+        # Read up to the start of the audio before answering, so a bad format
+        # or WAV header gets a 400 rather than an error line in a 200 stream
+        while audio_stream.sample_rate is None:
+            chunk = request.stream.read(AUDIO_STREAM_CHUNK_BYTES)
+            if not chunk:
+                raise ValueError("Stream ended before any audio was received")
+            first_interim = audio_stream.feed(chunk)
+    except ValueError as e:
+        return api_response({
+            'success': False,
+            'error': str(e)
+        }, 400)
+    
+    user_id = get_user_id()
+    
+    def generate():
+        try:
+            if first_interim is not None:
+                yield json.dumps(dict(first_interim, success=True)) + '\n'
+            while True:
+                chunk = request.stream.read(AUDIO_STREAM_CHUNK_BYTES)
+                if not chunk:
+                    break
+                interim = audio_stream.feed(chunk)
+                if interim is not None:
+                    yield json.dumps(dict(interim, success=True)) + '\n'
+            
+            result = audio_stream.finish()
+            save_voice_stream_result(result, user_id)
+            yield json.dumps(dict(result, success=True)) + '\n'
+        except ValueError as e:
+            yield json.dumps({'success': False, 'final': True, 'error': str(e)}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+if Sock is not None:
+    @sock.route('/ws/voice')
+    def voice_stream(ws):
+        """
+        Stream audio over a WebSocket
+        
+        Connect with the same query parameters as /analyze_voice_stream, send
+        binary audio chunks and a text message 'end' when done. Interim results
+        are pushed as JSON text messages, followed by the final result.
+        """
+        user_id = get_user_id()
+        try:
+            audio_stream = open_audio_stream(request.args)
+        except ValueError as e:
+            ws.send(json.dumps({'success': False, 'final': True, 'error': str(e)}))
+            return
+        
+        while True:
+            try:
+                message = ws.receive()
+            except ConnectionClosed:
+                return
+            try:
+                if message is None or message == 'end':
+                    result = audio_stream.finish()
+                    save_voice_stream_result(result, user_id)
+                    ws.send(json.dumps(dict(result, success=True)))
+                    return
+                if isinstance(message, str):
+                    continue
+                interim = audio_stream.feed(message)
+                if interim is not None:
+                    ws.send(json.dumps(dict(interim, success=True)))
+            except ValueError as e:
+                ws.send(json.dumps({'success': False, 'final': True, 'error': str(e)}))
+                return
+
 @app.route('/get_recommendations', methods=['POST'])
 def get_recommendations():
     """Get study recommendations based on emotion and stress"""
     try:
         data = request.json
-        emotion = data.get('emotion')
+        stress_level = data.get('stress_level')
         
-        recommendations = study_recommender.get_recommendations(emotion)
+        # A full emotion score vector gives blended recommendations
+        if data.get('emotions'):
+            recommendations = study_recommender.get_blended_recommendations(data['emotions'], stress_level)
+        else:
+            recommendations = study_recommender.get_recommendations(data.get('emotion'), stress_level)
         
-        return jsonify({
+        return api_response({
             'success': True,
             'recommendations': recommendations
         })
         
     except Exception as e:
-        return jsonify({
+        return api_response({
             'success': False,
             'error': str(e)
         })
 
-@app.route('/session_history')
-def session_history():
-    """Get user session history from memory"""
+@app.route('/get_recommendations_bulk', methods=['POST'])
+def get_recommendations_bulk():
+    """
+    Recommendations for many sessions in one call
+    
+    Body: {"sessions": [{"emotion": ..., "stress_level": ...}, ...]}; a
+    session may give "emotions" (score vector) instead of "emotion", in
+    which case every session gets blended recommendations.
+    """
     try:
-        print("Session history route called")  # Debug
-        
-        # Return sessions sorted by timestamp (newest first)
-        # We use a copy to avoid modifying the original list during sort
-        sorted_sessions = sorted(
-            user_sessions, 
-            key=lambda x: x.get('timestamp', ''), 
-            reverse=True
-        )
+        sessions = request.json.get('sessions') or []
+        if len(sessions) > MAX_RECOMMENDATION_SESSIONS:
+            return api_response({
+                'success': False,
+                'error': f'Too many sessions (max {MAX_RECOMMENDATION_SESSIONS} per request)'
+            })
         
-        print(f"Returning {len(sorted_sessions)} sessions from memory")  # Debug
+        blended = any(s.get('emotions') for s in sessions)
+        recommendations = study_recommender.get_recommendations_bulk(
+            [((s.get('emotions') or {s.get('emotion') or 'neutral': 1.0}) if blended else s.get('emotion'),
+              s.get('stress_level')) for s in sessions],
+            blended=blended
+        )
         
-        return jsonify({
+        return api_response({
             'success': True,
-            'sessions': sorted_sessions[:50]  # Return last 50 sessions
+            'recommendations': recommendations
+        })
+        
+    except Exception as e:
+        return api_response({
+            'success': False,
+            'error': str(e)
+        })
+
+def _int_arg(args, name, default=None):
+    try:
+        return int(args[name])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+def session_history_page(args, caller_id=None):
+    """One page of history for the /session_history query parameters ('user=me' means caller_id)"""
+    limit = min(max(_int_arg(args, 'limit', DEFAULT_HISTORY_PAGE_SIZE), 1), MAX_HISTORY_PAGE_SIZE)
+    user_id = args.get('user')
+    if user_id == 'me':
+        user_id = caller_id
+    
+    sessions, next_cursor = session_store.page(
+        limit=limit,
+        before=_int_arg(args, 'cursor'),
+        user_id=user_id,
+        since=args.get('since')
+    )
+    
+    request_logger.debug("Returning %d sessions", len(sessions))
+    
+    return {
+        'success': True,
+        'sessions': sessions,
+        'next_cursor': next_cursor
+    }
+
+@app.route('/session_history')
+def session_history():
+    """
+    Get session history, newest first
+    
+    Query parameters:
+        limit: Page size (default 50, max 200)
+        cursor: next_cursor value from the previous page
+        user: 'me' to only return the caller's sessions, or an explicit user id
+        since: Only return sessions at or after this ISO timestamp
+    """
+    try:
+        caller_id = get_user_id() if request.args.get('user') == 'me' else None
+        return api_response(session_history_page(request.args, caller_id))
+        
+    except Exception as e:
+        logger.exception("Error in session_history")
+        return api_response({
+            'success': False,
+            'error': str(e)
         })
+
+def session_rollup_etag(user_id, hours, days):
+    """ETag of a rollup; changes with each new session in scope and each new hour"""
+    scope = zlib.crc32(user_id.encode('utf-8')) if user_id is not None else 'all'
+    first_hour, _ = window_start(hours, days)
+    return f"{scope}-{session_store.rollup_version(user_id)}-{hours}-{days}-{first_hour}"
+
+@app.route('/session_rollups')
+def session_rollups():
+    """
+    Precomputed session aggregates for the dashboard
+    
+    Totals, the emotion distribution and stress counts over all sessions, plus
+    the same figures per hour and per day. The aggregates are updated as each
+    session is stored, so this costs the same however long the history is.
+    Send the returned ETag back in If-None-Match to get an empty 304 while
+    nothing has changed.
+    
+    Query parameters:
+        user: 'me' for the caller's sessions, or an explicit user id (default all users)
+        hours: Hourly buckets, ending with the current hour (default 24, max ROLLUP_HOURS)
+        days: Daily buckets, ending with today (default 7, max ROLLUP_DAYS)
+    """
+    try:
+        user_id = request.args.get('user')
+        if user_id == 'me':
+            user_id = get_user_id()
+        hours = min(max(_int_arg(request.args, 'hours', DEFAULT_ROLLUP_HOURS), 1), ROLLUP_HOURS)
+        days = min(max(_int_arg(request.args, 'days', DEFAULT_ROLLUP_DAYS), 1), ROLLUP_DAYS)
+        
+        # Only the version is read before deciding whether the client is up to date
+        etag = session_rollup_etag(user_id, hours, days)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = api_response({
+                'success': True,
+                'rollups': session_store.rollup(user_id, hours=hours, days=days)
+            })
+        # Weak, as the same rollup is sent in several encodings (JSON, MessagePack, compressed)
+        response.set_etag(etag, weak=True)
+        # Browsers must revalidate, and shared caches must not serve one user's rollup to another
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.update(('Cookie', 'X-User-Id'))
+        return response
         
     except Exception as e:
-        print(f"Error in session_history: {str(e)}")  # Debug
-        return jsonify({
+        logger.exception("Error in session_rollups")
+        return api_response({
             'success': False,
             'error': str(e)
         })
 
+@app.route('/recommendation_catalogue')
+def recommendation_catalogue():
+    """
+    Every recommendation item text, indexed by id
+    
+    MessagePack responses send recommendations as these ids, and emotion
+    scores as arrays in the order of 'emotion_labels'. Clients keep the
+    catalogue until the X-Catalogue-Version of a response changes.
+    """
+    version = study_recommender.catalogue_version
+    if request.if_none_match.contains_weak(version):
+        response = Response(status=304)
+    else:
+        response = api_response({
+            'success': True,
+            'version': version,
+            'emotion_labels': EMOTION_LABELS,
+            'items': study_recommender.get_items()
+        })
+    response.set_etag(version, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/startup_report')
+def startup_report():
+    """Per-module import and model load costs for this worker"""
+    return api_response({
+        'success': True,
+        'report': registry.startup_report()
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Stage and request latency histograms in the Prometheus text format"""
+    return Response(metrics.expose(), mimetype='text/plain; version=0.0.4')
+
+# Set PRELOAD_MODELS=1 to warm up every worker process when it imports the app
+if os.environ.get('PRELOAD_MODELS') == '1' and not SPAWNED_CHILD:
+    warm_up()
+
 if __name__ == '__main__':
+    warm_up()
     app.run(debug=True)
@@ -0,0 +1,464 @@
+"""
+ASGI entry point for the emotion-aware study assistant
+
+Connections are served by an event loop instead of one thread each, so a
+node can keep thousands of idle WebSocket clients and polling browsers
+connected. The hot and long-lived routes are handled natively here:
+
+    /ws/emotion, /ws/voice      one coroutine per connection
+    /analyze_emotion_frame      body read without a thread; decoding runs on
+                                the CPU pool and inference is awaited
+    /session_history            history reads run on the I/O pool
+
+Frame decoding and audio analysis run on a bounded pool of CPU threads,
+session store reads and writes on a bounded pool of I/O threads. Every other
+route is passed to the Flask app through a WSGI bridge that runs at most
+ASGI_WSGI_THREADS requests at once; requests beyond that wait on the event
+loop without holding a thread.
+
+Run it with ``python serve.py`` (or any ASGI server: ``uvicorn asgi:application``).
+"""
+import asyncio
+import contextvars
+import io
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import dump_cookie, parse_accept_header, parse_cookie
+
+import app as flask_app
+from instrumentation import REQUEST_SECONDS
+from response_encoding import (COMPRESS_MIN_BYTES, MSGPACK_MIMETYPE, choose_encoding, compress, pack,
+                               wants_msgpack)
+
+logger = logging.getLogger(__name__)
+
+# Flask views (everything not handled natively) that may run at the same time
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 32))
+# Threads for frame decoding and audio analysis
+ASGI_CPU_THREADS = int(os.environ.get('ASGI_CPU_THREADS', os.cpu_count() or 4))
+# Threads for session store reads and writes
+ASGI_IO_THREADS = int(os.environ.get('ASGI_IO_THREADS', 8))
+# Largest request body accepted by the native HTTP routes
+ASGI_MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_BYTES', 16 * 1024 * 1024))
+
+wsgi_pool = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix='asgi-wsgi')
+cpu_pool = ThreadPoolExecutor(max_workers=ASGI_CPU_THREADS, thread_name_prefix='asgi-cpu')
+io_pool = ThreadPoolExecutor(max_workers=ASGI_IO_THREADS, thread_name_prefix='asgi-io')
+
+
+async def run_in(pool, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+
+async def wait_for_result(future):
+    """Await a concurrent Future from the inference pipeline, up to INFERENCE_TIMEOUT"""
+    # Shielded so a timeout doesn't cancel a frame that is already part of a batch
+    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), flask_app.INFERENCE_TIMEOUT)
+
+
+def _headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+def _query(scope):
+    return dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+
+
+def resolve_user(headers):
+    """
+    Caller's user id, the same way app.get_user_id() finds it
+
+    Returns:
+        tuple: (user_id, Set-Cookie header value or None); a cookie is
+        issued when the caller had neither an X-User-Id header nor a
+        session cookie holding a user id
+    """
+    user_id = headers.get('x-user-id')
+    if user_id:
+        return user_id, None
+
+    app = flask_app.app
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+    session = {}
+    cookie = parse_cookie(headers.get('cookie', '')).get(cookie_name)
+    if cookie:
+        try:
+            session = serializer.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+        except Exception:
+            session = {}
+    if session.get('user_id'):
+        return session['user_id'], None
+
+    session['user_id'] = uuid.uuid4().hex
+    return session['user_id'], dump_cookie(
+        cookie_name,
+        serializer.dumps(session),
+        path=app.config['SESSION_COOKIE_PATH'] or '/',
+        httponly=app.config['SESSION_COOKIE_HTTPONLY'],
+        samesite=app.config['SESSION_COOKIE_SAMESITE']
+    )
+
+
+async def read_body(receive, limit=ASGI_MAX_BODY_BYTES):
+    """Whole request body, or None if it is larger than ``limit``"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+
+def recording_receive(receive, chunks):
+    """Wrap ``receive`` so the request body chunks it returns are kept in ``chunks``"""
+    async def receive_and_keep():
+        message = await receive()
+        if message['type'] == 'http.request':
+            chunks.append(message.get('body', b''))
+        return message
+    return receive_and_keep
+
+
+async def send_payload(send, payload, request_headers, status=200, headers=()):
+    """Send a payload as JSON or MessagePack, compressed when large, as the Flask routes do"""
+    if wants_msgpack(parse_accept_header(request_headers.get('accept'), MIMEAccept)):
+        catalogue_version = flask_app.study_recommender.catalogue_version
+        body = pack(payload, catalogue_version)
+        headers = [('content-type', MSGPACK_MIMETYPE), ('x-catalogue-version', catalogue_version)] + list(headers)
+    else:
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        headers = [('content-type', 'application/json')] + list(headers)
+
+    encoding = None
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = choose_encoding(parse_accept_header(request_headers.get('accept-encoding')))
+    if encoding:
+        # Large bodies (history pages) are compressed off the event loop
+        body = await run_in(cpu_pool, compress, body, encoding)
+        headers.append(('content-encoding', encoding))
+
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers] +
+                   [(b'vary', b'Accept, Accept-Encoding'),
+                    (b'content-length', str(len(body)).encode('latin-1'))]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+# ---------------------------------------------------------------- HTTP routes
+
+async def analyze_emotion_frame(scope, receive, headers):
+    """Native /analyze_emotion_frame: same request and response as the Flask route"""
+    if scope['method'] != 'POST':
+        return {'success': False, 'error': 'Method not allowed'}, 405, ()
+
+    user_id, cookie = resolve_user(headers)
+    extra_headers = [('Set-Cookie', cookie)] if cookie else []
+    body = await read_body(receive)
+    if body is None:
+        return {'success': False, 'error': 'Request body too large'}, 413, extra_headers
+
+    client_id = headers.get('x-client-id') or user_id
+    try:
+        img = await run_in(cpu_pool, flask_app.decode_image_bytes, body, client_id)
+        if img is None:
+            return {'success': False, 'error': 'Invalid image data'}, 200, extra_headers
+
+        result = await wait_for_result(flask_app.submit_frame(img, client_id))
+        response = await run_in(io_pool, lambda: flask_app.build_emotion_response(
+            result, client_id=client_id, user_id=user_id))
+        return response, 200, extra_headers
+
+    except flask_app.OVERLOAD_ERRORS as e:
+        payload, status = flask_app.overload_error(e)
+        return payload, status, extra_headers + [('Retry-After', str(flask_app.RETRY_AFTER_SECONDS))]
+
+    except Exception as e:
+        logger.exception("Error in emotion analysis")
+        return {'success': False, 'error': str(e)}, 200, extra_headers
+
+
+async def session_history(scope, receive, headers):
+    """Native /session_history: the page is read on the I/O pool"""
+    args = _query(scope)
+    extra_headers = []
+    caller_id = None
+    if args.get('user') == 'me':
+        caller_id, cookie = resolve_user(headers)
+        if cookie:
+            extra_headers.append(('Set-Cookie', cookie))
+    try:
+        payload = await run_in(io_pool, flask_app.session_history_page, args, caller_id)
+        return payload, 200, extra_headers
+    except Exception as e:
+        logger.exception("Error in session_history")
+        return {'success': False, 'error': str(e)}, 200, extra_headers
+
+
+HTTP_ROUTES = {
+    '/analyze_emotion_frame': analyze_emotion_frame,
+    '/session_history': session_history
+}
+
+
+async def handle_http(scope, receive, send):
+    handler = HTTP_ROUTES.get(scope['path'])
+    if handler is None:
+        await wsgi_bridge(scope, receive, send)
+        return
+
+    start = time.perf_counter()
+    request_headers = _headers(scope)
+    recorder = flask_app.traffic_recorder
+    record = None
+    if recorder is not None and recorder.should_record(scope['path'], request_headers.get('content-length'),
+                                                       request_headers.get('transfer-encoding')):
+        record = recorder.start_record(scope['method'], scope['path'], scope.get('query_string', b'').decode('latin-1'),
+                                       lambda name: request_headers.get(name.lower()))
+        body = []
+        receive = recording_receive(receive, body)
+
+    payload, status, headers = await handler(scope, receive, request_headers)
+    await send_payload(send, payload, request_headers, status, headers)
+    elapsed = time.perf_counter() - start
+    REQUEST_SECONDS.observe(elapsed, scope['path'], scope['method'], str(status))
+    if record is not None:
+        await run_in(io_pool, recorder.finish_record, record, b''.join(body), status, elapsed * 1000.0)
+
+
+# ----------------------------------------------------------- WebSocket routes
+
+async def emotion_socket(scope, receive, send, user_id):
+    """Native /ws/emotion, with the same messages as the flask-sock route"""
+    stream = flask_app.EmotionStream(user_id, _query(scope).get('client_id') or user_id)
+
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+        if message.get('bytes') is None:
+            # Text messages are ignored apart from a keep-alive reply
+            await send({'type': 'websocket.send', 'text': json.dumps(flask_app.STREAM_PONG)})
+            continue
+
+        try:
+            future = await run_in(cpu_pool, stream.submit, message['bytes'])
+            if future is None:
+                response = stream.error('Invalid image data')
+            else:
+                result = await wait_for_result(future)
+                response = await run_in(io_pool, stream.respond, result)
+        except Exception as e:
+            if not isinstance(e, flask_app.OVERLOAD_ERRORS):
+                logger.exception("Error in emotion stream")
+            response = stream.error(e)
+        await send({'type': 'websocket.send', 'text': json.dumps(response)})
+
+
+async def voice_socket(scope, receive, send, user_id):
+    """Native /ws/voice, with the same messages as the flask-sock route"""
+    try:
+        audio_stream = flask_app.open_audio_stream(_query(scope))
+    except ValueError as e:
+        await send({'type': 'websocket.send', 'text': json.dumps({'success': False, 'final': True, 'error': str(e)})})
+        await send({'type': 'websocket.close', 'code': 1000})
+        return
+
+    while True:
+        message = await receive()
+        connected = message['type'] != 'websocket.disconnect'
+        try:
+            if not connected or message.get('text') == 'end':
+                # A dropped connection still saves what was received so far
+                result = await run_in(cpu_pool, audio_stream.finish)
+                await run_in(io_pool, flask_app.save_voice_stream_result, result, user_id)
+                response = dict(result, success=True)
+            elif message.get('bytes') is None:
+                continue
+            else:
+                interim = await run_in(cpu_pool, audio_stream.feed, message['bytes'])
+                if interim is not None:
+                    await send({'type': 'websocket.send', 'text': json.dumps(dict(interim, success=True))})
+                continue
+        except ValueError as e:
+            response = {'success': False, 'final': True, 'error': str(e)}
+        if connected:
+            await send({'type': 'websocket.send', 'text': json.dumps(response)})
+            await send({'type': 'websocket.close', 'code': 1000})
+        return
+
+
+WEBSOCKET_ROUTES = {
+    '/ws/emotion': emotion_socket,
+    '/ws/voice': voice_socket
+}
+
+
+async def handle_websocket(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    handler = WEBSOCKET_ROUTES.get(scope['path'])
+    if handler is None:
+        await send({'type': 'websocket.close', 'code': 1008})
+        return
+
+    user_id, cookie = resolve_user(_headers(scope))
+    accept = {'type': 'websocket.accept'}
+    if cookie:
+        accept['headers'] = [(b'set-cookie', cookie.encode('latin-1'))]
+    await send(accept)
+    await handler(scope, receive, send, user_id)
+
+
+# ------------------------------------------------------------------ WSGI bridge
+
+class _RequestBody(io.RawIOBase):
+    """wsgi.input that pulls body chunks from the event loop as the view reads them"""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b''
+        self._more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                self._more = False
+                break
+            self._buffer = message.get('body', b'')
+            self._more = message.get('more_body', False)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BufferedReader(body),
+        # The body ends where the ASGI stream ends, with or without Content-Length
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _start_wsgi(environ):
+    """Call the Flask app and produce its first body chunk (runs on a bridge thread)"""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    body = flask_app.app.wsgi_app(environ, start_response)
+    chunks = iter(body)
+    first = next(chunks, None)
+    return started, body, chunks, first
+
+
+async def wsgi_bridge(scope, receive, send):
+    """Run a Flask view on a bridge thread and stream its response back"""
+    loop = asyncio.get_running_loop()
+    environ = build_environ(scope, _RequestBody(receive, loop))
+    # Each call may land on a different bridge thread; running them all in one
+    # context keeps Flask's request context alive for streaming views
+    context = contextvars.copy_context()
+    started, body, chunks, chunk = await loop.run_in_executor(wsgi_pool, context.run, _start_wsgi, environ)
+    try:
+        await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            # Streaming views (e.g. /analyze_voice_stream) produce later chunks on the bridge thread
+            chunk = await loop.run_in_executor(wsgi_pool, context.run, next, chunks, None)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(body, 'close'):
+            await loop.run_in_executor(wsgi_pool, context.run, body.close)
+
+
+# -------------------------------------------------------------------- lifespan
+
+async def handle_lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await run_in(None, flask_app.warm_up)
+            except Exception as e:
+                logger.exception("Warm-up failed")
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await run_in(None, shutdown)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def shutdown():
+    """Finish queued frames, then stop the inference workers and thread pools"""
+    flask_app.emotion_batcher.close()
+    flask_app.inference_executor.shutdown()
+    for pool in (wsgi_pool, cpu_pool, io_pool):
+        pool.shutdown(wait=False)
+
+
+async def application(scope, receive, send):
+    """ASGI application: native async routes, Flask for everything else"""
+    if scope['type'] == 'http':
+        await handle_http(scope, receive, send)
+    elif scope['type'] == 'websocket':
+        await handle_websocket(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await handle_lifespan(scope, receive, send)
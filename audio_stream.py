@@ -0,0 +1,263 @@
+import struct
+
+import numpy as np
+
+from audio_features import FRAME_SECONDS, SILENCE_DB, extract_features, pcm_to_float
+
+# Emit an interim result after this many seconds of new audio
+INTERIM_SECONDS = 2.0
+# Length of the "recent" window reported with each interim result
+RECENT_SECONDS = 10.0
+# Accepted stream formats; anything else is rejected before analysis starts
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+MAX_CHANNELS = 8
+# A WAV stream whose 'data' chunk has not started within this many bytes is rejected
+MAX_WAV_HEADER_BYTES = 1024 * 1024
+
+
+class RunningStats:
+    """Count, mean and variance updated batch by batch (Chan et al. merge)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n = values.size
+        if n == 0:
+            return
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    @property
+    def std(self):
+        return (self._m2 / self.count) ** 0.5 if self.count else 0.0
+
+
+def check_format(sample_rate, channels):
+    """Raise ValueError unless a stream's sample rate and channel count can be analyzed"""
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise ValueError(f"Sample rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE} Hz")
+    if not 1 <= channels <= MAX_CHANNELS:
+        raise ValueError(f"Channels must be between 1 and {MAX_CHANNELS}")
+
+
+class WavHeaderParser:
+    """Incrementally parses a RIFF/WAVE header from the first chunks of a stream"""
+
+    def __init__(self):
+        self._buffer = b''
+        self.sample_rate = None
+        self.channels = None
+        self.sample_width = None
+
+    def feed(self, chunk):
+        """
+        Buffer bytes until the 'data' chunk starts
+
+        Returns:
+            bytes or None: Audio payload following the header once it has been
+            parsed, None while more header bytes are needed
+        """
+        self._buffer += chunk
+        data = self._buffer
+        if len(data) > MAX_WAV_HEADER_BYTES:
+            raise ValueError(f"No WAV 'data' chunk in the first {MAX_WAV_HEADER_BYTES} bytes")
+        if len(data) < 12:
+            return None
+        if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+            raise ValueError("Stream is not a RIFF/WAVE file")
+
+        offset = 12
+        while offset + 8 <= len(data):
+            chunk_id = data[offset:offset + 4]
+            size = struct.unpack('<I', data[offset + 4:offset + 8])[0]
+            body = offset + 8
+            if chunk_id == b'data':
+                if self.sample_rate is None:
+                    raise ValueError("WAV 'data' chunk before 'fmt ' chunk")
+                self._buffer = b''
+                return data[body:]
+            if body + size > len(data):
+                return None
+            if chunk_id == b'fmt ':
+                if size < 16:
+                    raise ValueError("WAV 'fmt ' chunk is too short")
+                audio_format, channels, sample_rate = struct.unpack('<HHI', data[body:body + 8])
+                bits = struct.unpack('<H', data[body + 14:body + 16])[0]
+                if audio_format not in (1, 0xFFFE) or bits not in (8, 16, 32):
+                    raise ValueError("Only 8/16/32-bit PCM WAV can be streamed")
+                check_format(sample_rate, channels)
+                self.sample_rate = sample_rate
+                self.channels = channels
+                self.sample_width = bits // 8
+            # RIFF chunks are padded to an even size
+            offset = body + size + (size & 1)
+        return None
+
+
+class AudioStream:
+    """Incremental voice analysis for long recordings
+
+    Audio arrives in arbitrary byte chunks (WAV with header, or raw
+    little-endian PCM16). Complete frames are analyzed as soon as they are
+    available and folded into running statistics; only the overlap between
+    frames and the last few seconds of per-frame summaries are kept, so
+    memory stays bounded however long the recording runs.
+    """
+
+    def __init__(self, analyzer, audio_format='wav', sample_rate=16000, channels=1,
+                 interim_seconds=INTERIM_SECONDS, recent_seconds=RECENT_SECONDS):
+        self.analyzer = analyzer
+        self.interim_seconds = interim_seconds
+        self.recent_seconds = recent_seconds
+
+        if audio_format == 'wav':
+            self._header = WavHeaderParser()
+            self.sample_rate = None
+        elif audio_format == 'pcm16':
+            self._header = None
+            self._configure(sample_rate, channels, 2)
+        else:
+            raise ValueError(f"Unsupported stream format: {audio_format}")
+
+        self._leftover = b''
+        self._pending = np.zeros(0, dtype=np.float32)
+        self.samples_seen = 0
+        self._samples_since_interim = 0
+
+        self.rms_db = RunningStats()
+        self.zcr = RunningStats()
+        self.pitch = RunningStats()
+        self.frames = 0
+        self.voiced_frames = 0
+        self._recent = []
+
+    def feed(self, chunk):
+        """
+        Add a chunk of audio bytes
+
+        Returns:
+            dict or None: An interim result when another ``interim_seconds``
+            of audio has been analyzed since the last one
+        """
+        if self._header is not None and self.sample_rate is None:
+            chunk = self._header.feed(chunk)
+            if chunk is None:
+                return None
+            self._configure(self._header.sample_rate, self._header.channels, self._header.sample_width)
+
+        samples = self._decode(chunk)
+        if samples.size:
+            self.samples_seen += samples.size
+            self._samples_since_interim += samples.size
+            self._pending = np.concatenate((self._pending, samples))
+            self._process(final=False)
+
+        if self._samples_since_interim >= self.interim_seconds * self.sample_rate:
+            self._samples_since_interim = 0
+            return self.result(final=False)
+        return None
+
+    def finish(self):
+        """Analyze whatever audio is left and return the final result"""
+        if self.sample_rate is None or self.samples_seen == 0:
+            raise ValueError("Stream ended before any audio was received")
+        self._process(final=True)
+        return self.result(final=True)
+
+    def result(self, final=False):
+        """Current stress estimate from the running statistics"""
+        recent = self._recent_stats()
+        energy_db = self.rms_db.mean if self.rms_db.count else SILENCE_DB
+        return {
+            'final': final,
+            'seconds': self.samples_seen / float(self.sample_rate),
+            'stress_level': self.analyzer.estimate_stress_level(energy_db, self.zcr.mean, self.pitch.std),
+            'energy_level': self.analyzer.energy_level(energy_db),
+            'recent_stress_level': self.analyzer.estimate_stress_level(
+                recent['rms_db_mean'], recent['zcr_mean'], recent['pitch_std']
+            ),
+            'features': {
+                'rms_db_mean': energy_db,
+                'rms_db_std': self.rms_db.std,
+                'zcr_mean': self.zcr.mean,
+                'pitch_mean': self.pitch.mean,
+                'pitch_std': self.pitch.std,
+                'voiced_ratio': self.voiced_frames / float(self.frames) if self.frames else 0.0
+            }
+        }
+
+    def _configure(self, sample_rate, channels, sample_width):
+        check_format(sample_rate, channels)
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_length = int(sample_rate * FRAME_SECONDS)
+        self.hop_length = self.frame_length // 2
+        self._dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[sample_width]
+
+    def _decode(self, chunk):
+        data = self._leftover + chunk
+        block = self.sample_width * self.channels
+        usable = len(data) - len(data) % block
+        self._leftover = data[usable:]
+        if usable == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        samples = pcm_to_float(np.frombuffer(data[:usable], dtype=self._dtype))
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1, dtype=np.float32)
+        return samples
+
+    def _process(self, final):
+        pending = self._pending
+        if final and self.frames == 0 and 0 < pending.size < self.frame_length:
+            # Short recording: analyze what there is as one zero-padded frame
+            pending = np.pad(pending, (0, self.frame_length - pending.size))
+        if pending.size < self.frame_length:
+            return
+
+        n_frames = 1 + (pending.size - self.frame_length) // self.hop_length
+        end = (n_frames - 1) * self.hop_length + self.frame_length
+        features = extract_features(pending[:end], self.sample_rate, self.frame_length, self.hop_length)
+
+        active = features['rms_db'] > SILENCE_DB
+        voiced = features['voiced']
+        self.rms_db.update(features['rms_db'][active])
+        self.zcr.update(features['zcr'][active])
+        self.pitch.update(features['pitch'][voiced])
+        self.frames += n_frames
+        self.voiced_frames += int(voiced.sum())
+
+        # Keep a per-batch summary for the recent window, then trim it
+        self._recent.append((
+            n_frames,
+            features['rms_db'][active].sum(), features['zcr'][active].sum(), int(active.sum()),
+            features['pitch'][voiced]
+        ))
+        max_frames = self.recent_seconds * self.sample_rate / self.hop_length
+        while len(self._recent) > 1 and sum(batch[0] for batch in self._recent[1:]) >= max_frames:
+            self._recent.pop(0)
+
+        # The unconsumed tail overlaps the next frame
+        self._pending = self._pending[n_frames * self.hop_length:].copy()
+
+    def _recent_stats(self):
+        active = sum(batch[3] for batch in self._recent)
+        pitches = [batch[4] for batch in self._recent if batch[4].size]
+        pitch = np.concatenate(pitches) if pitches else np.zeros(0)
+        return {
+            'rms_db_mean': sum(batch[1] for batch in self._recent) / active if active else SILENCE_DB,
+            'zcr_mean': sum(batch[2] for batch in self._recent) / active if active else 0.0,
+            'pitch_std': float(pitch.std()) if pitch.size else 0.0
+        }
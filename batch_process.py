@@ -0,0 +1,384 @@
+"""
+Offline emotion and voice analysis of recorded study sessions
+
+    python batch_process.py recordings/ --output results/ --stride 15 --format parquet
+
+Every video file found under the inputs is decoded every ``--stride`` frames
+and run through the emotion detector in batches; every audio file is cut into
+``--audio-window`` second windows that each get voice features and a stress
+level. Files are processed in parallel, one per worker process, each worker
+loading its own models.
+
+For each input file a table of per-frame (video) or per-window (audio)
+results is written to the output directory, next to a small JSON summary.
+Once all files are done the summaries are collected into one ``sessions``
+table. Files whose outputs already exist are skipped, so an interrupted run
+can simply be started again.
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from components import EMOTION_BACKENDS, registry
+from emotion_aggregator import EMOTION_LABELS
+from instrumentation import configure_logging
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v', '.mpg', '.mpeg'}
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.flac', '.ogg', '.oga', '.m4a', '.aac', '.opus'}
+FORMATS = ('npz', 'csv', 'parquet')
+
+# Voice features kept per audio window, from audio_features.summarize_features
+VOICE_FEATURES = ('rms_db_mean', 'zcr_mean', 'pitch_mean', 'pitch_std', 'voiced_ratio',
+                  'spectral_centroid', 'spectral_rolloff')
+
+# Fallback when a video does not report its frame rate
+DEFAULT_VIDEO_FPS = 30.0
+
+
+# ---------------------------------------------------------------- discovery
+
+def find_inputs(paths):
+    """Return (kind, path) for every video and audio file under the given files/directories"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(path)
+                for name in names
+            )
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            extension = os.path.splitext(candidate)[1].lower()
+            if extension in VIDEO_EXTENSIONS:
+                found.append(('video', candidate))
+            elif extension in AUDIO_EXTENSIONS:
+                found.append(('audio', candidate))
+    return found
+
+
+def output_name(path, roots):
+    """Output file prefix: the path relative to its input directory, with separators flattened"""
+    path = os.path.abspath(path)
+    for root in roots:
+        root = os.path.abspath(root)
+        if os.path.isdir(root) and path.startswith(root + os.sep):
+            path = os.path.relpath(path, root)
+            break
+    else:
+        path = os.path.basename(path)
+    return path.replace(os.sep, '__')
+
+
+# ---------------------------------------------------------------- writers
+
+def write_table(path, columns, fmt):
+    """
+    Write equally long 1-D arrays as one table
+
+    Args:
+        path: Output path without extension
+        columns: Ordered dict of column name -> array
+        fmt: 'npz', 'csv' or 'parquet'
+
+    Returns:
+        str: The path written
+    """
+    path = f"{path}.{fmt}"
+    if fmt == 'npz':
+        np.savez_compressed(path, **columns)
+    elif fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table({name: np.asarray(values) for name, values in columns.items()}), path)
+    else:
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns.keys())
+            writer.writerows(zip(*(np.asarray(values).tolist() for values in columns.values())))
+    return path
+
+
+def check_format(fmt):
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow ('pip install pyarrow'); use --format npz or csv")
+
+
+# ---------------------------------------------------------------- analysis
+
+def analyze_video(path, stride=1, batch_size=16, max_faces=1):
+    """
+    Analyze every ``stride``-th frame of a video file
+
+    Returns:
+        tuple: (columns, summary) - per-frame result arrays and the
+        file's session summary
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or DEFAULT_VIDEO_FPS
+    detector = registry.get('emotion_detector')
+
+    frame_numbers = []
+    scores = []
+    face_counts = []
+    batch = []
+    batch_numbers = []
+
+    def flush():
+        # The file path is the client id, so the face is tracked from frame to frame
+        for number, result in zip(batch_numbers, detector.analyze_batch(
+                batch, client_ids=[path] * len(batch), max_faces=max_faces)):
+            frame_numbers.append(number)
+            scores.append([result['emotion_percentages'].get(label, 0.0) for label in EMOTION_LABELS])
+            face_counts.append(result.get('face_count', int(result['face_detected'])))
+        batch.clear()
+        batch_numbers.clear()
+
+    number = 0
+    try:
+        while True:
+            # grab() skips a frame without converting it; only sampled frames are retrieved
+            if not capture.grab():
+                break
+            if number % stride == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    batch.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame)
+                    batch_numbers.append(number)
+                    if len(batch) >= batch_size:
+                        flush()
+            number += 1
+        if batch:
+            flush()
+    finally:
+        capture.release()
+
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1, len(EMOTION_LABELS))
+    face_counts = np.asarray(face_counts, dtype=np.int16)
+    dominant = np.asarray(EMOTION_LABELS)[scores.argmax(axis=1)] if len(scores) else np.asarray([], dtype='<U8')
+
+    columns = {
+        'frame': np.asarray(frame_numbers, dtype=np.int64),
+        'time': np.asarray(frame_numbers, dtype=np.float64) / fps,
+        'face_count': face_counts,
+        'dominant_emotion': dominant
+    }
+    for i, label in enumerate(EMOTION_LABELS):
+        columns[label] = scores[:, i]
+
+    # Session averages only count frames in which a face was found
+    with_face = face_counts > 0
+    summary = {
+        'duration': number / fps,
+        'analyzed': int(len(scores)),
+        'face_frames': int(with_face.sum())
+    }
+    if with_face.any():
+        mean = scores[with_face].mean(axis=0)
+        summary['emotions'] = {label: float(value) for label, value in zip(EMOTION_LABELS, mean)}
+        summary['dominant_emotion'] = EMOTION_LABELS[int(mean.argmax())]
+    return columns, summary
+
+
+def analyze_audio(path, window=10.0):
+    """
+    Voice features and stress level for each ``window`` seconds of an audio file
+
+    Returns:
+        tuple: (columns, summary) - per-window result arrays and the
+        file's session summary
+    """
+    from audio_features import decode_audio
+
+    analyzer = registry.get('voice_analyzer')
+    with open(path, 'rb') as f:
+        samples, sample_rate = decode_audio(f.read())
+
+    step = max(1, int(window * sample_rate))
+    rows = []
+    for start in range(0, len(samples), step):
+        segment = samples[start:start + step]
+        # A tail under a quarter window is too short to score on its own (the file summary covers it)
+        if rows and len(segment) < step // 4:
+            break
+        result = analyzer.analyze_audio(segment, sample_rate)
+        rows.append((start / float(sample_rate), (start + len(segment)) / float(sample_rate), result))
+
+    columns = {
+        'start': np.asarray([start for start, _, _ in rows], dtype=np.float64),
+        'end': np.asarray([end for _, end, _ in rows], dtype=np.float64),
+        'stress_level': np.asarray([result['estimated_stress'] for _, _, result in rows]),
+        'energy_level': np.asarray([result['energy_level'] for _, _, result in rows], dtype=np.float32)
+    }
+    for name in VOICE_FEATURES:
+        columns[name] = np.asarray([result['features'][name] for _, _, result in rows], dtype=np.float32)
+
+    whole = analyzer.analyze_audio(samples, sample_rate)
+    summary = {
+        'duration': len(samples) / float(sample_rate),
+        'analyzed': len(rows),
+        'stress_level': whole['estimated_stress'],
+        'energy_level': float(whole['energy_level'])
+    }
+    return columns, summary
+
+
+# ---------------------------------------------------------------- workers
+
+def _init_worker():
+    import cv2
+
+    configure_logging()
+    # One file per process already uses every core; avoid oversubscribing them
+    cv2.setNumThreads(1)
+
+
+def process_file(kind, path, prefix, options):
+    """Analyze one file and write its table and summary (runs in a worker process)"""
+    start = time.perf_counter()
+    if kind == 'video':
+        columns, summary = analyze_video(path, stride=options['stride'], batch_size=options['batch_size'],
+                                         max_faces=options['max_faces'])
+        table = write_table(prefix + '.frames', columns, options['format'])
+    else:
+        columns, summary = analyze_audio(path, window=options['audio_window'])
+        table = write_table(prefix + '.voice', columns, options['format'])
+
+    summary.update(file=path, kind=kind, table=os.path.basename(table),
+                   seconds=round(time.perf_counter() - start, 3))
+    # Written last: its presence marks the file as done
+    with open(prefix + '.summary.json', 'w') as f:
+        json.dump(summary, f)
+    return summary
+
+
+def write_sessions(summaries, output, fmt):
+    """Collect the per-file summaries into one sessions table"""
+    def column(key, default, dtype=None):
+        return np.asarray([summary.get(key, default) for summary in summaries], dtype=dtype)
+
+    columns = {
+        'path': column('file', ''),
+        'kind': column('kind', ''),
+        'duration': column('duration', np.nan, np.float64),
+        'analyzed': column('analyzed', 0, np.int64),
+        'face_frames': column('face_frames', 0, np.int64),
+        'dominant_emotion': column('dominant_emotion', ''),
+        'stress_level': column('stress_level', ''),
+        'energy_level': column('energy_level', np.nan, np.float32)
+    }
+    for label in EMOTION_LABELS:
+        columns[label] = np.asarray([(summary.get('emotions') or {}).get(label, np.nan) for summary in summaries],
+                                    dtype=np.float32)
+    return write_table(os.path.join(output, 'sessions'), columns, fmt)
+
+
+def run(inputs, output, options, workers=None):
+    """
+    Process every input file and write the sessions table
+
+    Returns:
+        tuple: (sessions table path, number of files that failed)
+    """
+    os.makedirs(output, exist_ok=True)
+    files = find_inputs(inputs)
+    summaries = []
+    pending = []
+    for kind, path in files:
+        prefix = os.path.join(output, output_name(path, inputs))
+        if options.get('skip_existing', True) and os.path.exists(prefix + '.summary.json'):
+            with open(prefix + '.summary.json') as f:
+                summaries.append(json.load(f))
+        else:
+            pending.append((kind, path, prefix))
+
+    logger.info("%d files found, %d already processed, %d to do", len(files), len(summaries), len(pending))
+
+    failed = 0
+    if pending:
+        workers = min(workers or os.cpu_count() or 1, len(pending))
+        # spawn, as for the inference workers: forked model state is not safe to reuse
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+            futures = {pool.submit(process_file, kind, path, prefix, options): path
+                       for kind, path, prefix in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error("[%d/%d] %s failed: %s", done, len(pending), path, e)
+                    continue
+                summaries.append(summary)
+                logger.info("[%d/%d] %s: %.0f s of %s in %.1f s", done, len(pending), path,
+                            summary['duration'], summary['kind'], summary['seconds'])
+
+    summaries.sort(key=lambda summary: summary['file'])
+    return write_sessions(summaries, output, options['format']), failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze recorded study sessions (video and audio files)")
+    parser.add_argument('inputs', nargs='+', help="Video/audio files or directories (searched recursively)")
+    parser.add_argument('--output', '-o', required=True, help="Directory for the result tables")
+    parser.add_argument('--format', choices=FORMATS, default='npz', help="Table format (default npz)")
+    parser.add_argument('--stride', type=int, default=15,
+                        help="Analyze every Nth video frame (default 15, i.e. 2 per second at 30 fps)")
+    parser.add_argument('--batch-size', type=int, default=16, help="Video frames per model call")
+    parser.add_argument('--max-faces', type=int, default=1,
+                        help="Faces analyzed per frame; above 1 the frame gets the group emotion")
+    parser.add_argument('--audio-window', type=float, default=10.0,
+                        help="Seconds of audio per voice analysis window (default 10)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--backend', choices=('auto',) + tuple(EMOTION_BACKENDS), default=None,
+                        help="Emotion backend for the workers (default: EMOTION_BACKEND)")
+    parser.add_argument('--overwrite', action='store_true', help="Reprocess files that already have results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging()
+    check_format(args.format)
+    if args.stride < 1 or args.batch_size < 1 or args.max_faces < 1 or args.audio_window <= 0:
+        raise SystemExit("--stride, --batch-size and --max-faces must be at least 1, --audio-window positive")
+
+    if args.backend:
+        # Inherited by the worker processes, which load the models
+        os.environ['EMOTION_BACKEND'] = args.backend
+
+    options = {
+        'format': args.format,
+        'stride': args.stride,
+        'batch_size': args.batch_size,
+        'max_faces': args.max_faces,
+        'audio_window': args.audio_window,
+        'skip_existing': not args.overwrite
+    }
+    start = time.perf_counter()
+    sessions, failed = run(args.inputs, args.output, options, workers=args.workers)
+    logger.info("Sessions written to %s in %.1f s", sessions, time.perf_counter() - start)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,346 @@
+"""
+Latency and throughput benchmarks for the emotion, voice and recommendation paths
+
+Every case is run against synthetic frames, audio and transcripts, both as
+direct function calls and through the Flask test client. The OpenCV-based
+fallback backend is used unless EMOTION_BACKEND is set, so the benchmark
+runs offline and needs no model downloads.
+
+Usage:
+    python benchmark.py                          # run every case, print a table
+    python benchmark.py --only http.             # cases whose name starts with 'http.'
+    python benchmark.py --output bench.json      # also write the results as JSON
+    python benchmark.py --compare bench.json     # show the change against an earlier run
+"""
+import argparse
+import base64
+import io
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import wave
+from datetime import datetime
+
+os.environ.setdefault('EMOTION_BACKEND', 'opencv')
+
+import cv2
+import numpy as np
+
+from components import registry
+from response_encoding import MSGPACK_MIMETYPE, decompress, unpack
+
+EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+STRESS_LEVELS = ['Low', 'Medium', 'High']
+
+TRANSCRIPT_WORDS = (
+    "I think the exam is tomorrow and I still have three chapters to review "
+    "this problem set is really hard but the lecture notes help a lot maybe "
+    "I should take a break first then go over the practice questions again"
+).split()
+
+
+# ---------------------------------------------------------------- generators
+
+def synthetic_frames(count, seed=0, width=640, height=480):
+    """Webcam-like BGR frames: a lit background, noise and a drawn face"""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(60, 180, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    frames = []
+    for _ in range(count):
+        frame = gradient + rng.normal(0, 12, (height, width, 3)).astype(np.float32)
+        frame = np.clip(frame, 0, 255).astype(np.uint8)
+
+        # A face-like blob with eyes and a mouth, drifting between frames
+        cx = width // 2 + int(rng.integers(-40, 41))
+        cy = height // 2 + int(rng.integers(-30, 31))
+        size = int(rng.integers(70, 110))
+        cv2.ellipse(frame, (cx, cy), (size, int(size * 1.25)), 0, 0, 360, (150, 170, 200), -1)
+        for dx in (-size // 3, size // 3):
+            cv2.circle(frame, (cx + dx, cy - size // 4), size // 8, (40, 40, 40), -1)
+        cv2.ellipse(frame, (cx, cy + size // 2), (size // 3, size // 8), 0, 0, 180, (60, 50, 120), -1)
+        frames.append(frame)
+    return frames
+
+
+def synthetic_audio(seconds, seed=0, sample_rate=16000):
+    """Speech-like mono float32 audio: a gliding harmonic tone with syllable bursts and noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate), dtype=np.float64) / sample_rate
+    pitch = rng.uniform(110, 220) * (1.0 + 0.1 * np.sin(2 * np.pi * 0.7 * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 5))
+    syllables = np.clip(np.sin(2 * np.pi * rng.uniform(2.5, 4.5) * t), 0, None)
+    samples = 0.3 * voice * syllables + rng.normal(0, 0.01, t.size)
+    return np.clip(samples, -1, 1).astype(np.float32), sample_rate
+
+
+def wav_bytes(samples, sample_rate):
+    """Encode float samples as a 16-bit mono WAV file"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((samples * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def synthetic_transcripts(count, seed=0):
+    """Short spoken-style transcripts of varying length"""
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(TRANSCRIPT_WORDS) for _ in range(rng.randint(3, 30)))
+            for _ in range(count)]
+
+
+def encode_jpeg(frame, quality=80):
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("Could not encode benchmark frame")
+    return buffer.tobytes()
+
+
+# ------------------------------------------------------------------- runner
+
+def run_case(fn, inputs, iterations, warmup=5, concurrency=1):
+    """
+    Call ``fn`` on the inputs (cycled) and time every call
+
+    Returns:
+        dict: Call and error counts, latency percentiles in milliseconds and
+        calls per second over the whole run
+    """
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+
+    latencies = np.zeros(iterations, dtype=np.float64)
+    errors = [0]
+    counter = iter(range(iterations))
+    counter_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                fn(inputs[i % len(inputs)])
+            except Exception:
+                with counter_lock:
+                    errors[0] += 1
+            latencies[i] = time.perf_counter() - start
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        'calls': iterations,
+        'errors': errors[0],
+        'concurrency': concurrency,
+        'mean_ms': float(latencies.mean() * 1000),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(latencies.max() * 1000),
+        'rps': iterations / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def expect_success(response):
+    """Raise unless a test-client response is a successful JSON or MessagePack result"""
+    body = decompress(response.get_data(), response.headers.get('Content-Encoding'))
+    result = unpack(body) if response.mimetype == MSGPACK_MIMETYPE else json.loads(body)
+    if response.status_code != 200 or not result.get('success'):
+        raise RuntimeError(f"Request failed ({response.status_code}): {body[:200]!r}")
+    return response
+
+
+# -------------------------------------------------------------------- cases
+
+def build_cases(seed):
+    """Return (name, fn, inputs) for every benchmark case"""
+    import app as app_module
+    from face_tracker import FACE_DETECT_WIDTH
+    from image_decode import FrameDecoder
+    from mock_deepface import MockDeepFace, configure_noise
+    from study_recommendations import StudyRecommendations
+
+    # Seeded fallback scores keep runs comparable with --compare
+    configure_noise(seed=seed)
+
+    frames = synthetic_frames(16, seed)
+    # Four webcam frames tiled into one shared-room frame with four faces
+    group_frames = [np.vstack([np.hstack(frames[i:i + 2]), np.hstack(frames[i + 2:i + 4])]) for i in (0, 4, 8, 12)]
+    jpegs = [encode_jpeg(frame) for frame in frames]
+    data_urls = ['data:image/jpeg;base64,' + base64.b64encode(jpeg).decode() for jpeg in jpegs]
+    hd_jpegs = [encode_jpeg(frame) for frame in synthetic_frames(4, seed, width=1920, height=1080)]
+    rois = np.stack([cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), MockDeepFace.roi_size)
+                     for frame in frames] * 16)
+    clips = [synthetic_audio(5.0, seed + i) for i in range(4)]
+    wavs = [wav_bytes(samples, sr) for samples, sr in clips]
+    transcripts = synthetic_transcripts(32, seed)
+    many_transcripts = synthetic_transcripts(1000, seed)
+
+    rng = random.Random(seed)
+    rec_queries = [(rng.choice(EMOTIONS), rng.choice(STRESS_LEVELS)) for _ in range(64)]
+    blend_queries = [({emotion: rng.random() for emotion in EMOTIONS}, rng.choice(STRESS_LEVELS)) for _ in range(64)]
+    stress_inputs = [(rng.uniform(-50, 0), rng.uniform(0, 0.3), rng.uniform(0, 60)) for _ in range(64)]
+
+    detector = registry.get('emotion_detector')
+    voice_analyzer = registry.get('voice_analyzer')
+    text_analyzer = registry.get('text_analyzer')
+    recommender = StudyRecommendations(seed=seed)
+    client = app_module.app.test_client()
+
+    # A client whose last frame had a 300 px face, as a 1080p webcam would
+    decoder = FrameDecoder(FACE_DETECT_WIDTH)
+    decoder.decode(hd_jpegs[0], 'bench', grayscale=True)
+    decoder.observe('bench', (1080, 1920), {'x': 810, 'y': 390, 'w': 300, 'h': 300})
+
+    def post_voice_file(wav):
+        data = {'audio': (io.BytesIO(wav), 'clip.wav')}
+        return expect_success(client.post('/analyze_voice', data=data, content_type='multipart/form-data'))
+
+    return [
+        ('direct.decode.color_1080p',
+         lambda jpeg: cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR), hd_jpegs),
+        ('direct.decode.adaptive_gray_1080p',
+         lambda jpeg: decoder.decode(jpeg, 'bench', grayscale=True), hd_jpegs),
+        ('direct.mock_deepface.analyze',
+         lambda frame: MockDeepFace.analyze(frame, actions=['emotion'], enforce_detection=False), frames),
+        ('direct.mock_deepface.score_rois256',
+         lambda _: MockDeepFace.score_rois(rois), [None]),
+        ('direct.emotion_detector.analyze_batch16',
+         lambda _: detector.analyze_batch(frames), [None]),
+        ('direct.emotion_detector.group4',
+         lambda frame: detector.analyze_batch([frame], max_faces=None), group_frames),
+        ('direct.voice.analyze_audio_5s',
+         lambda clip: voice_analyzer.analyze_audio(*clip), clips),
+        ('direct.voice.estimate_stress_level',
+         lambda args: voice_analyzer.estimate_stress_level(*args), stress_inputs),
+        ('direct.text.analyze',
+         lambda text: text_analyzer.analyze(text), transcripts),
+        ('direct.text.analyze_batch1000',
+         lambda _: text_analyzer.analyze_batch(many_transcripts), [None]),
+        ('direct.recommendations.get',
+         lambda args: recommender.get_recommendations(*args), rec_queries),
+        ('direct.recommendations.blended',
+         lambda args: recommender.get_blended_recommendations(*args), blend_queries),
+        ('direct.recommendations.bulk64',
+         lambda _: recommender.get_recommendations_bulk(rec_queries), [None]),
+        ('http.analyze_emotion',
+         lambda url: expect_success(client.post('/analyze_emotion', json={'image': url})), data_urls),
+        ('http.analyze_emotion_frame',
+         lambda jpeg: expect_success(client.post('/analyze_emotion_frame', data=jpeg,
+                                                 content_type='image/jpeg')), jpegs),
+        # A student sitting still: the same frame again, so the frame-change gate can reuse results
+        ('http.analyze_emotion_frame_still',
+         lambda jpeg: expect_success(client.post('/analyze_emotion_frame', data=jpeg, content_type='image/jpeg',
+                                                 headers={'X-Client-Id': 'still'})), jpegs[:1]),
+        ('http.analyze_voice_file_5s', post_voice_file, wavs),
+        ('http.analyze_voice_transcript',
+         lambda text: expect_success(client.post('/analyze_voice', json={'transcript': text})), transcripts),
+        ('http.get_recommendations',
+         lambda args: expect_success(client.post('/get_recommendations', json={'emotion': args[0]})),
+         rec_queries),
+        # A dashboard poll of the sessions saved by the cases above, as JSON and in the compact encoding
+        ('http.session_history_50',
+         lambda _: expect_success(client.get('/session_history?limit=50')), [None]),
+        ('http.session_history_50_msgpack_gzip',
+         lambda _: expect_success(client.get('/session_history?limit=50', headers={
+             'Accept': 'application/msgpack', 'Accept-Encoding': 'gzip'})), [None])
+    ]
+
+
+def environment(args):
+    """Versions and settings recorded with the results so runs can be compared"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'emotion_backend': getattr(registry.get('emotion_detector'), 'name', None) or os.environ['EMOTION_BACKEND'],
+        'seed': args.seed,
+        'iterations': args.iterations,
+        'warmup': args.warmup,
+        'concurrency': args.concurrency
+    }
+
+
+def format_results(results, baseline=None):
+    lines = [f"{'case':<42} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>10} {'errors':>7}"]
+    for name, result in results.items():
+        line = (f"{name:<42} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} "
+                f"{result['p99_ms']:9.2f} {result['rps']:10.1f} {result['errors']:7d}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            p50_change = (result['p50_ms'] / previous['p50_ms'] - 1) * 100 if previous['p50_ms'] else 0.0
+            rps_change = (result['rps'] / previous['rps'] - 1) * 100 if previous['rps'] else 0.0
+            line += f"   p50 {p50_change:+6.1f}%  req/s {rps_change:+6.1f}%"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200, help="timed calls per case")
+    parser.add_argument('--warmup', type=int, default=5, help="untimed calls per case before timing")
+    parser.add_argument('--concurrency', type=int, default=1, help="threads calling each case")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the synthetic inputs")
+    parser.add_argument('--only', action='append', default=[], metavar='PREFIX',
+                        help="run only cases whose name starts with PREFIX (repeatable)")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--verbose', action='store_true', help="keep the application's info logging")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    # The app logs every request; that output is not what we are measuring
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    results = {}
+    for name, fn, inputs in build_cases(args.seed):
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            continue
+        results[name] = run_case(fn, inputs, args.iterations, args.warmup, args.concurrency)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    print(format_results(results, baseline))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(args), 'results': results}, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.output}")
+
+    return 1 if any(result['errors'] for result in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
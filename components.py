@@ -0,0 +1,202 @@
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ComponentRegistry:
+    """Builds heavy application components lazily, on first use
+
+    Each component is registered with a factory that is only called the first
+    time the component is requested. Import and build times are recorded so a
+    worker can report where its startup time went, and an optional warm-up
+    function can run a dummy inference before the worker accepts traffic.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._warm_ups = {}
+        self._instances = {}
+        self._timings = []
+        self._lock = threading.RLock()
+
+    def register(self, name, factory, warm_up=None):
+        """Register a component factory and an optional warm-up function"""
+        self._factories[name] = factory
+        if warm_up is not None:
+            self._warm_ups[name] = warm_up
+
+    def get(self, name):
+        """Return the component, building it on first use"""
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown component: {name}")
+                start = time.perf_counter()
+                instance = self._factories[name]()
+                self._record('component', name, time.perf_counter() - start)
+                self._instances[name] = instance
+            return self._instances[name]
+
+    def is_loaded(self, name):
+        return name in self._instances
+
+    def import_module(self, module_name):
+        """Import a module, recording its import cost the first time"""
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        self._record('module', module_name, time.perf_counter() - start)
+        return module
+
+    def preload(self, names=None):
+        """Build the given components (all registered ones by default)"""
+        for name in names or list(self._factories):
+            self.get(name)
+
+    def warm_up(self, names=None):
+        """Preload components and run each one's warm-up function once"""
+        names = names or list(self._factories)
+        self.preload(names)
+        for name in names:
+            warm_up = self._warm_ups.get(name)
+            if warm_up is None:
+                continue
+            start = time.perf_counter()
+            try:
+                warm_up(self._instances[name])
+            except Exception as e:
+                logger.warning("Warm-up of %s failed: %s", name, e)
+            self._record('warm_up', name, time.perf_counter() - start)
+
+    def startup_report(self):
+        """Return recorded import, build and warm-up costs, slowest first"""
+        with self._lock:
+            timings = sorted(self._timings, key=lambda t: t['seconds'], reverse=True)
+        return {
+            'loaded_components': sorted(self._instances),
+            'pending_components': sorted(set(self._factories) - set(self._instances)),
+            'timings': timings
+        }
+
+    def format_startup_report(self):
+        """Human readable version of startup_report()"""
+        report = self.startup_report()
+        lines = ["Startup report:"]
+        for timing in report['timings']:
+            lines.append(f"  {timing['seconds'] * 1000:9.1f} ms  {timing['kind']:<9} {timing['name']}")
+        if report['pending_components']:
+            lines.append(f"  not loaded yet: {', '.join(report['pending_components'])}")
+        return '\n'.join(lines)
+
+    def _record(self, kind, name, seconds):
+        with self._lock:
+            self._timings.append({'kind': kind, 'name': name, 'seconds': seconds})
+
+
+# Process-wide registry shared by the app, its modules and inference worker processes
+registry = ComponentRegistry()
+
+# Flag to track if real DeepFace is available (set when the emotion backend loads)
+DEEPFACE_AVAILABLE = False
+
+# Emotion backend: 'deepface' (DeepFace/TensorFlow), 'onnx' (a small ONNX
+# classifier run by OpenCV's DNN module, see onnx_emotion.py) or 'opencv'
+# (heuristic fallback, offline, no model). 'auto' uses the first of them
+# that can be loaded, in that order
+EMOTION_BACKEND = os.environ.get('EMOTION_BACKEND', 'auto')
+
+# Heavy backends (DeepFace/TensorFlow, OpenCV, speech_recognition) are imported
+# on first use through the component registry so workers start quickly
+
+
+def load_deepface_detector():
+    global DEEPFACE_AVAILABLE
+    registry.import_module('deepface.DeepFace')
+    DEEPFACE_AVAILABLE = True
+    logger.info("DeepFace loaded successfully!")
+    return registry.import_module('emotion_detector').EmotionDetector()
+
+
+def load_onnx_detector():
+    return registry.import_module('onnx_emotion').OnnxEmotionDetector()
+
+
+def load_opencv_detector():
+    return registry.import_module('mock_deepface').MockEmotionDetector()
+
+
+# Emotion backends by name, in the order 'auto' tries them. A loader raises
+# ImportError or OSError when its backend is not available here
+EMOTION_BACKENDS = {
+    'deepface': load_deepface_detector,
+    'onnx': load_onnx_detector,
+    'opencv': load_opencv_detector
+}
+
+
+def load_emotion_detector():
+    """Create the emotion detector for EMOTION_BACKEND, falling back to the OpenCV heuristic"""
+    if EMOTION_BACKEND == 'auto':
+        names = list(EMOTION_BACKENDS)
+    elif EMOTION_BACKEND in EMOTION_BACKENDS:
+        names = [EMOTION_BACKEND]
+    else:
+        raise ValueError(f"Unknown EMOTION_BACKEND {EMOTION_BACKEND!r} "
+                         f"(expected auto or one of {', '.join(EMOTION_BACKENDS)})")
+
+    for name in names:
+        try:
+            detector = EMOTION_BACKENDS[name]()
+        except (ImportError, OSError) as e:
+            logger.warning("Emotion backend %s is not available: %s", name, e)
+            continue
+        logger.info("Using the %s emotion backend", name)
+        return detector
+
+    logger.warning("Using OpenCV-based emotion analysis.")
+    return load_opencv_detector()
+
+
+def load_voice_analyzer():
+    return registry.import_module('voice_analyzer').VoiceAnalyzer()
+
+
+def load_text_analyzer():
+    # Compiling the lexicon happens here, once per worker
+    return registry.import_module('text_analyzer').TextAnalyzer()
+
+
+def load_fft():
+    # scipy's FFTs keep float32 and are several times faster on batches of frames;
+    # importing scipy costs a few hundred ms, so only voice analysis pays for it
+    try:
+        return registry.import_module('scipy.fft')
+    except ImportError:
+        return np.fft
+
+
+def warm_up_emotion_detector(detector):
+    # A blank frame is enough to build the model and run it once
+    detector.analyze_batch([np.zeros((120, 160, 3), dtype=np.uint8)])
+
+
+registry.register('cv2', lambda: registry.import_module('cv2'))
+registry.register('fft', load_fft)
+registry.register('emotion_detector', load_emotion_detector, warm_up=warm_up_emotion_detector)
+registry.register('voice_analyzer', load_voice_analyzer)
+registry.register('text_analyzer', load_text_analyzer)
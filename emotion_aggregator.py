@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+# Named windows reported by EmotionAggregator.summary(), in seconds
+SUMMARY_WINDOWS = {'last_10s': 10, 'last_minute': 60}
+
+
+def group_emotion(faces, labels=EMOTION_LABELS):
+    """
+    Combine the per-face results of one frame into a group emotion
+
+    Every face counts equally, so a large face close to the camera does not
+    outweigh the rest of the room.
+
+    Args:
+        faces: List of dicts with 'dominant_emotion', 'emotion_percentages'
+            and 'region', one per detected face
+
+    Returns:
+        dict: 'faces' (per-face dominant emotion, percentages and region) and
+        'face_count', plus the group 'dominant_emotion' and
+        'emotion_percentages' when there is at least one face
+    """
+    group = {
+        'faces': [{
+            'dominant_emotion': face['dominant_emotion'],
+            'emotion_percentages': face['emotion_percentages'],
+            'region': face['region']
+        } for face in faces],
+        'face_count': len(faces)
+    }
+    if faces:
+        scores = np.array([[face['emotion_percentages'].get(label, 0.0) for label in labels] for face in faces],
+                          dtype=np.float64)
+        mean = scores.mean(axis=0)
+        group['emotion_percentages'] = {label: float(value) for label, value in zip(labels, mean)}
+        group['dominant_emotion'] = labels[int(np.argmax(mean))]
+    return group
+
+
+class EmotionAggregator:
+    """Incremental emotion statistics for one session
+
+    Each update is stored as a row of a fixed-size NumPy ring buffer together
+    with the running total *before* that row, so the sum over any suffix of
+    the buffer is one subtraction. Updates are O(1), windowed averages are
+    O(log capacity) (a binary search for the window start) and the whole
+    session average and exponential moving average are kept as running
+    values. Windows longer than the buffer covers are truncated to the oldest
+    stored sample.
+    """
+
+    def __init__(self, capacity=600, ema_alpha=0.3, labels=EMOTION_LABELS):
+        self.labels = list(labels)
+        self.capacity = max(1, int(capacity))
+        self.ema_alpha = ema_alpha
+        self._index = {label: i for i, label in enumerate(self.labels)}
+
+        self._times = np.zeros(self.capacity, dtype=np.float64)
+        self._prefix = np.zeros((self.capacity, len(self.labels)), dtype=np.float64)
+        self._total = np.zeros(len(self.labels), dtype=np.float64)
+        self._ema = np.zeros(len(self.labels), dtype=np.float64)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def update(self, emotion_scores, timestamp=None):
+        """Add one frame's emotion scores (dict of label -> percentage)"""
+        vector = np.zeros(len(self.labels), dtype=np.float64)
+        for label, score in emotion_scores.items():
+            i = self._index.get(label)
+            if i is not None:
+                vector[i] = score
+        self.update_vector(vector, timestamp)
+
+    def update_vector(self, vector, timestamp=None):
+        """Add one frame's scores as a vector ordered like self.labels"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        with self._lock:
+            slot = self.count % self.capacity
+            self._times[slot] = timestamp
+            self._prefix[slot] = self._total
+            self._total += vector
+            if self.count == 0:
+                self._ema[:] = vector
+            else:
+                self._ema += self.ema_alpha * (vector - self._ema)
+            self.count += 1
+
+    def average(self, seconds=None, now=None):
+        """
+        Mean emotion vector over the last ``seconds`` (whole session if None)
+
+        Returns:
+            np.ndarray or None: Mean scores ordered like self.labels, or None
+            when no frame falls inside the window
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+            if seconds is None:
+                return self._total / self.count
+
+            if now is None:
+                now = time.monotonic()
+            start = self._first_index_since(now - seconds)
+            if start >= self.count:
+                return None
+            window_total = self._total - self._prefix[start % self.capacity]
+            return window_total / (self.count - start)
+
+    def smoothed(self):
+        """Exponential moving average of the scores"""
+        with self._lock:
+            return self._ema.copy() if self.count else None
+
+    def summary(self, now=None):
+        """Dominant emotion and mean scores for each named window and the session"""
+        if now is None:
+            now = time.monotonic()
+
+        summary = {'frames': self.count}
+        for name, seconds in SUMMARY_WINDOWS.items():
+            summary[name] = self._as_dict(self.average(seconds, now))
+        summary['session'] = self._as_dict(self.average())
+        summary['smoothed'] = self._as_dict(self.smoothed())
+
+        # The short window gives a stable yet responsive dominant emotion
+        stable = summary['last_10s'] or summary['session']
+        summary['dominant_emotion'] = max(stable, key=stable.get) if stable else None
+        return summary
+
+    def _as_dict(self, vector):
+        if vector is None:
+            return None
+        return {label: float(value) for label, value in zip(self.labels, vector)}
+
+    def _first_index_since(self, cutoff):
+        # Binary search over the stored samples (logical indices, oldest first)
+        low = max(0, self.count - self.capacity)
+        high = self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._times[mid % self.capacity] < cutoff:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+
+class EmotionAggregatorPool:
+    """Per-session EmotionAggregators, evicting the least recently used"""
+
+    def __init__(self, max_sessions=10000, **aggregator_options):
+        self.max_sessions = max_sessions
+        self.aggregator_options = aggregator_options
+        self._aggregators = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            aggregator = self._aggregators.get(session_id)
+            if aggregator is None:
+                aggregator = EmotionAggregator(**self.aggregator_options)
+                self._aggregators[session_id] = aggregator
+                if len(self._aggregators) > self.max_sessions:
+                    self._aggregators.popitem(last=False)
+            else:
+                self._aggregators.move_to_end(session_id)
+            return aggregator
+
+    def peek(self, session_id):
+        """Return the session's aggregator without creating one"""
+        with self._lock:
+            return self._aggregators.get(session_id)
+
+    def __len__(self):
+        return len(self._aggregators)
@@ -0,0 +1,159 @@
+import cv2
+import numpy as np
+from datetime import datetime
+from face_tracker import FaceTrackerPool, MAX_FACES_PER_FRAME
+from image_decode import to_gray
+from emotion_aggregator import EMOTION_LABELS, group_emotion
+from instrumentation import timed
+from webcam_pipeline import WEBCAM_INFERENCE_WORKERS, WEBCAM_TARGET_FPS, analyze_webcam
+
+
+class EmotionBackend:
+    """Base class for emotion detectors that classify face crops with a model
+
+    Detectors are used through analyze_batch() and analyze_image(), which
+    return one result dict per image (see analyze_batch). This class finds
+    and crops the faces, stacks every crop of a batch into one array and
+    turns the scores into results; a subclass only implements predict(),
+    which scores the whole stack at once.
+    """
+
+    # Name reported in the startup log and benchmark results
+    name = None
+
+    # Only grayscale is used, so frames can be decoded straight to gray
+    grayscale_input = True
+
+    # Output columns of predict(), and the (width, height) of the crops it receives
+    labels = EMOTION_LABELS
+    input_size = (48, 48)
+
+    # Images without a detected face are scored by predict() on the whole
+    # frame, as DeepFace does with enforce_detection=False; a backend that
+    # sets this to False scores them with predict_no_face() instead
+    predict_whole_frame = True
+
+    def __init__(self):
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.face_trackers = FaceTrackerPool(self.face_cascade)
+
+    def predict(self, faces):
+        """
+        Score a stack of face crops
+
+        Args:
+            faces: (N, height, width) uint8 array of grayscale crops
+
+        Returns:
+            np.ndarray: (N, len(labels)) non-negative scores
+        """
+        raise NotImplementedError
+
+    def predict_no_face(self, count):
+        """(count, len(labels)) scores for images without a face (see predict_whole_frame)"""
+        raise NotImplementedError
+
+    def analyze_webcam_emotion(self, duration=10, target_fps=WEBCAM_TARGET_FPS, workers=WEBCAM_INFERENCE_WORKERS):
+        """Analyze the webcam for `duration` seconds; see webcam_pipeline.analyze_webcam"""
+        return analyze_webcam(self, duration, target_fps=target_fps, workers=workers)
+
+    def analyze_image(self, image, client_id=None, max_faces=MAX_FACES_PER_FRAME):
+        """Analyze a single image; same result format as analyze_batch"""
+        return self.analyze_batch([image], client_ids=[client_id], max_faces=max_faces)[0]
+
+    def analyze_batch(self, images, client_ids=None, max_faces=MAX_FACES_PER_FRAME):
+        """
+        Analyze emotion for many images with a single classifier call
+
+        Faces are detected per image, cropped to the model input size and stacked
+        into one array so the emotion model runs once for the whole batch,
+        however many faces each image holds.
+
+        Args:
+            images: List of BGR (or grayscale) image arrays
+            client_ids: Optional list of client ids, one per image; faces of
+                known clients are tracked between frames instead of being
+                searched for over the whole frame
+            max_faces: Faces analyzed per image, largest first (None for
+                all). Above 1 the result holds the group emotion, with each
+                face under 'faces'.
+
+        Returns:
+            list: One dict per image with 'dominant_emotion',
+            'emotion_percentages', 'face_detected', 'region',
+            'total_detections' and 'session_timestamp'
+        """
+        if not images:
+            return []
+
+        if client_ids is None:
+            client_ids = [None] * len(images)
+
+        crops = []
+        owners = []
+        regions = []
+        for i, (image, client_id) in enumerate(zip(images, client_ids)):
+            for crop, region in self._extract_faces(image, client_id, max_faces):
+                crops.append(crop)
+                owners.append(i)
+                regions.append(region)
+
+        with timed('emotion_scoring'):
+            if self.predict_whole_frame:
+                predictions = np.asarray(self.predict(np.stack(crops)), dtype=np.float64)
+            else:
+                predictions = self._predict_faces_only(crops, regions)
+
+        totals = predictions.sum(axis=1, keepdims=True)
+        percentages = predictions * 100.0 / np.where(totals > 0, totals, 1.0)
+
+        faces = [[] for _ in images]
+        for owner, scores, region in zip(owners, percentages, regions):
+            emotion_percentages = {label: float(score) for label, score in zip(self.labels, scores)}
+            faces[owner].append({
+                'dominant_emotion': max(emotion_percentages, key=emotion_percentages.get),
+                'emotion_percentages': emotion_percentages,
+                'face_detected': region is not None,
+                'region': region
+            })
+
+        timestamp = datetime.now().isoformat()
+        results = []
+        for image_faces in faces:
+            result = dict(image_faces[0], total_detections=1, session_timestamp=timestamp)
+            if max_faces != 1:
+                # Group emotion on top, every face listed under 'faces'
+                result.update(group_emotion([face for face in image_faces if face['face_detected']]))
+            results.append(result)
+
+        return results
+
+    def _predict_faces_only(self, crops, regions):
+        found = [i for i, region in enumerate(regions) if region is not None]
+        missing = [i for i, region in enumerate(regions) if region is None]
+        predictions = np.empty((len(crops), len(self.labels)), dtype=np.float64)
+        if found:
+            predictions[found] = self.predict(np.stack([crops[i] for i in found]))
+        if missing:
+            predictions[missing] = self.predict_no_face(len(missing))
+        return predictions
+
+    def _extract_faces(self, image, client_id=None, max_faces=1):
+        """Return (resized grayscale face crop, face region) pairs, largest face first"""
+        gray = to_gray(image)
+
+        faces = self.face_trackers.detect(gray, client_id, max_faces=max_faces)
+        if len(faces) == 0:
+            if not self.predict_whole_frame:
+                return [(None, None)]
+            # Same as enforce_detection=False: treat the whole frame as the face
+            return [(cv2.resize(gray, self.input_size, interpolation=cv2.INTER_AREA), None)]
+
+        crops = []
+        for face in faces:
+            x, y, w, h = (int(v) for v in face)
+            crops.append((
+                cv2.resize(gray[y:y+h, x:x+w], self.input_size, interpolation=cv2.INTER_AREA),
+                {'x': x, 'y': y, 'w': w, 'h': h}
+            ))
+        return crops
@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from components import registry
+from image_decode import scratch_buffer
+from instrumentation import timed
+
+# Step between Haar cascade pyramid levels (higher is faster but less thorough)
+FACE_SCALE_FACTOR = float(os.environ.get('FACE_SCALE_FACTOR', 1.1))
+FACE_MIN_NEIGHBORS = int(os.environ.get('FACE_MIN_NEIGHBORS', 4))
+# Full-frame detection runs on a copy downscaled to at most this width
+FACE_DETECT_WIDTH = int(os.environ.get('FACE_DETECT_WIDTH', 320))
+# Tracked faces are searched for at roughly this width inside their ROI
+FACE_TRACK_WIDTH = 80
+# Run a full-frame detection every N frames even while tracking succeeds
+FACE_REDETECT_INTERVAL = int(os.environ.get('FACE_REDETECT_INTERVAL', 10))
+# Faces analyzed per frame, largest first; above 1 every face of a shared
+# camera gets its own scores plus a group emotion
+MAX_FACES_PER_FRAME = int(os.environ.get('MAX_FACES_PER_FRAME', 1))
+
+NO_FACES = np.empty((0, 4), dtype=np.int32)
+
+
+def detect_faces(cascade, gray, scale_factor=FACE_SCALE_FACTOR, min_neighbors=FACE_MIN_NEIGHBORS,
+                 detect_width=FACE_DETECT_WIDTH):
+    """
+    Detect faces on a downscaled copy of a grayscale frame
+
+    Returns:
+        np.ndarray: (N, 4) array of x, y, w, h boxes in full-frame
+        coordinates, largest face first
+    """
+    height, width = gray.shape[:2]
+    scale = min(1.0, detect_width / float(width)) if detect_width else 1.0
+    if scale == 1.0:
+        small = gray
+    else:
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        cv2 = registry.get('cv2')
+        small = cv2.resize(gray, size, dst=scratch_buffer('face_detect', size[::-1]), interpolation=cv2.INTER_AREA)
+
+    faces = cascade.detectMultiScale(small, scale_factor, min_neighbors)
+    if len(faces) == 0:
+        return NO_FACES
+
+    faces = np.round(np.asarray(faces, dtype=np.float32) / scale).astype(np.int32)
+    return faces[np.argsort(-(faces[:, 2] * faces[:, 3]), kind='stable')]
+
+
+class FaceTracker:
+    """Reuses one client's last face position to avoid full-frame detection
+
+    While a face is being tracked only a padded region around its previous
+    box is searched. A full-frame detection runs every ``redetect_interval``
+    frames, when the face is lost, or when the last frame is too old.
+    """
+
+    def __init__(self, cascade, scale_factor=FACE_SCALE_FACTOR, min_neighbors=FACE_MIN_NEIGHBORS,
+                 detect_width=FACE_DETECT_WIDTH, redetect_interval=FACE_REDETECT_INTERVAL,
+                 roi_padding=0.5, max_track_age=2.0):
+        self.cascade = cascade
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.detect_width = detect_width
+        self.redetect_interval = redetect_interval
+        self.roi_padding = roi_padding
+        self.max_track_age = max_track_age
+
+        self.last_box = None
+        self.frame_width = None
+        self.frames_since_detection = 0
+        self.last_seen = 0.0
+        self.full_detections = 0
+        self.roi_detections = 0
+        self._lock = threading.Lock()
+
+    def detect(self, gray):
+        """Return face boxes for this frame, tracked face first"""
+        with self._lock:
+            now = time.monotonic()
+            if self.last_box is not None and gray.shape[1] != self.frame_width:
+                # The client's frames are now decoded at another resolution
+                self.last_box = np.round(self.last_box * (gray.shape[1] / float(self.frame_width))).astype(np.int32)
+            self.frame_width = gray.shape[1]
+
+            tracking = (
+                self.last_box is not None
+                and self.frames_since_detection < self.redetect_interval
+                and now - self.last_seen <= self.max_track_age
+            )
+
+            if tracking:
+                box = self._search_roi(gray)
+                if box is not None:
+                    self.last_box = box
+                    self.frames_since_detection += 1
+                    self.last_seen = now
+                    self.roi_detections += 1
+                    return box[np.newaxis, :]
+
+            faces = detect_faces(self.cascade, gray, scale_factor=self.scale_factor,
+                                 min_neighbors=self.min_neighbors, detect_width=self.detect_width)
+            self.full_detections += 1
+            self.frames_since_detection = 0
+            self.last_seen = now
+            self.last_box = faces[0] if len(faces) > 0 else None
+            return faces
+
+    def reset(self):
+        with self._lock:
+            self.last_box = None
+            self.frames_since_detection = 0
+
+    def _search_roi(self, gray):
+        x, y, w, h = (int(v) for v in self.last_box)
+        pad_x = int(w * self.roi_padding)
+        pad_y = int(h * self.roi_padding)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(gray.shape[1], x + w + pad_x), min(gray.shape[0], y + h + pad_y)
+        if x1 <= x0 or y1 <= y0:
+            return None
+
+        roi = gray[y0:y1, x0:x1]
+        scale = min(1.0, FACE_TRACK_WIDTH / float(w))
+        if scale < 1.0:
+            cv2 = registry.get('cv2')
+            roi = cv2.resize(roi, (max(1, int(roi.shape[1] * scale)), max(1, int(roi.shape[0] * scale))),
+                             interpolation=cv2.INTER_AREA)
+
+        # Only accept faces of a similar size to the tracked one
+        min_side = max(1, int(w * scale * 0.6))
+        faces = self.cascade.detectMultiScale(roi, self.scale_factor, self.min_neighbors,
+                                              minSize=(min_side, min_side))
+        if len(faces) == 0:
+            return None
+
+        fx, fy, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+        return np.array([
+            x0 + int(round(fx / scale)), y0 + int(round(fy / scale)),
+            int(round(fw / scale)), int(round(fh / scale))
+        ], dtype=np.int32)
+
+
+class FaceTrackerPool:
+    """Per-client FaceTrackers, evicting the least recently used clients"""
+
+    def __init__(self, cascade, max_clients=1000, **tracker_options):
+        self.cascade = cascade
+        self.max_clients = max_clients
+        self.tracker_options = tracker_options
+        self._trackers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, client_id):
+        with self._lock:
+            tracker = self._trackers.get(client_id)
+            if tracker is None:
+                tracker = FaceTracker(self.cascade, **self.tracker_options)
+                self._trackers[client_id] = tracker
+                if len(self._trackers) > self.max_clients:
+                    self._trackers.popitem(last=False)
+            else:
+                self._trackers.move_to_end(client_id)
+            return tracker
+
+    def detect(self, gray, client_id=None, max_faces=1):
+        """
+        Detect up to ``max_faces`` faces (None for all), largest first
+
+        A single face is tracked across frames when a client id is given;
+        a tracker only follows one face, so multi-face frames are always
+        searched in full.
+        """
+        with timed('face_detection'):
+            if client_id is None or max_faces != 1:
+                tracker_options = self.tracker_options
+                faces = detect_faces(
+                    self.cascade, gray,
+                    scale_factor=tracker_options.get('scale_factor', FACE_SCALE_FACTOR),
+                    min_neighbors=tracker_options.get('min_neighbors', FACE_MIN_NEIGHBORS),
+                    detect_width=tracker_options.get('detect_width', FACE_DETECT_WIDTH)
+                )
+            else:
+                faces = self.get(client_id).detect(gray)
+        return faces if max_faces is None else faces[:max_faces]
+
+    def __len__(self):
+        return len(self._trackers)
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from components import registry
+
+# Mean absolute difference (grey levels, 0-255) between the thumbnails of two
+# frames below which the second frame reuses the first one's result; 0 disables
+FRAME_CHANGE_THRESHOLD = float(os.environ.get('FRAME_CHANGE_THRESHOLD', 2.5))
+# A cached result is never reused for longer than this many seconds
+FRAME_REUSE_MAX_AGE = float(os.environ.get('FRAME_REUSE_MAX_AGE', 2.0))
+
+# Frames are compared as thumbnails of this size (width, height)
+THUMBNAIL_SIZE = (32, 24)
+
+
+def frame_signature(img):
+    """Small grayscale thumbnail used to compare consecutive frames"""
+    cv2 = registry.get('cv2')
+    # Area averaging over large blocks also cancels out sensor noise
+    thumbnail = cv2.resize(img, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    if thumbnail.ndim == 3:
+        thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+    return thumbnail.astype(np.int16)
+
+
+class FrameChangeGate:
+    """Skips inference for frames that barely differ from the client's last analyzed one
+
+    Each client's last analyzed frame is kept as a thumbnail together with
+    its result. A new frame whose thumbnail differs by less than
+    ``threshold`` on average gets that result back instead of being
+    analyzed, until the result is ``max_age`` seconds old.
+    """
+
+    def __init__(self, threshold=FRAME_CHANGE_THRESHOLD, max_age=FRAME_REUSE_MAX_AGE, max_clients=1000):
+        self.threshold = threshold
+        self.max_age = max_age
+        self.max_clients = max_clients
+        # client id -> (signature, result, monotonic time of the analysis)
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.threshold > 0 and self.max_age > 0
+
+    def lookup(self, client_id, signature, now=None):
+        """
+        Cached result for an unchanged frame
+
+        Returns:
+            dict or None: A copy of the client's last result marked with
+            'reused': True, or None if the frame has to be analyzed
+        """
+        if client_id is None or not self.enabled:
+            return None
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            cached = self._clients.get(client_id)
+        if cached is None:
+            return None
+
+        last_signature, result, analyzed_at = cached
+        if now - analyzed_at > self.max_age or last_signature.shape != signature.shape:
+            return None
+        if np.abs(signature - last_signature).mean() >= self.threshold:
+            return None
+        return dict(result, reused=True)
+
+    def store(self, client_id, signature, result, now=None):
+        """Remember an analyzed frame's signature and result"""
+        if client_id is None or not self.enabled:
+            return
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            self._clients[client_id] = (signature, result, now)
+            self._clients.move_to_end(client_id)
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+    def forget(self, client_id):
+        with self._lock:
+            self._clients.pop(client_id, None)
+
+    def __len__(self):
+        return len(self._clients)
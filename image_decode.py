@@ -0,0 +1,138 @@
+import binascii
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from components import registry
+
+# Frames are decoded at the largest reduction (1/2, 1/4, 1/8) that keeps a
+# tracked face at least this many pixels wide
+FRAME_MIN_FACE_WIDTH = int(os.environ.get('FRAME_MIN_FACE_WIDTH', 64))
+
+REDUCTIONS = (1, 2, 4, 8)
+
+# libjpeg scales the DCT while decoding, so reduced reads of JPEGs skip most
+# of the full-resolution work instead of resizing afterwards. Names rather than
+# values, so importing this module does not import OpenCV
+_IMREAD_FLAGS = {
+    (True, 1): 'IMREAD_GRAYSCALE',
+    (True, 2): 'IMREAD_REDUCED_GRAYSCALE_2',
+    (True, 4): 'IMREAD_REDUCED_GRAYSCALE_4',
+    (True, 8): 'IMREAD_REDUCED_GRAYSCALE_8',
+    (False, 1): 'IMREAD_COLOR',
+    (False, 2): 'IMREAD_REDUCED_COLOR_2',
+    (False, 4): 'IMREAD_REDUCED_COLOR_4',
+    (False, 8): 'IMREAD_REDUCED_COLOR_8'
+}
+
+_scratch = threading.local()
+
+
+def scratch_buffer(name, shape, dtype=np.uint8):
+    """
+    Per-thread reusable array for intermediate images
+
+    The same array is returned on every call from a thread for the same name
+    and shape, so it must not be kept past the current frame.
+    """
+    buffers = getattr(_scratch, 'buffers', None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+        buffer = buffers[name] = np.empty(shape, dtype=dtype)
+    return buffer
+
+
+def to_gray(img):
+    """Grayscale view of a frame, converted into a per-thread scratch buffer"""
+    if img.ndim == 2:
+        return img
+    cv2 = registry.get('cv2')
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=scratch_buffer('gray', img.shape[:2]))
+
+
+def decode_base64(image_data):
+    """Decode a base64 data URL (or bare base64 string) into bytes"""
+    comma = image_data.find(',', 0, 100)
+    if comma >= 0:
+        image_data = image_data[comma + 1:]
+    return binascii.a2b_base64(image_data)
+
+
+class FrameDecoder:
+    """Decodes uploaded frames at the smallest resolution that still suits face analysis
+
+    Compressed bytes are wrapped without copying and decoded straight to
+    grayscale when the emotion backend only needs gray. The reduction factor
+    is chosen per client from its last frame: never below ``detect_width``
+    (full-frame face detection downscales to that width anyway), and never so
+    far that the client's last detected face drops under ``min_face_width``.
+    """
+
+    def __init__(self, detect_width, min_face_width=FRAME_MIN_FACE_WIDTH, max_clients=1000):
+        self.min_face_width = min_face_width
+        self.detect_width = detect_width
+        self.max_clients = max_clients
+        # client id -> [full-resolution frame width, full-resolution face width or None]
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, image_bytes, client_id=None, grayscale=False):
+        """
+        Decode JPEG/PNG bytes for a client
+
+        Returns:
+            np.ndarray or None: Gray or BGR image, possibly reduced in size,
+            or None if the bytes are not a decodable image
+        """
+        if not image_bytes:
+            return None
+        reduction = self.reduction_for(client_id)
+        cv2 = registry.get('cv2')
+        flag = getattr(cv2, _IMREAD_FLAGS[(grayscale, reduction)])
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+        if img is None or img.size == 0:
+            return None
+
+        if client_id is not None:
+            with self._lock:
+                state = self._clients.get(client_id)
+                if state is None:
+                    state = self._clients[client_id] = [0, None]
+                    if len(self._clients) > self.max_clients:
+                        self._clients.popitem(last=False)
+                else:
+                    self._clients.move_to_end(client_id)
+                state[0] = img.shape[1] * reduction
+        return img
+
+    def observe(self, client_id, image_shape, region):
+        """Record where the face was in a decoded frame (region None if no face)"""
+        with self._lock:
+            state = self._clients.get(client_id)
+            if state is None:
+                return
+            if region is None:
+                state[1] = None
+            else:
+                state[1] = region['w'] * state[0] / float(image_shape[1])
+
+    def reduction_for(self, client_id):
+        """Decode reduction factor (1, 2, 4 or 8) for the client's next frame"""
+        with self._lock:
+            state = self._clients.get(client_id)
+            if state is None:
+                return 1
+            frame_width, face_width = state
+
+        reduction = 1
+        for factor in REDUCTIONS[1:]:
+            if frame_width / factor < self.detect_width:
+                break
+            if face_width is not None and face_width / factor < self.min_face_width:
+                break
+            reduction = factor
+        return reduction
@@ -0,0 +1,134 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from components import registry
+from instrumentation import configure_logging, metrics
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when the executor already has its maximum number of tasks in flight"""
+
+
+def _analyze_emotion_batch(images, client_ids=None):
+    return registry.get('emotion_detector').analyze_batch(images, client_ids=client_ids)
+
+
+def _analyze_audio_file(audio_bytes):
+    return registry.get('voice_analyzer').analyze_audio_file(audio_bytes)
+
+
+def _ping():
+    return True
+
+
+# Work that can be sent to the executor, by name. Tasks run against the
+# components of whichever process executes them.
+TASKS = {
+    'emotion_batch': _analyze_emotion_batch,
+    'voice_file': _analyze_audio_file,
+    'ping': _ping
+}
+
+
+def _init_worker():
+    # Load the models once per worker process, before it takes any task
+    configure_logging()
+    registry.warm_up(['emotion_detector'])
+
+
+def _run_task(name, args, kwargs):
+    # Runs in a worker process: send the metrics it recorded back with the result
+    result = TASKS[name](*args, **kwargs)
+    return result, metrics.snapshot(reset=True)
+
+
+def _unwrap_result(worker_future, future):
+    try:
+        result, snapshot = worker_future.result()
+    except BaseException as e:
+        future.set_exception(e)
+        return
+    metrics.merge(snapshot)
+    future.set_result(result)
+
+
+class InferenceExecutor:
+    """Runs model inference off the web server's request threads
+
+    With ``workers > 0`` tasks go to a pool of worker processes, each of which
+    loads its own copy of the models when it starts, so inference can use
+    every core without fighting the GIL. With ``workers == 0`` tasks run
+    inline in the calling thread. Either way at most ``max_pending`` tasks may
+    be in flight; further submissions raise ExecutorSaturated so the caller
+    can shed load instead of queueing without bound.
+    """
+
+    def __init__(self, workers=0, max_pending=32):
+        self.workers = max(0, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def submit(self, task, *args, **kwargs):
+        """
+        Submit a named task
+
+        Returns:
+            Future: Resolves to the task's return value
+
+        Raises:
+            ExecutorSaturated: If max_pending tasks are already in flight
+        """
+        if task not in TASKS:
+            raise KeyError(f"Unknown inference task: {task}")
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorSaturated(f"{self.max_pending} inference tasks already in flight")
+
+        try:
+            if self.workers == 0:
+                future = Future()
+                try:
+                    future.set_result(TASKS[task](*args, **kwargs))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                worker_future = self._get_pool().submit(_run_task, task, args, kwargs)
+                future = Future()
+                worker_future.add_done_callback(lambda done: _unwrap_result(done, future))
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, task, *args, timeout=None, **kwargs):
+        """Submit a task and wait for its result (raises TimeoutError after ``timeout`` seconds)"""
+        return self.submit(task, *args, **kwargs).result(timeout=timeout)
+
+    def start(self):
+        """Spawn the worker processes and wait until each has loaded its models"""
+        if self.workers == 0:
+            return
+        futures = [self._get_pool().submit(_run_task, 'ping', (), {}) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # TensorFlow is not fork-safe, so workers are always spawned
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            return self._pool
@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Log level for the application loggers, and how many hot-path (per-request
+# or per-frame) log records are emitted: one in every LOG_SAMPLE_EVERY
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', 100))
+
+# Latency bucket upper bounds in seconds, from half a millisecond to 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Prometheus-style histogram with fixed buckets, one series per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        """Observe the wall time spent inside the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            series = {labels: [list(counts), total, count] for labels, (counts, total, count) in self._series.items()}
+            if reset:
+                self._series.clear()
+        return series
+
+    def merge(self, series):
+        with self._lock:
+            for labels, (counts, total, count) in series.items():
+                mine = self._series.get(labels)
+                if mine is None:
+                    self._series[labels] = [list(counts), total, count]
+                    continue
+                mine[0] = [a + b for a, b in zip(mine[0], counts)]
+                mine[1] += total
+                mine[2] += count
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le=le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Prometheus-style monotonically increasing counter"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            values = dict(self._values)
+            if reset:
+                self._values.clear()
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for labels, value in values.items():
+                self._values[labels] = self._values.get(labels, 0) + value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.snapshot().items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of one process, exposed in the Prometheus text format
+
+    Inference worker processes record into their own registry; the executor
+    ships a snapshot back with every task result and merges it here, so the
+    web process exposes the stages that ran in its workers too.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def snapshot(self, reset=False):
+        """Picklable copy of every metric's data (optionally clearing it)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot(reset) for metric in metrics}
+
+    def merge(self, snapshot):
+        """Add a snapshot taken in another process to this registry"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        for name, data in snapshot.items():
+            if name in metrics:
+                metrics[name].merge(data)
+
+    def expose(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+    def _get_or_create(self, cls, name, help_text, label_names, **options):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, label_names, **options)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+# Process-wide metrics
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    'emotion_assistant_stage_seconds',
+    'Time spent in each processing stage',
+    ['stage']
+)
+REQUEST_SECONDS = metrics.histogram(
+    'emotion_assistant_request_seconds',
+    'HTTP request latency by endpoint',
+    ['endpoint', 'method', 'status']
+)
+FRAMES = metrics.counter(
+    'emotion_assistant_frames_total',
+    'Emotion frames analyzed by the model, or answered from the previous result because they had not changed',
+    ['outcome']
+)
+REJECTED_REQUESTS = metrics.counter(
+    'emotion_assistant_rejected_requests_total',
+    'Requests shed because inference was overloaded or timed out',
+    ['reason']
+)
+
+
+def timed(stage):
+    """Context manager timing one processing stage into STAGE_SECONDS"""
+    return STAGE_SECONDS.time(stage)
+
+
+class SamplingFilter(logging.Filter):
+    """Passes one in every ``every`` records from each call site
+
+    Warnings and errors always pass, so only routine per-request output is
+    thinned out.
+    """
+
+    def __init__(self, every=LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.every == 1:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            seen = self._counts.get(key, 0)
+            self._counts[key] = seen + 1
+        return seen % self.every == 0
+
+
+def get_hot_logger(name):
+    """Logger for per-request/per-frame messages, sampled by SamplingFilter"""
+    logger = logging.getLogger(f"{name}.hot")
+    if not any(isinstance(f, SamplingFilter) for f in logger.filters):
+        logger.addFilter(SamplingFilter())
+    return logger
+
+
+def configure_logging():
+    """Send application logs to stderr at LOG_LEVEL (no-op if logging is already set up)"""
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL, logging.INFO),
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
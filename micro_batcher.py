@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Groups work items submitted from many request threads into batches
+
+    A single background thread flushes the pending queue as soon as it holds
+    ``max_batch_size`` items, or when the oldest pending item has waited
+    ``max_wait_ms`` milliseconds, whichever comes first. ``batch_fn`` receives a
+    list of items and must return a list of results in the same order, or a
+    Future of that list; in the latter case the next batch is formed without
+    waiting, so several batches can be in flight on an executor at once.
+    At most ``max_pending`` items may wait for a batch; beyond that submit()
+    raises queue.Full.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5, max_pending=None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.max_pending = max_pending
+        self._pending = []
+        self._cond = threading.Condition()
+        self._worker = None
+        self._closed = False
+
+    def submit(self, item):
+        """Queue one item and return a Future resolving to its result"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher has been closed")
+            if self.max_pending is not None and len(self._pending) >= self.max_pending:
+                raise queue.Full(f"{self.max_pending} items already waiting for a batch")
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._worker.start()
+            self._pending.append((item, future, time.monotonic()))
+            self._cond.notify()
+        return future
+
+    def submit_many(self, items):
+        """Queue several items at once; they may share a batch with other callers"""
+        return [self.submit(item) for item in items]
+
+    def close(self):
+        """Flush whatever is pending and stop the background thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._worker is not None:
+            self._worker.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+
+                # Wait for the batch to fill up, but never past the oldest item's deadline
+                deadline = self._pending[0][2] + self.max_wait
+                while len(self._pending) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        items = [item for item, _, _ in batch]
+        try:
+            results = self.batch_fn(items)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        if isinstance(results, Future):
+            results.add_done_callback(lambda done: self._resolve(batch, done))
+        else:
+            self._resolve(batch, results)
+
+    def _resolve(self, batch, results):
+        try:
+            if isinstance(results, Future):
+                results = results.result()
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"Batch function returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
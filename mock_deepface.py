@@ -0,0 +1,186 @@
+import os
+import cv2
+import numpy as np
+from emotion_backend import EmotionBackend
+from face_tracker import FaceTrackerPool, MAX_FACES_PER_FRAME
+from image_decode import to_gray
+from emotion_aggregator import EMOTION_LABELS
+from instrumentation import timed
+
+# Random variation added to the fallback scores: FALLBACK_NOISE=0 makes them
+# a pure function of the face, FALLBACK_SEED makes the noise reproducible
+FALLBACK_NOISE = os.environ.get('FALLBACK_NOISE', '1') != '0'
+FALLBACK_SEED = os.environ.get('FALLBACK_SEED')
+
+# Fallback scoring model, columns in EMOTION_LABELS order. Before noise and
+# clipping a face scores
+#     brightness * B + contrast * C + |brightness - 120| * D + BIAS
+# Higher brightness tends toward happy, lower toward sad; higher contrast
+# toward surprise or anger; mid-grey toward neutral.
+#                           angry disgust  fear  happy   sad  surprise neutral
+_FACE_WEIGHTS = np.array([[  0.0,   0.0,   0.0,   0.5,  -0.3,   0.0,   0.0],
+                          [  0.4,   0.0,   0.0,   0.0,   0.0,   0.5,   0.0],
+                          [  0.0,   0.0,   0.0,   0.0,   0.0,   0.0,  -0.3]])
+_FACE_BIAS = np.array([-12.0, 0.0, 0.0, -40.0, 45.0, -20.0, 36.0])
+_FACE_NOISE = np.array([[5.0, 3.0, 5.0, 10.0, 5.0, 5.0, 10.0],
+                        [12.0, 10.0, 15.0, 30.0, 15.0, 15.0, 25.0]])
+_FACE_CLIP = np.array([[5.0, 2.0, 3.0, 10.0, 5.0, 5.0, 10.0],
+                       [35.0, 20.0, 25.0, 70.0, 50.0, 40.0, 50.0]])
+# Without a face the scores are mostly neutral
+_NO_FACE_NOISE = np.array([[5.0, 5.0, 5.0, 5.0, 5.0, 5.0, 40.0],
+                           [15.0, 15.0, 15.0, 15.0, 15.0, 15.0, 60.0]])
+
+noise_rng = None
+
+
+def configure_noise(enabled=FALLBACK_NOISE, seed=FALLBACK_SEED):
+    """Choose the fallback scorer's noise: off, seeded (reproducible) or unseeded"""
+    global noise_rng
+    noise_rng = np.random.default_rng(None if seed is None else int(seed)) if enabled else None
+
+
+configure_noise()
+
+
+def _noise(bounds, count, rng):
+    low, high = bounds
+    if rng is None:
+        # Noise-free: the middle of each range keeps the scores' balance
+        return np.broadcast_to((low + high) / 2.0, (count, len(low)))
+    return rng.uniform(low, high, size=(count, len(low)))
+
+
+def score_faces(brightness, contrast, rng=None):
+    """
+    Emotion probabilities for N faces from their brightness and contrast
+
+    Args:
+        brightness, contrast: Length-N arrays (grey-level mean and std)
+        rng: np.random.Generator for the score noise, or None for none
+
+    Returns:
+        np.ndarray: (N, 7) rows summing to 1, columns in EMOTION_LABELS order
+    """
+    brightness = np.asarray(brightness, dtype=np.float64)
+    contrast = np.asarray(contrast, dtype=np.float64)
+    features = np.stack([brightness, contrast, np.abs(brightness - 120.0)], axis=1)
+    scores = features @ _FACE_WEIGHTS + _FACE_BIAS + _noise(_FACE_NOISE, len(brightness), rng)
+    np.clip(scores, _FACE_CLIP[0], _FACE_CLIP[1], out=scores)
+    return scores / scores.sum(axis=1, keepdims=True)
+
+
+def score_no_face(count, rng=None):
+    """(count, 7) emotion probabilities for frames without a face"""
+    scores = np.array(_noise(_NO_FACE_NOISE, count, rng))
+    return scores / scores.sum(axis=1, keepdims=True)
+
+
+class MockDeepFace:
+    """Fallback emotion analyzer using OpenCV face detection and image analysis"""
+
+    # Load OpenCV's pre-trained face detector
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    # Per-client trackers so continuous captures only search around the last face
+    face_trackers = FaceTrackerPool(face_cascade)
+
+    emotions = EMOTION_LABELS
+
+    # Face crops are resized to this before being stacked for batch scoring
+    roi_size = (48, 48)
+
+    @staticmethod
+    def analyze(img, actions=None, enforce_detection=True, detector_backend='opencv', client_id=None,
+                max_faces=MAX_FACES_PER_FRAME):
+        """Analyze image for emotions using OpenCV-based heuristics; one result per face, like DeepFace"""
+        return MockDeepFace.analyze_batch([img], client_ids=[client_id], max_faces=max_faces)[0]
+
+    @staticmethod
+    def analyze_batch(imgs, actions=None, enforce_detection=True, detector_backend='opencv', client_ids=None,
+                      max_faces=MAX_FACES_PER_FRAME):
+        """
+        Analyze many images, scoring every detected face of every image in one stacked pass
+
+        At most ``max_faces`` faces are scored per image (None for all), as
+        for the emotion backends.
+
+        Returns:
+            list: Per image, a list with one result per face (largest first),
+            or a single no-face result
+        """
+        if client_ids is None:
+            client_ids = [None] * len(imgs)
+
+        crops = []
+        face_owners = []
+        regions = []
+        for i, (img, client_id) in enumerate(zip(imgs, client_ids)):
+            gray = to_gray(img)
+            # Tracked across frames when the client is known
+            for face in MockDeepFace.face_trackers.detect(gray, client_id, max_faces=max_faces):
+                x, y, w, h = face
+                crops.append(cv2.resize(gray[y:y+h, x:x+w], MockDeepFace.roi_size,
+                                        interpolation=cv2.INTER_AREA))
+                face_owners.append(i)
+                regions.append(MockDeepFace._region(face))
+
+        results = [[] for _ in imgs]
+        if crops:
+            with timed('emotion_scoring'):
+                probabilities = MockDeepFace.score_rois(np.stack(crops))
+            for owner, region, row in zip(face_owners, regions, probabilities):
+                results[owner].append(MockDeepFace._build_result(row, region))
+
+        faceless = [faces for faces in results if not faces]
+        for faces, row in zip(faceless, score_no_face(len(faceless), noise_rng)):
+            faces.append(MockDeepFace._build_result(row, None))
+        return results
+
+    @staticmethod
+    def score_rois(rois, rng=None):
+        """
+        Score a stack of grayscale face crops in one pass
+
+        Args:
+            rois: (N, H, W) array of face crops
+            rng: Noise generator; defaults to the one set by configure_noise()
+
+        Returns:
+            np.ndarray: (N, 7) emotion probabilities, columns in EMOTION_LABELS order
+        """
+        rois = np.asarray(rois, dtype=np.float32).reshape(len(rois), -1)
+        return score_faces(rois.mean(axis=1), rois.std(axis=1), noise_rng if rng is None else rng)
+
+    @staticmethod
+    def _region(face):
+        x, y, w, h = (int(v) for v in face)
+        return {'x': x, 'y': y, 'w': w, 'h': h}
+
+    @staticmethod
+    def _build_result(probabilities, region):
+        return {
+            'dominant_emotion': EMOTION_LABELS[int(np.argmax(probabilities))],
+            'emotion': {label: float(p) * 100.0 for label, p in zip(EMOTION_LABELS, probabilities)},
+            'face_detected': region is not None,
+            'region': region
+        }
+
+class MockEmotionDetector(EmotionBackend):
+    """Stand-in for EmotionDetector when DeepFace is not installed"""
+
+    name = 'opencv'
+    input_size = MockDeepFace.roi_size
+
+    # Frames without a face get mostly-neutral scores rather than a face score of the whole frame
+    predict_whole_frame = False
+
+    def __init__(self):
+        # Share MockDeepFace's cascade and per-client trackers instead of loading a second copy
+        self.face_cascade = MockDeepFace.face_cascade
+        self.face_trackers = MockDeepFace.face_trackers
+
+    def predict(self, faces):
+        return MockDeepFace.score_rois(faces)
+
+    def predict_no_face(self, count):
+        return score_no_face(count, noise_rng)
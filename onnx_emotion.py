@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from emotion_aggregator import EMOTION_LABELS
+from emotion_backend import EmotionBackend
+
+logger = logging.getLogger(__name__)
+
+# ONNX emotion classifier run through OpenCV's DNN module. The defaults fit
+# the FER+ model from the ONNX model zoo (emotion-ferplus-8.onnx): 64x64
+# grayscale input with raw 0-255 pixel values and eight output classes
+EMOTION_MODEL_PATH = os.environ.get('EMOTION_MODEL_PATH', os.path.join('models', 'emotion-ferplus-8.onnx'))
+# Emotion of each model output, in order; outputs without one of the app's
+# seven emotions (FER+'s 'contempt') are dropped
+EMOTION_MODEL_LABELS = os.environ.get('EMOTION_MODEL_LABELS', 'neutral,happy,surprise,sad,angry,disgust,fear,contempt')
+EMOTION_MODEL_INPUT_SIZE = int(os.environ.get('EMOTION_MODEL_INPUT_SIZE', 64))
+# Input pixels are fed as (pixel - mean) * scale, e.g. scale 1/255 for models trained on [0, 1]
+EMOTION_MODEL_SCALE = float(os.environ.get('EMOTION_MODEL_SCALE', 1.0))
+EMOTION_MODEL_MEAN = float(os.environ.get('EMOTION_MODEL_MEAN', 0.0))
+# Run the network in half precision where OpenCV supports it on this CPU
+EMOTION_MODEL_FP16 = os.environ.get('EMOTION_MODEL_FP16') == '1'
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    np.exp(shifted, out=shifted)
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+class OnnxEmotionDetector(EmotionBackend):
+    """Emotion detection with a small ONNX classifier on OpenCV's DNN module
+
+    Needs only OpenCV, so a worker loads in a fraction of the time and
+    memory of DeepFace/TensorFlow. The face crops of a batch are packed into
+    one contiguous NCHW float32 blob and classified in a single forward
+    pass; models whose batch size OpenCV cannot change (common for
+    int8-quantized exports) are run one crop at a time instead.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, model_path=EMOTION_MODEL_PATH, model_labels=EMOTION_MODEL_LABELS,
+                 input_size=EMOTION_MODEL_INPUT_SIZE, scale=EMOTION_MODEL_SCALE, mean=EMOTION_MODEL_MEAN,
+                 fp16=EMOTION_MODEL_FP16):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX emotion model not found: {model_path}")
+        super().__init__()
+
+        self.model_path = model_path
+        self.input_size = (input_size, input_size)
+        self.scale = scale
+        self.mean = mean
+        try:
+            self.net = cv2.dnn.readNetFromONNX(model_path)
+        except cv2.error as e:
+            raise OSError(f"Could not load ONNX emotion model {model_path}: {e}") from e
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        target = getattr(cv2.dnn, 'DNN_TARGET_CPU_FP16', None) if fp16 else None
+        if fp16 and target is None:
+            logger.warning("This OpenCV build has no FP16 CPU target; running the emotion model in FP32")
+        self.net.setPreferableTarget(target if target is not None else cv2.dnn.DNN_TARGET_CPU)
+
+        # Model output column -> column of EMOTION_LABELS
+        model_labels = [label.strip() for label in model_labels.split(',')]
+        self._source = np.array([i for i, label in enumerate(model_labels) if label in EMOTION_LABELS])
+        self._target = np.array([EMOTION_LABELS.index(model_labels[i]) for i in self._source])
+        self._outputs = len(model_labels)
+
+        # cv2.dnn.Net is not safe to run from several threads at once
+        self._lock = threading.Lock()
+        self._batched = True
+
+    def predict(self, faces):
+        """Classify a stack of grayscale face crops; columns in EMOTION_LABELS order"""
+        # blobFromImages computes (pixel - mean) * scale into one NCHW float32 array
+        blob = cv2.dnn.blobFromImages(list(faces), scalefactor=self.scale, size=self.input_size,
+                                      mean=self.mean, swapRB=False, crop=False)
+        with self._lock:
+            outputs = self._forward(blob)
+
+        if outputs.shape[1] != self._outputs:
+            raise ValueError(f"Emotion model returned {outputs.shape[1]} classes, "
+                             f"EMOTION_MODEL_LABELS names {self._outputs}")
+        # Raw logits (FER+) are turned into probabilities; softmax outputs pass through
+        if outputs.min() < 0 or not np.allclose(outputs.sum(axis=1), 1.0, atol=1e-3):
+            outputs = softmax(outputs)
+
+        scores = np.zeros((len(outputs), len(EMOTION_LABELS)), dtype=np.float64)
+        scores[:, self._target] = outputs[:, self._source]
+        return scores
+
+    def _forward(self, blob):
+        if self._batched and len(blob) > 1:
+            try:
+                self.net.setInput(blob)
+                return self.net.forward().reshape(len(blob), -1).astype(np.float64)
+            except (cv2.error, ValueError):
+                logger.info("Emotion model has a fixed batch size; classifying faces one at a time")
+                self._batched = False
+
+        outputs = []
+        for i in range(len(blob)):
+            self.net.setInput(blob[i:i + 1])
+            outputs.append(self.net.forward().reshape(-1))
+        return np.asarray(outputs, dtype=np.float64)
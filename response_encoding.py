@@ -0,0 +1,154 @@
+import gzip
+import logging
+import os
+
+from emotion_aggregator import EMOTION_LABELS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:
+    logger.warning("msgpack not installed. MessagePack responses disabled; clients get JSON.")
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+# Names clients use for MessagePack; JSON comes first so '*/*' keeps getting JSON
+RESPONSE_MIMETYPES = ('application/json', MSGPACK_MIMETYPE, 'application/x-msgpack', 'application/vnd.msgpack')
+
+# Bodies smaller than this are sent uncompressed (the saving would not pay for the CPU)
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+COMPRESSED_MIMETYPES = frozenset({'application/json', MSGPACK_MIMETYPE, 'text/html', 'text/plain'})
+
+# Keys holding a copy of the enclosing object's timestamp (see compact_payload)
+NESTED_TIMESTAMPS = frozenset({'timestamp', 'session_timestamp'})
+
+_LABELS = frozenset(EMOTION_LABELS)
+_CONTAINERS = (dict, list, tuple)
+
+
+def wants_msgpack(accept_mimetypes):
+    """Whether the client prefers MessagePack to JSON (werkzeug MIMEAccept)"""
+    if msgpack is None:
+        return False
+    return accept_mimetypes.best_match(RESPONSE_MIMETYPES) not in (None, 'application/json')
+
+
+def compact_payload(value, catalogue_version=None, dated=False):
+    """
+    The compact form of a response payload, as sent in MessagePack
+
+    - Emotion score objects (keys all in EMOTION_LABELS) become arrays in
+      EMOTION_LABELS order, with 0 for missing labels
+    - Recommendations made with the current ``catalogue_version`` send
+      catalogue ids instead of texts: 'study_tips' and
+      'recommended_activities' become id lists, 'motivational_quote' one id,
+      and 'item_ids' and 'catalogue_version' are dropped. Recommendations
+      from another catalogue (e.g. a session stored before
+      RECOMMENDATIONS_FILE changed) keep their texts
+    - 'timestamp' and 'session_timestamp' are dropped from objects nested
+      directly in an object that has its own 'timestamp' (a stored session's
+      analysis and recommendations)
+    """
+    if type(value) is dict:
+        if value.keys() <= _LABELS and _is_emotion_scores(value):
+            return [value.get(label, 0) for label in EMOTION_LABELS]
+        if 'item_ids' in value and 'study_tips' in value:
+            value = _recommendation_ids(value, catalogue_version)
+        has_timestamp = 'timestamp' in value
+        return {key: compact_payload(item, catalogue_version, has_timestamp) if type(item) in _CONTAINERS else item
+                for key, item in value.items() if not (dated and key in NESTED_TIMESTAMPS)}
+    if type(value) in (list, tuple):
+        return [compact_payload(item, catalogue_version) if type(item) in _CONTAINERS else item for item in value]
+    return value
+
+
+def _is_emotion_scores(value):
+    # Keys are already known to be labels
+    return bool(value) and all(isinstance(score, (float, int)) and score is not True and score is not False
+                               for score in value.values())
+
+
+def _recommendation_ids(recommendation, catalogue_version):
+    if catalogue_version is None or recommendation.get('catalogue_version') != catalogue_version:
+        # Ids from another catalogue would resolve to other texts; keep the texts
+        return recommendation
+    # item_ids lists the tips (stress tips included), the quote, then the activities
+    ids = recommendation['item_ids']
+    tips = len(recommendation['study_tips'])
+    activities = len(recommendation.get('recommended_activities') or ())
+    if len(ids) != tips + 1 + activities:
+        # Not a layout we know; keep the texts
+        return recommendation
+    compact = {key: item for key, item in recommendation.items() if key not in ('item_ids', 'catalogue_version')}
+    compact['study_tips'] = ids[:tips]
+    compact['motivational_quote'] = ids[tips]
+    compact['recommended_activities'] = ids[tips + 1:]
+    return compact
+
+
+def _builtin(value):
+    # numpy scalars and arrays that reached a payload
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def pack(payload, catalogue_version=None):
+    """MessagePack body of the compact payload; floats are sent as float32"""
+    return msgpack.packb(compact_payload(payload, catalogue_version), use_single_float=True, default=_builtin)
+
+
+def choose_encoding(accept_encodings):
+    """'br', 'gzip' or None for a client's Accept-Encoding (werkzeug Accept)"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def decompress(body, encoding):
+    """Inverse of compress, for clients and tools reading responses"""
+    if encoding == 'br':
+        return brotli.decompress(body)
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    return body
+
+
+def unpack(body):
+    """Payload of a MessagePack body (still in its compact form)"""
+    return msgpack.unpackb(body)
+
+
+def compress_response(response, accept_encodings, min_bytes=COMPRESS_MIN_BYTES):
+    """Compress a buffered JSON/MessagePack/text response in place if it is large enough"""
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSED_MIMETYPES):
+        return response
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None or response.content_length is None or response.content_length < min_bytes:
+        return response
+
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    # The encoded bytes differ from the identity ones, so a strong ETag no longer holds
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,91 @@
+"""
+Production entry point: serves asgi.application with uvicorn
+
+    python serve.py --workers 4 --limit-concurrency 5000
+
+Each worker process imports the app, warms up its models and serves its
+connections from an event loop. Options default to the environment variables
+named in their help text.
+"""
+import argparse
+import logging
+import os
+
+from instrumentation import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name, default=None):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def raise_open_file_limit():
+    """Raise the soft open-file limit to the hard limit; every connection holds a descriptor"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        target = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            logger.warning("Could not raise the open file limit above %d", soft)
+    return soft
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the emotion-aware study assistant")
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'), help="Bind address (HOST)")
+    parser.add_argument('--port', type=int, default=_env_int('PORT', 5000), help="Port (PORT)")
+    parser.add_argument('--workers', type=int, default=_env_int('WEB_WORKERS', 1),
+                        help="Server processes, each with its own event loop and models (WEB_WORKERS)")
+    parser.add_argument('--limit-concurrency', type=int, default=_env_int('WEB_LIMIT_CONCURRENCY'),
+                        help="Connections plus in-flight requests per worker before new ones get 503 "
+                             "(WEB_LIMIT_CONCURRENCY, default unlimited)")
+    parser.add_argument('--backlog', type=int, default=_env_int('WEB_BACKLOG', 2048),
+                        help="Pending connections queued by the kernel (WEB_BACKLOG)")
+    parser.add_argument('--keep-alive', type=int, default=_env_int('WEB_KEEP_ALIVE', 30),
+                        help="Seconds an idle HTTP keep-alive connection is held open (WEB_KEEP_ALIVE)")
+    parser.add_argument('--ws-ping-interval', type=float, default=float(os.environ.get('WS_PING_INTERVAL', 20)),
+                        help="Seconds between WebSocket pings that detect dead clients (WS_PING_INTERVAL)")
+    parser.add_argument('--wsgi-threads', type=int, default=None,
+                        help="Threads running plain Flask views per worker (ASGI_WSGI_THREADS)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging()
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("uvicorn is not installed; run 'pip install uvicorn[standard]'")
+
+    if args.wsgi_threads is not None:
+        # Read by asgi.py when each worker imports it
+        os.environ['ASGI_WSGI_THREADS'] = str(args.wsgi_threads)
+    open_files = raise_open_file_limit()
+    logger.info("Serving on %s:%d with %d worker(s), open file limit %s",
+                args.host, args.port, args.workers, open_files)
+
+    uvicorn.run(
+        'asgi:application',
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        limit_concurrency=args.limit_concurrency,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        ws_ping_interval=args.ws_ping_interval,
+        lifespan='on',
+        log_config=None
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from emotion_aggregator import EMOTION_LABELS
+
+# Hourly and daily buckets older than this are dropped; totals are kept forever
+ROLLUP_HOURS = int(os.environ.get('ROLLUP_HOURS', 48))
+ROLLUP_DAYS = int(os.environ.get('ROLLUP_DAYS', 90))
+
+STRESS_LEVELS = ['Low', 'Medium', 'High']
+# Weight of each stress level in a bucket's stress_index (0 = all Low, 1 = all High)
+STRESS_WEIGHTS = np.array([0.0, 0.5, 1.0])
+
+HOUR_FORMAT = '%Y-%m-%dT%H'
+DAY_FORMAT = '%Y-%m-%d'
+
+# Every rollup (the totals and each bucket) is one vector with these columns,
+# so adding a session to it is a single vector addition
+ROLLUP_COLUMNS = (
+    ['sessions', 'emotion_sessions', 'voice_sessions']
+    + [f'dominant_{label}' for label in EMOTION_LABELS]
+    + [f'score_{label}' for label in EMOTION_LABELS]
+    + [f'stress_{level.lower()}' for level in STRESS_LEVELS]
+)
+_DOMINANT = slice(3, 3 + len(EMOTION_LABELS))
+_SCORES = slice(_DOMINANT.stop, _DOMINANT.stop + len(EMOTION_LABELS))
+_STRESS = slice(_SCORES.stop, _SCORES.stop + len(STRESS_LEVELS))
+_LABEL_INDEX = {label: i for i, label in enumerate(EMOTION_LABELS)}
+_STRESS_INDEX = {level: i for i, level in enumerate(STRESS_LEVELS)}
+
+
+def session_vector(session_data):
+    """The ROLLUP_COLUMNS contribution of one stored session"""
+    vector = np.zeros(len(ROLLUP_COLUMNS), dtype=np.float64)
+    vector[0] = 1
+
+    emotion = session_data.get('emotion_analysis')
+    if emotion:
+        vector[1] = 1
+        i = _LABEL_INDEX.get(emotion.get('dominant_emotion'))
+        if i is not None:
+            vector[_DOMINANT.start + i] = 1
+        for label, score in (emotion.get('emotion_percentages') or {}).items():
+            i = _LABEL_INDEX.get(label)
+            if i is not None:
+                vector[_SCORES.start + i] = score
+
+    voice = session_data.get('voice_analysis')
+    if voice:
+        vector[2] = 1
+        i = _STRESS_INDEX.get(voice.get('stress_level'))
+        if i is not None:
+            vector[_STRESS.start + i] = 1
+
+    return vector
+
+
+def bucket_keys(timestamp):
+    """(hour, day) bucket of an ISO timestamp, or (None, None) if it has no hour"""
+    if not timestamp or len(timestamp) < 13:
+        return None, None
+    return timestamp[:13], timestamp[:10]
+
+
+def window_start(hours, days, now=None):
+    """Oldest (hour, day) bucket inside a window of the last `hours` hours and `days` days"""
+    now = now or datetime.now()
+    return (
+        (now - timedelta(hours=max(hours, 1) - 1)).strftime(HOUR_FORMAT),
+        (now - timedelta(days=max(days, 1) - 1)).strftime(DAY_FORMAT)
+    )
+
+
+def summarize(vector):
+    """Turn a rollup vector into the JSON summary served by /session_rollups"""
+    emotion_sessions = vector[1]
+    voice_sessions = vector[2]
+    dominant = vector[_DOMINANT]
+    stress = vector[_STRESS]
+
+    summary = {
+        'sessions': int(vector[0]),
+        'emotion_sessions': int(emotion_sessions),
+        'voice_sessions': int(voice_sessions),
+        'dominant_emotion': None,
+        'dominant_counts': {label: int(count) for label, count in zip(EMOTION_LABELS, dominant)},
+        'emotion_distribution': None,
+        'stress_counts': {level: int(count) for level, count in zip(STRESS_LEVELS, stress)},
+        'stress_index': None
+    }
+    if emotion_sessions:
+        mean = vector[_SCORES] / emotion_sessions
+        summary['emotion_distribution'] = {label: float(score) for label, score in zip(EMOTION_LABELS, mean)}
+        summary['dominant_emotion'] = EMOTION_LABELS[int(np.argmax(dominant))] if dominant.any() else None
+    if stress.sum():
+        summary['stress_index'] = float(stress @ STRESS_WEIGHTS / stress.sum())
+    return summary
+
+
+def format_rollup(total, hourly, daily, user_id=None):
+    """
+    Build the /session_rollups payload
+
+    Args:
+        total: Rollup vector over every session in scope
+        hourly, daily: Dicts of bucket key -> rollup vector, only non-empty buckets
+        user_id: User the rollup belongs to, None for all users
+    """
+    rollup = summarize(total)
+    rollup['user'] = user_id
+    rollup['hourly'] = [dict(summarize(vector), bucket=key) for key, vector in sorted(hourly.items())]
+    rollup['daily'] = [dict(summarize(vector), bucket=key) for key, vector in sorted(daily.items())]
+    return rollup
+
+
+class _ScopeRollup:
+    """Totals plus hourly and daily buckets for all users or one user"""
+
+    def __init__(self):
+        self.total = np.zeros(len(ROLLUP_COLUMNS), dtype=np.float64)
+        self.hours = {}
+        self.days = {}
+        self.last_id = 0
+
+    def add(self, vector, hour, day, session_id, max_hours, max_days):
+        self.total += vector
+        self.last_id = session_id
+        if hour is None:
+            return
+        self._add_bucket(self.hours, hour, vector, HOUR_FORMAT, timedelta(hours=max_hours - 1))
+        self._add_bucket(self.days, day, vector, DAY_FORMAT, timedelta(days=max_days - 1))
+
+    @staticmethod
+    def _add_bucket(buckets, key, vector, key_format, retention):
+        bucket = buckets.get(key)
+        if bucket is not None:
+            bucket += vector
+            return
+        buckets[key] = vector.copy()
+        # A new bucket moves the window on; drop the ones that fell out of it
+        oldest = (datetime.strptime(key, key_format) - retention).strftime(key_format)
+        for stale in [k for k in buckets if k < oldest]:
+            del buckets[stale]
+
+
+class SessionRollups:
+    """Incrementally maintained session aggregates for the in-memory store
+
+    Every appended session is added to the running totals and to its hourly
+    and daily bucket, both for all users and for its own user, so a rollup
+    read costs the same however much history has been recorded. Rollups
+    count every session appended since the process started, including ones
+    the store has since evicted from its history. A user's own rollup is
+    dropped by the store (see drop()) once none of their sessions is left,
+    so it lives as long as the user's partition and memory stays bounded
+    however many one-off user ids are seen.
+    """
+
+    def __init__(self, max_hours=ROLLUP_HOURS, max_days=ROLLUP_DAYS):
+        self.max_hours = max(1, int(max_hours))
+        self.max_days = max(1, int(max_days))
+        # Changes on restart, so versions of a new process never match old ETags
+        self.epoch = uuid.uuid4().hex[:8]
+        self._scopes = {None: _ScopeRollup()}
+        self._lock = threading.Lock()
+
+    def add(self, session_data, session_id, user_id=None):
+        vector = session_vector(session_data)
+        hour, day = bucket_keys(session_data.get('timestamp'))
+        with self._lock:
+            scopes = [self._scopes[None]]
+            if user_id is not None:
+                scopes.append(self._scopes.setdefault(user_id, _ScopeRollup()))
+            for scope in scopes:
+                scope.add(vector, hour, day, session_id, self.max_hours, self.max_days)
+
+    def drop(self, user_id):
+        """Forget a user's rollup (the all-users rollup keeps their sessions)"""
+        with self._lock:
+            self._scopes.pop(user_id, None)
+
+    def version(self, user_id=None):
+        """Token that changes whenever the rollup of this scope changes"""
+        scope = self._scopes.get(user_id)
+        return f"{self.epoch}.{scope.last_id if scope else 0}"
+
+    def rollup(self, user_id=None, hours=24, days=7):
+        """Totals plus the hourly and daily buckets of the last `hours` hours and `days` days"""
+        first_hour, first_day = window_start(hours, days)
+        with self._lock:
+            scope = self._scopes.get(user_id) or _ScopeRollup()
+            return format_rollup(
+                scope.total,
+                {key: vector for key, vector in scope.hours.items() if key >= first_hour},
+                {key: vector for key, vector in scope.days.items() if key >= first_day},
+                user_id
+            )
@@ -0,0 +1,443 @@
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+
+from session_rollups import (ROLLUP_COLUMNS, ROLLUP_DAYS, ROLLUP_HOURS, SessionRollups, bucket_keys,
+                             format_rollup, session_vector, window_start)
+
+
+class _UserPartition:
+    """One user's sessions in a ring of at most ``capacity`` records
+
+    Records are (user sequence number, session id, session data). Writers
+    fill ``records`` and then publish the new ``count``; readers take
+    ``count`` once and walk back from it without a lock, so they see the
+    sessions published before they started and nothing half-written. A
+    record whose sequence number differs from the one expected at its slot
+    has been overwritten, which ends the walk.
+    """
+
+    __slots__ = ('capacity', 'records', 'first', 'count')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.records = []
+        self.first = 0   # sequence number of the oldest session still stored
+        self.count = 0   # sequence number of the next session
+
+    def append(self, session_id, session_data):
+        seq = self.count
+        record = (seq, session_id, session_data)
+        if len(self.records) < self.capacity:
+            self.records.append(record)
+        else:
+            self.records[seq % self.capacity] = record
+        self.first = max(self.first, seq + 1 - self.capacity)
+        self.count = seq + 1
+        return seq
+
+    def newest_first(self, before=None):
+        """(session id, session data) pairs, newest first, as of the call
+
+        With ``before``, the walk starts at the newest session with a lower
+        id, found by bisecting the sequence numbers (ids grow with them).
+        """
+        count = self.count
+        records = self.records
+        oldest = max(self.first, count - self.capacity)
+        if before is not None:
+            lo, hi = oldest, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                record = records[mid % self.capacity]
+                # An overwritten slot means mid is older than anything still stored
+                if record[0] != mid or record[1] < before:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            count = lo
+        for seq in range(count - 1, oldest - 1, -1):
+            record = records[seq % self.capacity]
+            if record[0] != seq:
+                return
+            yield record[1], record[2]
+
+
+class _Shard:
+    __slots__ = ('lock', 'partitions')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.partitions = {}
+
+
+class MemorySessionStore:
+    """Bounded in-memory session store, partitioned by user
+
+    Every session gets an increasing integer id, which doubles as the
+    pagination cursor. Sessions are appended as they happen, so id order is
+    also timestamp order and pages are read without sorting.
+
+    Each user's sessions live in their own partition (at most
+    ``max_sessions_per_user``), so a user's history is one dict lookup away
+    and never mixes with anyone else's. Partitions are spread over
+    ``shards`` locks by user, so writers for different users rarely wait on
+    each other. All sessions are also kept, by id, in a ring buffer of
+    ``max_sessions`` for the all-users view; a session overwritten there is
+    dropped from its user's partition too, which bounds the memory of the
+    whole store. Reads take no lock: they see a consistent snapshot of the
+    sessions stored before they started while writers carry on.
+    Rollups (see rollup()) are updated on every append rather than computed
+    from the stored sessions; a user's rollup is dropped with their partition.
+    """
+
+    def __init__(self, max_sessions=10000, max_sessions_per_user=None, shards=16):
+        self.max_sessions = max(1, int(max_sessions))
+        self.max_sessions_per_user = max(1, int(max_sessions_per_user or self.max_sessions))
+        # Records are (session id, user id, partition, user sequence number, session data)
+        self._ring = [None] * self.max_sessions
+        self._shards = [_Shard() for _ in range(max(1, int(shards)))]
+        self._next_id = 1
+        self._id_lock = threading.Lock()
+        self._rollups = SessionRollups()
+
+    def append(self, session_data, user_id=None):
+        """Store a session and return its id"""
+        shard = self._shard(user_id)
+        with shard.lock:
+            partition = shard.partitions.get(user_id)
+            if partition is None:
+                partition = shard.partitions[user_id] = _UserPartition(self.max_sessions_per_user)
+            seq = partition.count
+            # Taken under the shard lock, so each user's ids follow their sequence
+            # numbers; the ring slot is replaced under the id lock, so a slot
+            # always holds the newest id that maps to it
+            with self._id_lock:
+                session_id = self._next_id
+                self._next_id += 1
+                slot = session_id % self.max_sessions
+                evicted = self._ring[slot]
+                self._ring[slot] = (session_id, user_id, partition, seq, session_data)
+            partition.append(session_id, session_data)
+            # Under the shard lock, so it cannot race _evict dropping this user's rollup
+            self._rollups.add(session_data, session_id, user_id=user_id)
+
+        if evicted is not None:
+            self._evict(evicted)
+
+        return session_id
+
+    def page(self, limit=50, before=None, user_id=None, since=None):
+        """
+        Return one page of sessions, newest first
+
+        Args:
+            limit: Maximum number of sessions to return
+            before: Only return sessions with an id lower than this cursor
+            user_id: Only return this user's sessions
+            since: Only return sessions with a timestamp at or after this ISO string
+
+        Returns:
+            tuple: (list of session dicts, cursor for the next page or None)
+        """
+        # Both walks start at the cursor, so a deep page costs the same as the first
+        if user_id is None:
+            candidates = self._all_newest_first(before)
+        else:
+            partition = self._shard(user_id).partitions.get(user_id)
+            candidates = partition.newest_first(before) if partition is not None else ()
+
+        sessions = []
+        last_id = None
+        exhausted = True
+        for session_id, session_data in candidates:
+            if since is not None and session_data.get('timestamp', '') < since:
+                break
+            if len(sessions) >= limit:
+                exhausted = False
+                break
+            sessions.append(session_data)
+            last_id = session_id
+
+        return sessions, (None if exhausted else last_id)
+
+    def count(self, user_id=None):
+        if user_id is None:
+            return min(self._next_id - 1, self.max_sessions)
+        partition = self._shard(user_id).partitions.get(user_id)
+        return partition.count - partition.first if partition is not None else 0
+
+    def rollup(self, user_id=None, hours=24, days=7):
+        """
+        Aggregates over every session of a user (or all users)
+
+        Args:
+            user_id: Only count this user's sessions
+            hours: Hourly buckets to return, ending with the current hour
+            days: Daily buckets to return, ending with today
+
+        Returns:
+            dict: Totals ('sessions', 'dominant_counts', 'emotion_distribution',
+            'stress_counts', 'stress_index', ...) plus 'hourly' and 'daily'
+            lists of non-empty buckets with the same fields, oldest first
+        """
+        return self._rollups.rollup(user_id, hours=hours, days=days)
+
+    def rollup_version(self, user_id=None):
+        """Token that changes whenever rollup(user_id) gains a session"""
+        return self._rollups.version(user_id)
+
+    def _shard(self, user_id):
+        return self._shards[hash(user_id) % len(self._shards)]
+
+    def _all_newest_first(self, before=None):
+        newest_id = self._next_id - 1
+        start = newest_id if before is None else min(newest_id, before - 1)
+        for session_id in range(start, max(0, newest_id - self.max_sessions), -1):
+            record = self._ring[session_id % self.max_sessions]
+            if record is None or record[0] < session_id:
+                # Id handed out, session not written yet: not part of this snapshot
+                continue
+            if record[0] > session_id:
+                # Overwritten by a newer session; everything older is gone too
+                return
+            yield session_id, record[4]
+
+    def _evict(self, record):
+        _, user_id, partition, seq, _ = record
+        shard = self._shard(user_id)
+        with shard.lock:
+            # Ring eviction goes in id order, which is each user's sequence order
+            partition.first = max(partition.first, seq + 1)
+            if partition.first >= partition.count and shard.partitions.get(user_id) is partition:
+                del shard.partitions[user_id]
+                self._rollups.drop(user_id)
+
+
+class SQLiteSessionStore:
+    """Session store persisted to a SQLite database
+
+    Sessions are kept as JSON alongside indexed user and timestamp columns,
+    so they survive restarts and history pages are served from the indexes.
+    When ``max_sessions`` (or ``max_sessions_per_user``) is set, the oldest
+    sessions beyond that count (per user) are pruned periodically.
+
+    Rollups live in a second table with one row per (user, period, bucket).
+    Each append adds the session to its rows in the same transaction with
+    an upsert, so every worker process sharing the database reads the same
+    aggregates.
+    """
+
+    # Prune when a session id is a multiple of this. Ids are unique across
+    # threads and worker processes, so this runs once per PRUNE_EVERY appends
+    PRUNE_EVERY = 500
+
+    # rollups.user_id of the all-users rows
+    ALL_USERS = ''
+
+    _ROLLUP_UPSERT = (
+        f"INSERT INTO rollups (user_id, period, bucket, {', '.join(ROLLUP_COLUMNS)}) "
+        f"VALUES (?, ?, ?, {', '.join('?' * len(ROLLUP_COLUMNS))}) "
+        f"ON CONFLICT (user_id, period, bucket) DO UPDATE SET "
+        + ', '.join(f"{column} = {column} + excluded.{column}" for column in ROLLUP_COLUMNS)
+    )
+
+    def __init__(self, path, max_sessions=None, max_sessions_per_user=None,
+                 max_hours=ROLLUP_HOURS, max_days=ROLLUP_DAYS):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.max_sessions_per_user = max_sessions_per_user
+        self.max_hours = max(1, int(max_hours))
+        self.max_days = max(1, int(max_days))
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                timestamp TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_timestamp ON sessions (timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id, id)")
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS rollups (
+                user_id TEXT NOT NULL,
+                period TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                {', '.join(f'{column} REAL NOT NULL DEFAULT 0' for column in ROLLUP_COLUMNS)},
+                PRIMARY KEY (user_id, period, bucket)
+            )
+        """)
+        conn.commit()
+        self._backfill_rollups(conn)
+
+    def append(self, session_data, user_id=None):
+        """Store a session and return its id"""
+        conn = self._connection()
+        cursor = conn.execute(
+            "INSERT INTO sessions (user_id, timestamp, data) VALUES (?, ?, ?)",
+            (user_id, session_data.get('timestamp', ''), json.dumps(session_data))
+        )
+        conn.executemany(self._ROLLUP_UPSERT, self._rollup_rows(
+            session_vector(session_data), user_id, session_data.get('timestamp')))
+        conn.commit()
+
+        session_id = cursor.lastrowid
+        if session_id % self.PRUNE_EVERY == 0:
+            self._prune(conn)
+
+        return session_id
+
+    def page(self, limit=50, before=None, user_id=None, since=None):
+        """Return one page of sessions, newest first (see MemorySessionStore.page)"""
+        clauses = []
+        params = []
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection().execute(
+            f"SELECT id, data FROM sessions {where} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        sessions = [json.loads(data) for _, data in rows]
+        return sessions, (rows[-1][0] if has_more else None)
+
+    def count(self, user_id=None):
+        conn = self._connection()
+        if user_id is None:
+            return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM sessions WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def rollup(self, user_id=None, hours=24, days=7):
+        """Aggregates over every session of a user or all users (see MemorySessionStore.rollup)"""
+        first_hour, first_day = window_start(hours, days)
+        rows = self._connection().execute(
+            f"SELECT period, bucket, {', '.join(ROLLUP_COLUMNS)} FROM rollups WHERE user_id = ? AND "
+            "(period = 'total' OR (period = 'hour' AND bucket >= ?) OR (period = 'day' AND bucket >= ?))",
+            (self.ALL_USERS if user_id is None else user_id, first_hour, first_day)
+        ).fetchall()
+
+        total = np.zeros(len(ROLLUP_COLUMNS), dtype=np.float64)
+        buckets = {'hour': {}, 'day': {}}
+        for period, bucket, *values in rows:
+            if period == 'total':
+                total = np.array(values, dtype=np.float64)
+            else:
+                buckets[period][bucket] = np.array(values, dtype=np.float64)
+        return format_rollup(total, buckets['hour'], buckets['day'], user_id)
+
+    def rollup_version(self, user_id=None):
+        """Token that changes whenever rollup(user_id) gains a session"""
+        conn = self._connection()
+        if user_id is None:
+            newest = conn.execute("SELECT MAX(id) FROM sessions").fetchone()[0]
+        else:
+            newest = conn.execute("SELECT MAX(id) FROM sessions WHERE user_id = ?", (user_id,)).fetchone()[0]
+        return str(newest or 0)
+
+    def _rollup_rows(self, vector, user_id, timestamp):
+        hour, day = bucket_keys(timestamp)
+        values = vector.tolist()
+        rows = []
+        for scope in ([self.ALL_USERS] if user_id is None else [self.ALL_USERS, user_id]):
+            rows.append((scope, 'total', '', *values))
+            if hour is not None:
+                rows.append((scope, 'hour', hour, *values))
+                rows.append((scope, 'day', day, *values))
+        return rows
+
+    def _backfill_rollups(self, conn):
+        # Databases written before rollups existed get theirs built once;
+        # BEGIN IMMEDIATE keeps workers starting together from doing it twice
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            empty = conn.execute("SELECT 1 FROM rollups LIMIT 1").fetchone() is None
+            if empty:
+                for user_id, data in conn.execute("SELECT user_id, data FROM sessions ORDER BY id"):
+                    session_data = json.loads(data)
+                    conn.executemany(self._ROLLUP_UPSERT, self._rollup_rows(
+                        session_vector(session_data), user_id, session_data.get('timestamp')))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _prune(self, conn):
+        if self.max_sessions:
+            conn.execute(
+                "DELETE FROM sessions WHERE id <= (SELECT MAX(id) FROM sessions) - ?",
+                (self.max_sessions,)
+            )
+        if self.max_sessions_per_user:
+            conn.execute("""
+                DELETE FROM sessions WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id DESC) AS newer
+                        FROM sessions WHERE user_id IS NOT NULL
+                    ) WHERE newer > ?
+                )
+            """, (self.max_sessions_per_user,))
+        # Buckets that fell out of the retention window; totals are kept
+        oldest_hour, oldest_day = window_start(self.max_hours, self.max_days)
+        conn.execute(
+            "DELETE FROM rollups WHERE (period = 'hour' AND bucket < ?) OR (period = 'day' AND bucket < ?)",
+            (oldest_hour, oldest_day)
+        )
+        # Rollups of users with no session left, as the in-memory store drops them
+        conn.execute(
+            "DELETE FROM rollups WHERE user_id != ? AND user_id NOT IN "
+            "(SELECT user_id FROM sessions WHERE user_id IS NOT NULL)",
+            (self.ALL_USERS,)
+        )
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def create_session_store(spec, max_sessions=10000, max_sessions_per_user=None, shards=16):
+    """
+    Create a session store from a spec string
+
+    Args:
+        spec: 'memory' for the in-memory store, or 'sqlite:<path>'
+        max_sessions: Retention limit for either backend
+        max_sessions_per_user: Per-user retention limit for either backend
+        shards: Lock shards of the in-memory store
+
+    Returns:
+        MemorySessionStore or SQLiteSessionStore
+    """
+    if spec in (None, '', 'memory'):
+        return MemorySessionStore(max_sessions=max_sessions, max_sessions_per_user=max_sessions_per_user,
+                                  shards=shards)
+    if spec.startswith('sqlite:'):
+        return SQLiteSessionStore(spec[len('sqlite:'):], max_sessions=max_sessions,
+                                  max_sessions_per_user=max_sessions_per_user)
+    raise ValueError(f"Unknown session store: {spec}")
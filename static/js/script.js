@@ -57,29 +57,147 @@ function captureAndAnalyze(video) {
     const ctx = canvas.getContext('2d');
     ctx.drawImage(video, 0, 0);
 
-    // Convert to base64
-    const imageData = canvas.toDataURL('image/jpeg');
-
-    // Send to server
-    fetch('/analyze_emotion', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({ image: imageData })
-    })
-        .then(response => response.json())
-        .then(data => {
-            displayEmotionResults(data);
-            stopVideoStream();
-            document.getElementById('loading-modal').style.display = 'none';
+    // Send the JPEG as a binary body (no base64/JSON overhead)
+    canvas.toBlob(blob => {
+        fetch('/analyze_emotion_frame', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'image/jpeg'
+            },
+            body: blob
         })
-        .catch(error => {
-            console.error('Error:', error);
-            alert('Error analyzing emotion: ' + error.message);
-            stopVideoStream();
-            document.getElementById('loading-modal').style.display = 'none';
+            .then(response => response.json())
+            .then(data => {
+                displayEmotionResults(data);
+                stopVideoStream();
+                document.getElementById('loading-modal').style.display = 'none';
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                alert('Error analyzing emotion: ' + error.message);
+                stopVideoStream();
+                document.getElementById('loading-modal').style.display = 'none';
+            });
+    }, 'image/jpeg', 0.85);
+}
+
+// Continuous monitoring: stream binary frames over a WebSocket and show each result.
+// While the socket is down, frames go over HTTP and the socket is reopened.
+let emotionSocket = null;
+let monitorTimer = null;
+let reconnectTimer = null;
+let waitingForResult = false;
+const MONITOR_INTERVAL_MS = 1000;
+const RECONNECT_DELAY_MS = 2000;
+const MAX_RECONNECT_DELAY_MS = 30000;
+
+function connectEmotionSocket(delay = RECONNECT_DELAY_MS) {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocol}//${window.location.host}/ws/emotion`);
+    socket.binaryType = 'arraybuffer';
+    socket.onopen = () => {
+        delay = RECONNECT_DELAY_MS;
+    };
+    socket.onmessage = (event) => {
+        waitingForResult = false;
+        const data = JSON.parse(event.data);
+        if (data.type !== 'pong') {
+            displayEmotionResults(data);
+        }
+    };
+    socket.onerror = () => {
+        console.warn('WebSocket unavailable, falling back to HTTP frames');
+        socket.close();
+    };
+    socket.onclose = () => {
+        if (emotionSocket !== socket) {
+            return;
+        }
+        // A frame sent on this socket will get no reply; let the next tick send another
+        emotionSocket = null;
+        waitingForResult = false;
+        if (monitorTimer) {
+            reconnectTimer = setTimeout(() => {
+                reconnectTimer = null;
+                if (monitorTimer) {
+                    connectEmotionSocket(Math.min(delay * 2, MAX_RECONNECT_DELAY_MS));
+                }
+            }, delay);
+        }
+    };
+    emotionSocket = socket;
+}
+
+async function startEmotionMonitoring() {
+    if (monitorTimer) {
+        return;
+    }
+
+    try {
+        videoStream = await navigator.mediaDevices.getUserMedia({
+            video: { facingMode: 'user', width: { ideal: 640 }, height: { ideal: 480 } },
+            audio: false
         });
+    } catch (error) {
+        console.error('Error accessing webcam:', error);
+        alert('Error accessing webcam. ' + error.message);
+        return;
+    }
+
+    const video = document.createElement('video');
+    video.srcObject = videoStream;
+    video.play();
+    isAnalyzing = true;
+
+    const canvas = document.createElement('canvas');
+    const ctx = canvas.getContext('2d');
+    waitingForResult = false;
+
+    monitorTimer = setInterval(() => {
+        // Skip a tick rather than queueing frames while the last one is in flight
+        if (!isAnalyzing || waitingForResult || !video.videoWidth) {
+            return;
+        }
+        canvas.width = video.videoWidth;
+        canvas.height = video.videoHeight;
+        ctx.drawImage(video, 0, 0);
+
+        canvas.toBlob(blob => {
+            waitingForResult = true;
+            if (emotionSocket && emotionSocket.readyState === WebSocket.OPEN) {
+                emotionSocket.send(blob);
+            } else {
+                fetch('/analyze_emotion_frame', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'image/jpeg' },
+                    body: blob
+                })
+                    .then(response => response.json())
+                    .then(data => displayEmotionResults(data))
+                    .catch(error => console.error('Error:', error))
+                    .finally(() => { waitingForResult = false; });
+            }
+        }, 'image/jpeg', 0.8);
+    }, MONITOR_INTERVAL_MS);
+    connectEmotionSocket();
+}
+
+function stopEmotionMonitoring() {
+    if (monitorTimer) {
+        clearInterval(monitorTimer);
+        monitorTimer = null;
+    }
+    if (reconnectTimer) {
+        clearTimeout(reconnectTimer);
+        reconnectTimer = null;
+    }
+    if (emotionSocket) {
+        const socket = emotionSocket;
+        emotionSocket = null;
+        socket.close();
+    }
+    waitingForResult = false;
+    stopVideoStream();
 }
 
 // Display emotion results
@@ -184,15 +302,35 @@ async function startVoiceAnalysis() {
 
         const recognition = new SpeechRecognition();
         recognition.lang = 'en-US';
-        recognition.interimResults = false;
+        recognition.interimResults = true;
         recognition.maxAlternatives = 1;
         recognition.continuous = false; // Stop after one result
 
         let hasResult = false;
 
         recognition.onresult = async (event) => {
+            const result = event.results[0];
+            const transcript = result[0].transcript;
+
+            if (!result.isFinal) {
+                // Live stress estimate while still speaking; interim results are not saved
+                fetch('/analyze_voice', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ transcript: transcript, interim: true })
+                })
+                    .then(response => response.json())
+                    .then(data => {
+                        if (data.success && !hasResult) {
+                            document.querySelector('#loading-modal p').textContent =
+                                `"${transcript}" (stress: ${data.stress_level})`;
+                        }
+                    })
+                    .catch(error => console.error('Interim analysis failed:', error));
+                return;
+            }
+
             hasResult = true;
-            const transcript = event.results[0][0].transcript;
             console.log('Transcript:', transcript);
 
             try {
@@ -334,7 +472,7 @@ async function loadSessionHistory() {
 
         if (data.success) {
             console.log(`Found ${data.sessions.length} sessions`);
-            displaySessionHistory(data.sessions);
+            displaySessionHistory(data.sessions, await loadSessionRollups());
         } else {
             console.error('Failed to load sessions:', data.error);
             document.getElementById('session-history').innerHTML =
@@ -347,7 +485,30 @@ async function loadSessionHistory() {
     }
 }
 
-function displaySessionHistory(sessions) {
+// Server-side aggregates; revalidated with the last ETag so an unchanged
+// dashboard is answered with an empty 304
+let sessionRollups = null;
+let sessionRollupsETag = null;
+
+async function loadSessionRollups() {
+    try {
+        const headers = sessionRollupsETag ? { 'If-None-Match': sessionRollupsETag } : {};
+        const response = await fetch('/session_rollups', { headers, cache: 'no-store' });
+        if (response.status === 304) {
+            return sessionRollups;
+        }
+        const data = await response.json();
+        if (data.success) {
+            sessionRollups = data.rollups;
+            sessionRollupsETag = response.headers.get('ETag');
+        }
+    } catch (error) {
+        console.error('Error loading session rollups:', error);
+    }
+    return sessionRollups;
+}
+
+function displaySessionHistory(sessions, rollups) {
     console.log('displaySessionHistory called with', sessions.length, 'sessions');
     const historyDiv = document.getElementById('session-history');
 
@@ -361,7 +522,8 @@ function displaySessionHistory(sessions) {
         return;
     }
 
-    let historyHTML = `<p class="text-center"><strong>Total Sessions: ${sessions.length}</strong></p>`;
+    const totalSessions = rollups ? rollups.sessions : sessions.length;
+    let historyHTML = `<p class="text-center"><strong>Total Sessions: ${totalSessions}</strong></p>`;
 
     sessions.forEach((session, index) => {
         const timestamp = new Date(session.timestamp).toLocaleString();
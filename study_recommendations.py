@@ -1,8 +1,42 @@
+import json
 import random
+import zlib
+from collections import namedtuple
 from datetime import datetime
 
+# Items drawn from each category per recommendation
+TIPS_PER_RECOMMENDATION = 2
+ACTIVITIES_PER_RECOMMENDATION = 3
+
+STRESS_LEVELS = ('Low', 'Medium', 'High')
+
+# Emotions with less than this share of the probability mass get no items
+# in a blended recommendation
+MIN_BLEND_SHARE = 0.15
+
+# One compiled category: its items and their ids
+_Pool = namedtuple('_Pool', ['texts', 'ids', 'size'])
+# Everything needed to answer one (emotion, stress level) lookup
+_Entry = namedtuple('_Entry', ['tips', 'quotes', 'activities', 'stress_texts', 'stress_ids'])
+
 class StudyRecommendations:
-    def __init__(self):
+    """
+    Study recommendations per emotion and stress level
+    
+    The catalogue is compiled once into tuples indexed by (emotion, stress
+    level); picking a recommendation then costs one random index per item,
+    however large the catalogue is.
+    """
+    
+    def __init__(self, catalogue_path=None, seed=None):
+        """
+        Args:
+            catalogue_path: Optional JSON file with more recommendations, in
+                the same layout as ``self.recommendations`` plus an optional
+                "stress_tips" object; emotions it lists replace the built-in ones
+            seed: Seed for the item selector (None for nondeterministic)
+        """
+        self._random = random.Random(seed)
         self.recommendations = {
             'happy': {
                 'study_tips': [
@@ -146,36 +180,7 @@ class StudyRecommendations:
             }
         }
     
-    def get_recommendations(self, emotion, stress_level=None):
-        """Get personalized recommendations based on emotion and stress level"""
-        emotion_lower = emotion.lower()
-        
-        if emotion_lower not in self.recommendations:
-            emotion_lower = 'neutral'  # Default fallback
-        
-        recs = self.recommendations[emotion_lower]
-        
-        # Select random items from each category
-        selected_tips = random.sample(recs['study_tips'], min(2, len(recs['study_tips'])))
-        selected_quotes = random.sample(recs['motivational_quotes'], min(1, len(recs['motivational_quotes'])))
-        selected_activities = random.sample(recs['activities'], min(3, len(recs['activities'])))
-        
-        # Adjust based on stress level if provided
-        if stress_level:
-            stress_adjustment = self.get_stress_adjustment(stress_level)
-            selected_tips.extend(stress_adjustment)
-        
-        return {
-            'emotion': emotion,
-            'study_tips': selected_tips,
-            'motivational_quote': selected_quotes[0],
-            'recommended_activities': selected_activities,
-            'timestamp': datetime.now().isoformat()
-        }
-    
-    def get_stress_adjustment(self, stress_level):
-        """Get additional recommendations based on stress level"""
-        stress_tips = {
+        self.stress_tips = {
             'High': [
                 "Take 5-minute breathing breaks every 25 minutes.",
                 "Consider shorter study sessions with more frequent breaks.",
@@ -193,4 +198,191 @@ class StudyRecommendations:
             ]
         }
         
-        return stress_tips.get(stress_level, [])
\ No newline at end of file
+        if catalogue_path:
+            self.load_catalogue(catalogue_path)
+        else:
+            self._compile()
+    
+    def load_catalogue(self, path):
+        """Merge recommendations from a JSON data file and recompile"""
+        with open(path, encoding='utf-8') as f:
+            catalogue = json.load(f)
+        
+        stress_tips = catalogue.pop('stress_tips', None)
+        if stress_tips:
+            self.stress_tips.update(stress_tips)
+        for emotion, categories in catalogue.items():
+            missing = {'study_tips', 'motivational_quotes', 'activities'} - set(categories)
+            if missing:
+                raise ValueError(f"Catalogue entry '{emotion}' is missing {', '.join(sorted(missing))}")
+            self.recommendations[emotion.lower()] = categories
+        self._compile()
+    
+    def get_recommendations(self, emotion, stress_level=None, timestamp=None):
+        """Get personalized recommendations based on emotion and stress level"""
+        if not isinstance(emotion, str):
+            emotion = 'neutral'  # Missing or malformed emotion in the request
+        entry = self._lookup(emotion, stress_level)
+        tips, tip_ids = self._pick(entry.tips, TIPS_PER_RECOMMENDATION)
+        activities, activity_ids = self._pick(entry.activities, ACTIVITIES_PER_RECOMMENDATION)
+        quote, quote_id = self._pick(entry.quotes, 1)
+        
+        return {
+            'emotion': emotion,
+            'study_tips': list(tips + entry.stress_texts),
+            'motivational_quote': quote[0],
+            'recommended_activities': list(activities),
+            'item_ids': list(tip_ids + entry.stress_ids + quote_id + activity_ids),
+            'catalogue_version': self.catalogue_version,
+            'timestamp': timestamp or datetime.now().isoformat()
+        }
+    
+    def get_blended_recommendations(self, emotion_scores, stress_level=None, timestamp=None):
+        """
+        Recommendations drawn from several emotions in proportion to their scores
+        
+        Args:
+            emotion_scores: Dict of emotion -> score (percentages or probabilities)
+            stress_level: Optional 'Low', 'Medium' or 'High'
+            
+        Returns:
+            dict: Same layout as get_recommendations, plus 'blend' with the
+            share of each emotion that contributed items
+        """
+        shares = self._blend_shares(emotion_scores)
+        dominant = max(shares, key=shares.get)
+        
+        tips, tip_ids = self._pick_blended(shares, 'tips', TIPS_PER_RECOMMENDATION)
+        activities, activity_ids = self._pick_blended(shares, 'activities', ACTIVITIES_PER_RECOMMENDATION)
+        entry = self._lookup(dominant, stress_level)
+        quote, quote_id = self._pick(entry.quotes, 1)
+        
+        return {
+            'emotion': dominant,
+            'study_tips': tips + list(entry.stress_texts),
+            'motivational_quote': quote[0],
+            'recommended_activities': activities,
+            'item_ids': tip_ids + list(entry.stress_ids + quote_id) + activity_ids,
+            'catalogue_version': self.catalogue_version,
+            'blend': shares,
+            'timestamp': timestamp or datetime.now().isoformat()
+        }
+    
+    def get_recommendations_bulk(self, sessions, blended=False):
+        """
+        Recommendations for many sessions at once, sharing one timestamp
+        
+        Args:
+            sessions: Iterable of (emotion, stress_level) pairs, or of
+                (emotion_scores, stress_level) pairs when ``blended`` is True
+            
+        Returns:
+            list: One recommendation dict per session, in order
+        """
+        timestamp = datetime.now().isoformat()
+        recommend = self.get_blended_recommendations if blended else self.get_recommendations
+        return [recommend(emotion, stress_level, timestamp=timestamp) for emotion, stress_level in sessions]
+    
+    def get_item(self, item_id):
+        """Text of a recommendation item by its id"""
+        return self._items[item_id]
+    
+    def get_items(self):
+        """Texts of every recommendation item, indexed by id"""
+        return list(self._items)
+    
+    def get_stress_adjustment(self, stress_level):
+        """Get additional recommendations based on stress level"""
+        return list(self.stress_tips.get(stress_level, []))
+    
+    def _compile(self):
+        items = []
+        
+        def register(texts):
+            ids = tuple(range(len(items), len(items) + len(texts)))
+            items.extend(texts)
+            return tuple(texts), ids
+        
+        def pool(texts):
+            texts, ids = register(texts)
+            return _Pool(texts, ids, len(texts))
+        
+        stress = {level: register(self.stress_tips.get(level, [])) for level in STRESS_LEVELS}
+        stress[None] = ((), ())
+        
+        entries = {}
+        for emotion, categories in self.recommendations.items():
+            tips = pool(categories['study_tips'])
+            quotes = pool(categories['motivational_quotes'])
+            activities = pool(categories['activities'])
+            if quotes.size == 0:
+                raise ValueError(f"Catalogue entry '{emotion}' has no motivational quotes")
+            for level, (stress_texts, stress_ids) in stress.items():
+                entries[(emotion, level)] = _Entry(tips, quotes, activities, stress_texts, stress_ids)
+        
+        self._items = tuple(items)
+        # Changes whenever an item or its id changes, so clients know when to refetch the catalogue
+        self.catalogue_version = f"{zlib.crc32(json.dumps(items).encode('utf-8')):08x}"
+        self._entries = entries
+    
+    def _lookup(self, emotion, stress_level):
+        entry = self._entries.get((emotion.lower(), stress_level))
+        if entry is None:
+            emotion = emotion.lower()
+            if emotion not in self.recommendations:
+                emotion = 'neutral'  # Default fallback
+            if stress_level not in STRESS_LEVELS:
+                stress_level = None
+            entry = self._entries[(emotion, stress_level)]
+        return entry
+    
+    def _pick(self, pool, count):
+        # `count` distinct items drawn independently, so every combination can come up
+        count = min(count, pool.size)
+        if count == 0:
+            return (), ()
+        draw, size = self._random.random, pool.size
+        index = int(draw() * size)
+        if count == 1:
+            return pool.texts[index:index + 1], pool.ids[index:index + 1]
+        indices = [index]
+        while len(indices) < count:
+            index = int(draw() * size)
+            if index not in indices:
+                indices.append(index)
+        texts, ids = pool.texts, pool.ids
+        return tuple([texts[i] for i in indices]), tuple([ids[i] for i in indices])
+    
+    def _blend_shares(self, emotion_scores):
+        scores = {}
+        for emotion, score in emotion_scores.items():
+            if not isinstance(emotion, str) or not isinstance(score, (int, float)):
+                continue
+            emotion = emotion.lower()
+            if emotion in self.recommendations and score > 0:
+                scores[emotion] = float(score)
+        total = sum(scores.values())
+        if total <= 0:
+            return {'neutral': 1.0}
+        
+        shares = {emotion: score / total for emotion, score in scores.items() if score / total >= MIN_BLEND_SHARE}
+        if not shares:
+            shares = {max(scores, key=scores.get): 1.0}
+        total = sum(shares.values())
+        return {emotion: share / total for emotion, share in shares.items()}
+    
+    def _pick_blended(self, shares, category, count):
+        # Largest-remainder split of the item slots between the emotions
+        quotas = {emotion: share * count for emotion, share in shares.items()}
+        slots = {emotion: int(quota) for emotion, quota in quotas.items()}
+        by_remainder = sorted(quotas, key=lambda e: quotas[e] - slots[e], reverse=True)
+        for emotion in by_remainder[:count - sum(slots.values())]:
+            slots[emotion] += 1
+        
+        texts, ids = [], []
+        for emotion in sorted(slots, key=shares.get, reverse=True):
+            pool = getattr(self._entries[(emotion, None)], category)
+            picked_texts, picked_ids = self._pick(pool, slots[emotion])
+            texts.extend(picked_texts)
+            ids.extend(picked_ids)
+        return texts, ids
@@ -0,0 +1,56 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from audio_features import FRAME_SECONDS, analyze_samples, decode_audio, extract_features
+
+
+def tone(frequency, sample_rate, seconds=2.0, amplitude=0.3):
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+@pytest.mark.parametrize('sample_rate', [16000, 22050, 44100, 48000])
+def test_pitch_of_a_tone(sample_rate):
+    features = analyze_samples(tone(200.0, sample_rate), sample_rate)
+    assert features['voiced_ratio'] > 0.9
+    assert features['pitch_mean'] == pytest.approx(200.0, rel=0.05)
+    assert features['spectral_centroid'] == pytest.approx(200.0, rel=0.1)
+
+
+def test_silence_is_unvoiced():
+    features = analyze_samples(np.zeros(16000, dtype=np.float32), 16000)
+    assert features['voiced_ratio'] == 0.0
+    assert features['pitch_mean'] == 0.0
+
+
+def test_features_follow_the_frames_at_any_rate():
+    # A tone that starts half way: the downsampled frames must switch at the same
+    # frame as the full-rate energy, even when the rates do not divide evenly
+    sample_rate = 44100
+    samples = np.concatenate([np.zeros(sample_rate, dtype=np.float32), tone(150.0, sample_rate, seconds=1.0)])
+    features = extract_features(samples, sample_rate)
+    loud = features['rms_db'] > -30
+    assert np.array_equal(features['voiced'], loud)
+
+
+def test_zero_crossing_rate_of_a_tone():
+    sample_rate = 16000
+    features = extract_features(tone(1000.0, sample_rate), sample_rate)
+    assert np.allclose(features['zcr'], 2 * 1000.0 / sample_rate, atol=2.0 / (sample_rate * FRAME_SECONDS))
+
+
+def test_decode_pcm_wav():
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes((np.full((100, 2), 16384, dtype='<i2')).tobytes())
+
+    samples, sample_rate = decode_audio(buffer.getvalue())
+    assert sample_rate == 16000
+    assert samples.shape == (100,)
+    assert samples[0] == pytest.approx(0.5, abs=1e-3)
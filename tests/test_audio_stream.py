@@ -0,0 +1,70 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from audio_stream import AudioStream
+from voice_analyzer import VoiceAnalyzer
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return VoiceAnalyzer()
+
+
+def pcm16(seconds, sample_rate=16000):
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    return (0.3 * 32767 * np.sin(2 * np.pi * 200.0 * t)).astype('<i2').tobytes()
+
+
+def wav(data, sample_rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(data)
+    return buffer.getvalue()
+
+
+def test_empty_pcm_stream_has_no_result(analyzer):
+    stream = AudioStream(analyzer, audio_format='pcm16')
+    with pytest.raises(ValueError):
+        stream.finish()
+
+
+def test_wav_header_without_samples_has_no_result(analyzer):
+    stream = AudioStream(analyzer)
+    stream.feed(wav(b''))
+    assert stream.sample_rate == 16000
+    with pytest.raises(ValueError):
+        stream.finish()
+
+
+def test_odd_byte_is_not_a_sample(analyzer):
+    stream = AudioStream(analyzer, audio_format='pcm16')
+    stream.feed(b'\x01')
+    with pytest.raises(ValueError):
+        stream.finish()
+
+
+def test_short_stream_is_analyzed(analyzer):
+    stream = AudioStream(analyzer, audio_format='pcm16')
+    stream.feed(pcm16(0.01))
+    result = stream.finish()
+    assert result['final']
+    assert result['seconds'] == pytest.approx(0.01)
+
+
+def test_interim_results_then_final(analyzer):
+    stream = AudioStream(analyzer, interim_seconds=1)
+    data = wav(pcm16(3.0))
+    interims = [stream.feed(data[i:i + 4000]) for i in range(0, len(data), 4000)]
+    interims = [interim for interim in interims if interim is not None]
+    result = stream.finish()
+
+    assert len(interims) == 2
+    assert not any(interim['final'] for interim in interims)
+    assert result['seconds'] == pytest.approx(3.0)
+    assert result['features']['pitch_mean'] == pytest.approx(200.0, rel=0.05)
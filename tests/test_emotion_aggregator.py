@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from emotion_aggregator import EMOTION_LABELS, EmotionAggregator, EmotionAggregatorPool
+
+
+def random_frames(count, seed=0):
+    rng = np.random.default_rng(seed)
+    scores = rng.dirichlet(np.ones(len(EMOTION_LABELS)), size=count) * 100
+    times = np.cumsum(rng.uniform(0.05, 0.5, size=count))
+    return scores, times
+
+
+def naive_average(scores, times, now, seconds, capacity):
+    # Only the newest `capacity` frames are kept
+    scores, times = scores[-capacity:], times[-capacity:]
+    inside = times >= now - seconds
+    return scores[inside].mean(axis=0) if inside.any() else None
+
+
+def naive_ema(scores, alpha):
+    ema = scores[0].copy()
+    for vector in scores[1:]:
+        ema = alpha * vector + (1 - alpha) * ema
+    return ema
+
+
+@pytest.mark.parametrize('capacity', [1000, 50])
+def test_windows_match_a_naive_recomputation(capacity):
+    scores, times = random_frames(300)
+    aggregator = EmotionAggregator(capacity=capacity)
+    for vector, timestamp in zip(scores, times):
+        aggregator.update(dict(zip(EMOTION_LABELS, vector)), timestamp=timestamp)
+
+    now = times[-1]
+    for seconds in (0.01, 1, 5, 10, 60, 1000):
+        expected = naive_average(scores, times, now, seconds, capacity)
+        np.testing.assert_allclose(aggregator.average(seconds, now=now), expected)
+    np.testing.assert_allclose(aggregator.average(), scores.mean(axis=0))
+    assert aggregator.average(10, now=now + 100) is None
+
+
+def test_ema_matches_a_naive_recomputation():
+    scores, times = random_frames(100, seed=1)
+    aggregator = EmotionAggregator(ema_alpha=0.2)
+    for vector, timestamp in zip(scores, times):
+        aggregator.update_vector(vector, timestamp=timestamp)
+
+    np.testing.assert_allclose(aggregator.smoothed(), naive_ema(scores, 0.2))
+
+
+def test_unknown_labels_are_ignored_and_missing_ones_are_zero():
+    aggregator = EmotionAggregator()
+    aggregator.update({'happy': 80.0, 'bored': 20.0}, timestamp=1.0)
+    average = dict(zip(EMOTION_LABELS, aggregator.average()))
+    assert average['happy'] == 80.0
+    assert sum(average.values()) == 80.0
+
+
+def test_summary_uses_the_short_window_for_the_dominant_emotion():
+    aggregator = EmotionAggregator()
+    for t in range(60):
+        aggregator.update({'sad': 90.0, 'happy': 10.0}, timestamp=float(t))
+    for t in range(60, 68):
+        aggregator.update({'happy': 90.0, 'sad': 10.0}, timestamp=float(t))
+
+    summary = aggregator.summary(now=67.0)
+    assert summary['frames'] == 68
+    assert summary['dominant_emotion'] == 'happy'
+    assert summary['session']['sad'] > summary['session']['happy']
+    # Frames at 57..67 s: three sad ones, then eight happy ones
+    assert summary['last_10s']['happy'] == pytest.approx((8 * 90 + 3 * 10) / 11)
+
+
+def test_empty_aggregator():
+    aggregator = EmotionAggregator()
+    assert aggregator.average() is None
+    assert aggregator.smoothed() is None
+    assert aggregator.summary(now=0.0)['dominant_emotion'] is None
+
+
+def test_pool_evicts_least_recently_used_sessions():
+    pool = EmotionAggregatorPool(max_sessions=2)
+    first = pool.get('a')
+    pool.get('b')
+    pool.get('a')
+    pool.get('c')
+
+    assert len(pool) == 2
+    assert pool.peek('a') is first
+    assert pool.peek('b') is None
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from face_tracker import FaceTracker, FaceTrackerPool
+
+FRAME_SHAPE = (240, 320)
+FACE = (100, 80, 60, 60)
+
+
+class FakeCascade:
+    """Finds one face at FACE in full frames, and the same face inside a tracker's ROI"""
+
+    def __init__(self):
+        self.calls = []
+        self.visible = True
+        self.faces = [FACE]
+
+    def detectMultiScale(self, image, scale_factor, min_neighbors, minSize=None):
+        kind = 'full' if image.shape == FRAME_SHAPE else 'roi'
+        self.calls.append(kind)
+        if not self.visible:
+            return ()
+        if kind == 'full':
+            return np.array(self.faces)
+        # The ROI is the tracked box padded by half its size on every side
+        x, y, w, h = FACE
+        return np.array([[w // 2, h // 2, w, h]])
+
+
+@pytest.fixture
+def cascade():
+    return FakeCascade()
+
+
+def frame():
+    return np.zeros(FRAME_SHAPE, dtype=np.uint8)
+
+
+def test_full_detection_every_redetect_interval(cascade):
+    tracker = FaceTracker(cascade, detect_width=None, redetect_interval=3)
+    for _ in range(9):
+        assert tracker.detect(frame()).tolist() == [list(FACE)]
+
+    assert cascade.calls == ['full', 'roi', 'roi', 'roi', 'full', 'roi', 'roi', 'roi', 'full']
+    assert tracker.full_detections == 3
+    assert tracker.roi_detections == 6
+
+
+def test_lost_face_falls_back_to_full_detection(cascade):
+    tracker = FaceTracker(cascade, detect_width=None, redetect_interval=10)
+    tracker.detect(frame())
+    cascade.visible = False
+
+    assert len(tracker.detect(frame())) == 0
+    assert cascade.calls == ['full', 'roi', 'full']
+    # Nothing is tracked any more, so the next frame is searched in full
+    tracker.detect(frame())
+    assert cascade.calls[-1] == 'full'
+
+
+def test_stale_track_is_not_reused(cascade):
+    tracker = FaceTracker(cascade, detect_width=None, redetect_interval=10, max_track_age=-1)
+    for _ in range(3):
+        tracker.detect(frame())
+    assert cascade.calls == ['full', 'full', 'full']
+
+
+def test_reset_forces_full_detection(cascade):
+    tracker = FaceTracker(cascade, detect_width=None)
+    tracker.detect(frame())
+    tracker.reset()
+    tracker.detect(frame())
+    assert cascade.calls == ['full', 'full']
+
+
+def test_pool_evicts_least_recently_used_clients(cascade):
+    pool = FaceTrackerPool(cascade, max_clients=2, detect_width=None)
+    first = pool.get('a')
+    pool.get('b')
+    assert pool.get('a') is first
+    pool.get('c')
+
+    assert len(pool) == 2
+    assert pool.get('a') is first
+    assert pool.get('b') is not None and len(pool) == 2
+
+
+def test_pool_searches_multi_face_frames_in_full(cascade):
+    cascade.faces = [(10, 10, 20, 20), FACE]
+    pool = FaceTrackerPool(cascade, detect_width=None)
+    for _ in range(3):
+        faces = pool.detect(frame(), client_id='a', max_faces=None)
+    assert cascade.calls == ['full', 'full', 'full']
+    # Largest face first
+    assert faces.tolist() == [list(FACE), [10, 10, 20, 20]]
+    assert pool.detect(frame(), client_id='a', max_faces=1).tolist() == [list(FACE)]
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from frame_gate import THUMBNAIL_SIZE, FrameChangeGate, frame_signature
+
+RESULT = {'dominant_emotion': 'happy'}
+
+
+def signature(level):
+    return np.full(THUMBNAIL_SIZE[::-1], level, dtype=np.int16)
+
+
+@pytest.fixture
+def gate():
+    gate = FrameChangeGate(threshold=2.5, max_age=2.0)
+    gate.store('a', signature(100), RESULT, now=10.0)
+    return gate
+
+
+def test_unchanged_frame_reuses_the_result(gate):
+    assert gate.lookup('a', signature(102), now=11.0) == dict(RESULT, reused=True)
+    # The cached result itself is not marked
+    assert 'reused' not in RESULT
+
+
+def test_changed_frame_is_analyzed(gate):
+    # The threshold is exclusive: a mean difference of exactly 2.5 is a change
+    assert gate.lookup('a', signature(103), now=11.0) is None
+    changed = signature(100)
+    changed[:, :THUMBNAIL_SIZE[0] // 2] = 105
+    assert gate.lookup('a', changed, now=11.0) is None
+
+
+def test_result_expires_after_max_age(gate):
+    assert gate.lookup('a', signature(100), now=12.0) is not None
+    assert gate.lookup('a', signature(100), now=12.01) is None
+
+
+def test_results_are_kept_per_client(gate):
+    assert gate.lookup('b', signature(100), now=10.0) is None
+    assert gate.lookup(None, signature(100), now=10.0) is None
+    gate.forget('a')
+    assert gate.lookup('a', signature(100), now=10.0) is None
+
+
+@pytest.mark.parametrize('threshold, max_age', [(0, 2.0), (2.5, 0)])
+def test_disabled_gate_never_reuses(threshold, max_age):
+    gate = FrameChangeGate(threshold=threshold, max_age=max_age)
+    gate.store('a', signature(100), RESULT, now=10.0)
+    assert not gate.enabled
+    assert gate.lookup('a', signature(100), now=10.0) is None
+    assert len(gate) == 0
+
+
+def test_least_recently_stored_clients_are_evicted():
+    gate = FrameChangeGate(max_clients=2)
+    for client_id in ('a', 'b', 'a', 'c'):
+        gate.store(client_id, signature(100), RESULT, now=10.0)
+    assert len(gate) == 2
+    assert gate.lookup('b', signature(100), now=10.0) is None
+    assert gate.lookup('a', signature(100), now=10.0) is not None
+
+
+def test_frame_signature_ignores_noise():
+    pytest.importorskip('cv2')
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, size=(480, 640, 3), dtype=np.uint8)
+    noisy = np.clip(frame.astype(np.int16) + rng.integers(-8, 9, size=frame.shape), 0, 255).astype(np.uint8)
+
+    first, second = frame_signature(frame), frame_signature(noisy)
+    assert first.shape == THUMBNAIL_SIZE[::-1]
+    assert np.abs(first - second).mean() < 2.5
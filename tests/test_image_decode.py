@@ -0,0 +1,73 @@
+import base64
+
+import numpy as np
+import pytest
+
+from image_decode import FrameDecoder, decode_base64, scratch_buffer
+
+cv2 = pytest.importorskip('cv2')
+
+
+def jpeg(width=1280, height=720):
+    image = np.random.default_rng(0).integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    ok, encoded = cv2.imencode('.jpg', image)
+    assert ok
+    return encoded.tobytes()
+
+
+@pytest.fixture
+def decoder():
+    return FrameDecoder(detect_width=320, min_face_width=64)
+
+
+def test_first_frame_is_decoded_in_full(decoder):
+    assert decoder.reduction_for('a') == 1
+    assert decoder.decode(jpeg(), client_id='a').shape == (720, 1280, 3)
+
+
+@pytest.mark.parametrize('face_width, reduction', [
+    (None, 4),   # no face: only the detection width limits the reduction
+    (600, 4),    # 1280 / 8 would drop under the detection width
+    (200, 2),    # 200 / 4 = 50 px would be too small a face
+    (100, 1)     # 100 / 2 = 50 px is already too small
+])
+def test_reduction_is_chosen_from_the_face_size(decoder, face_width, reduction):
+    image = decoder.decode(jpeg(), client_id='a')
+    region = None if face_width is None else {'x': 0, 'y': 0, 'w': face_width, 'h': face_width}
+    decoder.observe('a', image.shape, region)
+
+    assert decoder.reduction_for('a') == reduction
+    assert decoder.decode(jpeg(), client_id='a', grayscale=True).shape == (720 // reduction, 1280 // reduction)
+
+
+def test_face_sizes_from_reduced_frames_are_scaled_back(decoder):
+    decoder.decode(jpeg(), client_id='a')
+    decoder.observe('a', (720, 1280), None)
+    image = decoder.decode(jpeg(), client_id='a', grayscale=True)
+    assert image.shape == (180, 320)
+
+    # 40 px in a quarter-size frame is a 160 px face at full size
+    decoder.observe('a', image.shape, {'x': 0, 'y': 0, 'w': 40, 'h': 40})
+    assert decoder.reduction_for('a') == 2
+
+
+def test_small_frames_are_not_reduced(decoder):
+    decoder.decode(jpeg(320, 240), client_id='a')
+    assert decoder.reduction_for('a') == 1
+
+
+def test_undecodable_bytes(decoder):
+    assert decoder.decode(b'not an image', client_id='a') is None
+    assert decoder.decode(b'', client_id='a') is None
+
+
+def test_decode_base64_accepts_data_urls():
+    payload = base64.b64encode(b'\xff\xd8abc').decode('ascii')
+    assert decode_base64('data:image/jpeg;base64,' + payload) == b'\xff\xd8abc'
+    assert decode_base64(payload) == b'\xff\xd8abc'
+
+
+def test_scratch_buffer_is_reused_per_name_and_shape():
+    first = scratch_buffer('test', (4, 4))
+    assert scratch_buffer('test', (4, 4)) is first
+    assert scratch_buffer('test', (2, 2)).shape == (2, 2)
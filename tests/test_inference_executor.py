@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import inference_executor
+from inference_executor import ExecutorSaturated, InferenceExecutor
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """A 'wait' task that blocks until the returned event is set"""
+    event = threading.Event()
+    monkeypatch.setitem(inference_executor.TASKS, 'wait', lambda: event.wait(5))
+    yield event
+    event.set()
+
+
+@pytest.fixture
+def threaded_executor(monkeypatch):
+    """Executor whose worker pool is threads, so test tasks need not be importable by a spawned process"""
+    executor = InferenceExecutor(workers=2, max_pending=2)
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(executor, '_get_pool', lambda: pool)
+    yield executor
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+def test_inline_executor_runs_tasks_in_the_caller():
+    executor = InferenceExecutor(workers=0)
+    assert executor.run('ping') is True
+    executor.start()
+    executor.shutdown()
+
+
+def test_unknown_task_is_rejected():
+    with pytest.raises(KeyError):
+        InferenceExecutor(workers=0).submit('no_such_task')
+
+
+def test_failed_task_frees_its_slot(monkeypatch):
+    def fail():
+        raise ValueError("bad input")
+
+    monkeypatch.setitem(inference_executor.TASKS, 'fail', fail)
+    executor = InferenceExecutor(workers=0, max_pending=1)
+    with pytest.raises(ValueError, match="bad input"):
+        executor.run('fail')
+    assert executor.run('ping') is True
+
+
+def test_saturated_executor_rejects_tasks_until_one_finishes(gate, threaded_executor):
+    futures = [threaded_executor.submit('wait') for _ in range(2)]
+    with pytest.raises(ExecutorSaturated):
+        threaded_executor.submit('ping')
+
+    gate.set()
+    assert [future.result(timeout=5) for future in futures] == [True, True]
+    assert threaded_executor.run('ping', timeout=5) is True
+
+
+def test_run_times_out_while_the_task_keeps_its_slot(gate, threaded_executor):
+    with pytest.raises(TimeoutError):
+        threaded_executor.run('wait', timeout=0.05)
+
+    # The timed-out task is still running and holds one of the two slots
+    other = threaded_executor.submit('wait')
+    with pytest.raises(ExecutorSaturated):
+        threaded_executor.submit('ping')
+    gate.set()
+    assert other.result(timeout=5) is True
@@ -0,0 +1,136 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+class Recorder:
+    """Batch function that doubles its items and remembers each batch"""
+
+    def __init__(self, release=None):
+        self.batches = []
+        self.release = release
+
+    def __call__(self, items):
+        if self.release is not None:
+            self.release.wait(5)
+        self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+
+def test_full_batch_is_flushed_without_waiting():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=4, max_wait_ms=60000)
+    try:
+        started = time.monotonic()
+        futures = batcher.submit_many([1, 2, 3, 4])
+        assert [future.result(timeout=5) for future in futures] == [2, 4, 6, 8]
+        assert time.monotonic() - started < 5
+        assert recorder.batches == [[1, 2, 3, 4]]
+    finally:
+        batcher.close()
+
+
+def test_partial_batch_is_flushed_at_the_deadline():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=16, max_wait_ms=20)
+    try:
+        started = time.monotonic()
+        assert batcher.submit(5).result(timeout=5) == 10
+        assert time.monotonic() - started >= 0.015
+        assert recorder.batches == [[5]]
+    finally:
+        batcher.close()
+
+
+def test_batches_never_exceed_the_maximum_size():
+    release = threading.Event()
+    recorder = Recorder(release)
+    batcher = MicroBatcher(recorder, max_batch_size=3, max_wait_ms=1)
+    try:
+        futures = batcher.submit_many(range(10))
+        release.set()
+        assert [future.result(timeout=5) for future in futures] == [n * 2 for n in range(10)]
+        assert all(len(batch) <= 3 for batch in recorder.batches)
+        assert [item for batch in recorder.batches for item in batch] == list(range(10))
+    finally:
+        batcher.close()
+
+
+def test_submit_raises_queue_full_beyond_max_pending():
+    release = threading.Event()
+    batcher = MicroBatcher(Recorder(release), max_batch_size=1, max_wait_ms=0, max_pending=2)
+    try:
+        first = batcher.submit(0)
+        # Wait until the worker has taken the first item and is blocked on it
+        deadline = time.monotonic() + 5
+        while batcher._pending and time.monotonic() < deadline:
+            time.sleep(0.001)
+        waiting = batcher.submit_many([1, 2])
+        with pytest.raises(queue.Full):
+            batcher.submit(3)
+        release.set()
+        assert [future.result(timeout=5) for future in [first] + waiting] == [0, 2, 4]
+    finally:
+        release.set()
+        batcher.close()
+
+
+def test_errors_reach_every_item_of_the_batch():
+    def fail(items):
+        raise ValueError("model failed")
+
+    batcher = MicroBatcher(fail, max_batch_size=2, max_wait_ms=60000)
+    try:
+        for future in batcher.submit_many([1, 2]):
+            with pytest.raises(ValueError, match="model failed"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_wrong_number_of_results_is_an_error():
+    batcher = MicroBatcher(lambda items: items[:1], max_batch_size=2, max_wait_ms=60000)
+    try:
+        for future in batcher.submit_many([1, 2]):
+            with pytest.raises(RuntimeError, match="1 results for 2 items"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_batch_function_may_return_a_future():
+    pending = []
+
+    def later(items):
+        future = Future()
+        pending.append((future, items))
+        return future
+
+    batcher = MicroBatcher(later, max_batch_size=2, max_wait_ms=60000)
+    try:
+        futures = batcher.submit_many(['a', 'b'])
+        deadline = time.monotonic() + 5
+        while not pending and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert not futures[0].done()
+        result, items = pending[0]
+        result.set_result([item.upper() for item in items])
+        assert [future.result(timeout=5) for future in futures] == ['A', 'B']
+    finally:
+        batcher.close()
+
+
+def test_close_flushes_pending_items_and_rejects_new_ones():
+    recorder = Recorder()
+    batcher = MicroBatcher(recorder, max_batch_size=16, max_wait_ms=60000)
+    future = batcher.submit(1)
+    batcher.close()
+
+    assert future.result(timeout=0) == 2
+    with pytest.raises(RuntimeError):
+        batcher.submit(2)
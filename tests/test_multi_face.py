@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from emotion_aggregator import EMOTION_LABELS, group_emotion
+from face_tracker import FaceTrackerPool
+
+pytest.importorskip('cv2')
+import mock_deepface  # noqa: E402  (needs OpenCV)
+
+FACES = [(20, 20, 80, 80), (150, 40, 40, 40), (240, 60, 60, 60)]
+
+
+class FakeCascade:
+    def __init__(self, faces):
+        self.faces = faces
+
+    def detectMultiScale(self, image, *args, **kwargs):
+        return np.array(self.faces) if self.faces else ()
+
+
+def face(dominant, region=None, **scores):
+    percentages = {label: 0.0 for label in EMOTION_LABELS}
+    percentages.update(scores)
+    return {'dominant_emotion': dominant, 'emotion_percentages': percentages, 'region': region}
+
+
+@pytest.fixture
+def detector():
+    mock_deepface.configure_noise(enabled=False)
+    detector = mock_deepface.MockEmotionDetector()
+    detector.face_trackers = FaceTrackerPool(FakeCascade(FACES), detect_width=None)
+    yield detector
+    mock_deepface.configure_noise()
+
+
+def frame():
+    return np.random.default_rng(0).integers(0, 255, size=(240, 320, 3), dtype=np.uint8)
+
+
+def test_group_emotion_weights_every_face_equally():
+    group = group_emotion([
+        face('happy', {'x': 0}, happy=90.0, sad=10.0),
+        face('sad', {'x': 1}, happy=20.0, sad=80.0),
+        face('sad', {'x': 2}, happy=40.0, sad=60.0)
+    ])
+
+    assert group['face_count'] == 3
+    assert group['emotion_percentages']['happy'] == pytest.approx(50.0)
+    assert group['emotion_percentages']['sad'] == pytest.approx(50.0)
+    # Ties go to the first label in EMOTION_LABELS order
+    assert group['dominant_emotion'] == 'happy'
+    assert [f['region'] for f in group['faces']] == [{'x': 0}, {'x': 1}, {'x': 2}]
+
+
+def test_group_emotion_without_faces():
+    assert group_emotion([]) == {'faces': [], 'face_count': 0}
+
+
+def test_every_face_is_scored_largest_first(detector):
+    result = detector.analyze_image(frame(), max_faces=None)
+
+    assert result['face_count'] == 3
+    assert [f['region']['w'] for f in result['faces']] == [80, 60, 40]
+    mean = {label: np.mean([f['emotion_percentages'][label] for f in result['faces']]) for label in EMOTION_LABELS}
+    assert result['emotion_percentages'] == pytest.approx(mean)
+    assert result['dominant_emotion'] == max(mean, key=mean.get)
+
+
+def test_max_faces_limits_the_faces_per_frame(detector):
+    assert detector.analyze_image(frame(), max_faces=2)['face_count'] == 2
+
+    single = detector.analyze_image(frame(), max_faces=1)
+    assert 'faces' not in single
+    assert single['region']['w'] == 80
+
+
+def test_frames_of_a_batch_keep_their_own_faces(detector):
+    detector.face_trackers.cascade.faces = FACES[:2]
+    results = detector.analyze_batch([frame(), frame()], max_faces=None)
+    assert [result['face_count'] for result in results] == [2, 2]
+
+
+def test_frame_without_faces_has_an_empty_group(detector):
+    detector.face_trackers.cascade.faces = []
+    result = detector.analyze_image(frame(), max_faces=None)
+
+    assert result['face_detected'] is False
+    assert result['face_count'] == 0
+    assert result['faces'] == []
+    assert result['dominant_emotion'] == 'neutral'
@@ -0,0 +1,134 @@
+import gzip
+import json
+
+import pytest
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+from werkzeug.wrappers import Response
+
+import response_encoding
+from emotion_aggregator import EMOTION_LABELS
+from response_encoding import (COMPRESS_MIN_BYTES, choose_encoding, compact_payload, compress_response, pack,
+                               unpack, wants_msgpack)
+from study_recommendations import StudyRecommendations
+
+
+def accept_encoding(value):
+    return parse_accept_header(value)
+
+
+def test_emotion_scores_become_arrays_in_label_order():
+    scores = {'happy': 70.5, 'sad': 29.5}
+    compact = compact_payload({'emotions': scores, 'dominant_emotion': 'happy'})
+
+    assert compact['emotions'] == [scores.get(label, 0) for label in EMOTION_LABELS]
+    assert compact['dominant_emotion'] == 'happy'
+
+
+def test_objects_that_only_look_like_scores_are_kept():
+    flags = {'happy': True, 'sad': False}
+    assert compact_payload({'x': flags}) == {'x': flags}
+    assert compact_payload({'x': {}}) == {'x': {}}
+    assert compact_payload({'x': {'happy': 'yes'}}) == {'x': {'happy': 'yes'}}
+
+
+def test_current_catalogue_recommendations_are_sent_as_ids():
+    recommender = StudyRecommendations(seed=1)
+    recommendation = recommender.get_recommendations('sad', 'High')
+    compact = compact_payload({'recommendations': recommendation}, recommender.catalogue_version)['recommendations']
+
+    assert 'item_ids' not in compact and 'catalogue_version' not in compact
+    ids = compact['study_tips'] + [compact['motivational_quote']] + compact['recommended_activities']
+    assert ids == recommendation['item_ids']
+    assert [recommender.get_item(i) for i in compact['study_tips']] == recommendation['study_tips']
+    assert recommender.get_item(compact['motivational_quote']) == recommendation['motivational_quote']
+
+
+def test_other_catalogue_recommendations_keep_their_texts():
+    recommender = StudyRecommendations(seed=1)
+    recommendation = recommender.get_recommendations('happy')
+
+    assert compact_payload(recommendation, 'another-version') == recommendation
+    assert compact_payload(recommendation) == recommendation
+    mismatched = dict(recommendation, item_ids=recommendation['item_ids'][:-1])
+    assert compact_payload(mismatched, recommender.catalogue_version) == mismatched
+
+
+def test_nested_timestamps_are_dropped_below_a_dated_object():
+    session = {
+        'timestamp': '2026-01-01T10:00:00',
+        'emotion_analysis': {'timestamp': '2026-01-01T10:00:00', 'dominant_emotion': 'sad'},
+        'recommendations': {'session_timestamp': '2026-01-01T10:00:00', 'tips': []}
+    }
+    compact = compact_payload({'sessions': [session]})['sessions'][0]
+
+    assert compact == {
+        'timestamp': '2026-01-01T10:00:00',
+        'emotion_analysis': {'dominant_emotion': 'sad'},
+        'recommendations': {'tips': []}
+    }
+    # Without an enclosing timestamp they are the only copy and stay
+    assert compact_payload({'analysis': {'timestamp': 't'}}) == {'analysis': {'timestamp': 't'}}
+
+
+def test_pack_round_trips_the_compact_payload():
+    payload = {'success': True, 'emotions': {'happy': 0.5, 'neutral': 0.25}, 'count': 3}
+    assert unpack(pack(payload)) == compact_payload(payload)
+
+
+def test_json_stays_the_default():
+    assert not wants_msgpack(parse_accept_header('*/*', MIMEAccept))
+    assert not wants_msgpack(parse_accept_header('application/json, application/msgpack;q=0.5', MIMEAccept))
+    assert wants_msgpack(parse_accept_header('application/x-msgpack', MIMEAccept))
+
+
+def json_response(size):
+    body = json.dumps({'data': 'x' * size})
+    response = Response(body, mimetype='application/json')
+    response.set_etag('abc')
+    return response
+
+
+def test_large_bodies_are_gzipped_with_a_weak_etag():
+    response = json_response(COMPRESS_MIN_BYTES)
+    identity = response.get_data()
+    compress_response(response, accept_encoding('gzip'))
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()) == identity
+    assert response.get_etag() == ('abc', True)
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_small_bodies_and_other_types_are_left_alone():
+    small = json_response(10)
+    compress_response(small, accept_encoding('gzip'))
+    assert 'Content-Encoding' not in small.headers
+    assert small.get_etag() == ('abc', False)
+    assert 'Accept-Encoding' in small.vary
+
+    image = Response(b'\xff' * 4096, mimetype='image/jpeg')
+    compress_response(image, accept_encoding('gzip'))
+    assert 'Content-Encoding' not in image.headers
+
+    unaccepted = json_response(COMPRESS_MIN_BYTES)
+    compress_response(unaccepted, accept_encoding('identity'))
+    assert 'Content-Encoding' not in unaccepted.headers
+
+
+def test_brotli_is_not_offered_without_the_module(monkeypatch):
+    monkeypatch.setattr(response_encoding, 'brotli', None)
+    assert choose_encoding(accept_encoding('br, gzip')) == 'gzip'
+    assert choose_encoding(accept_encoding('br')) is None
+
+
+def test_brotli_is_preferred_when_installed():
+    pytest.importorskip('brotli')
+    assert choose_encoding(accept_encoding('gzip, br')) == 'br'
+    response = json_response(COMPRESS_MIN_BYTES)
+    identity = response.get_data()
+    compress_response(response, accept_encoding('br'))
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response_encoding.decompress(response.get_data(), 'br') == identity
+    assert response.get_etag() == ('abc', True)
@@ -0,0 +1,117 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+START = datetime(2026, 1, 1, 9, 0, 0)
+
+
+def make_session(n):
+    return {'n': n, 'timestamp': (START + timedelta(minutes=n)).isoformat()}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemorySessionStore(max_sessions=100, shards=4)
+    return SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+
+
+def read_all(store, limit, **kwargs):
+    pages = []
+    before = None
+    while True:
+        sessions, before = store.page(limit=limit, before=before, **kwargs)
+        pages.append([session['n'] for session in sessions])
+        if before is None:
+            return pages
+
+
+def test_pages_of_one_user(store):
+    for n in range(12):
+        store.append(make_session(n), user_id='a' if n % 3 else 'b')
+
+    assert read_all(store, 3, user_id='b') == [[9, 6, 3], [0]]
+    assert read_all(store, 5, user_id='a') == [[11, 10, 8, 7, 5], [4, 2, 1]]
+    assert store.count(user_id='b') == 4
+    assert store.page(user_id='nobody') == ([], None)
+
+
+def test_cursor_from_another_user_still_pages_by_id():
+    store = MemorySessionStore(max_sessions=100, shards=4)
+    ids = {n: store.append(make_session(n), user_id='a' if n % 2 else 'b') for n in range(10)}
+
+    # The cursor is a global session id, so it can come from the all-users view
+    sessions, _ = store.page(limit=10, before=ids[6], user_id='a')
+    assert [session['n'] for session in sessions] == [5, 3, 1]
+    sessions, _ = store.page(limit=2, before=ids[6])
+    assert [session['n'] for session in sessions] == [5, 4]
+
+
+def test_evicted_user_loses_partition_and_rollup():
+    store = MemorySessionStore(max_sessions=5, shards=2)
+    for n in range(8):
+        store.append(make_session(n), user_id='a' if n < 3 else 'b')
+
+    assert read_all(store, 2) == [[7, 6], [5, 4], [3]]
+    assert store.count() == 5
+    assert store.page(user_id='a') == ([], None)
+    assert store.count(user_id='a') == 0
+    assert store.rollup(user_id='a')['sessions'] == 0
+    assert read_all(store, 10, user_id='b') == [[7, 6, 5, 4, 3]]
+
+
+def test_memory_store_caps_each_user():
+    store = MemorySessionStore(max_sessions=100, max_sessions_per_user=3)
+    for n in range(6):
+        store.append(make_session(n), user_id='a')
+    store.append(make_session(6), user_id='b')
+
+    assert read_all(store, 2, user_id='a') == [[5, 4], [3]]
+    assert store.count(user_id='a') == 3
+    assert [session['n'] for session in store.page(limit=10)[0]] == [6, 5, 4, 3, 2, 1, 0]
+
+
+def test_sqlite_store_caps_each_user(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'), max_sessions_per_user=2)
+    store.PRUNE_EVERY = 1
+    for n in range(5):
+        store.append(make_session(n), user_id='a')
+    store.append(make_session(5), user_id='b')
+
+    assert read_all(store, 10, user_id='a') == [[4, 3]]
+    assert read_all(store, 10, user_id='b') == [[5]]
+
+
+def test_memory_store_cursor_past_the_ring_is_empty():
+    store = MemorySessionStore(max_sessions=3)
+    for n in range(6):
+        store.append(make_session(n))
+
+    _, cursor = store.page(limit=3)
+    assert cursor is None
+    assert store.page(limit=3, before=2) == ([], None)
+
+
+def test_concurrent_writers_keep_users_apart():
+    store = MemorySessionStore(max_sessions=10000, shards=4)
+    users = ['user-%d' % i for i in range(8)]
+
+    def write(user_id):
+        for n in range(200):
+            store.append({'n': n, 'user': user_id}, user_id=user_id)
+
+    threads = [threading.Thread(target=write, args=(user_id,)) for user_id in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store.count() == 1600
+    for user_id in users:
+        sessions, cursor = store.page(limit=1000, user_id=user_id)
+        assert cursor is None
+        assert {session['user'] for session in sessions} == {user_id}
+        assert [session['n'] for session in sessions] == list(range(199, -1, -1))
@@ -0,0 +1,173 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from session_rollups import SessionRollups
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+NOW = datetime.now().replace(minute=30, second=0, microsecond=0)
+
+
+def emotion_session(dominant, hours_ago=0, **scores):
+    return {
+        'timestamp': (NOW - timedelta(hours=hours_ago)).isoformat(),
+        'emotion_analysis': {'dominant_emotion': dominant, 'emotion_percentages': scores}
+    }
+
+
+def voice_session(stress_level, hours_ago=0):
+    return {
+        'timestamp': (NOW - timedelta(hours=hours_ago)).isoformat(),
+        'voice_analysis': {'stress_level': stress_level}
+    }
+
+
+SESSIONS = [
+    ('a', emotion_session('happy', 0, happy=80.0, sad=20.0)),
+    ('a', emotion_session('sad', 2, happy=20.0, sad=80.0)),
+    ('b', emotion_session('happy', 0, happy=60.0, neutral=40.0)),
+    ('b', voice_session('High', 0)),
+    ('a', voice_session('Low', 30))
+]
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        store = MemorySessionStore(max_sessions=100)
+    else:
+        store = SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    for user_id, session in SESSIONS:
+        store.append(session, user_id=user_id)
+    return store
+
+
+def test_totals(store):
+    rollup = store.rollup()
+    assert rollup['sessions'] == 5
+    assert rollup['emotion_sessions'] == 3
+    assert rollup['voice_sessions'] == 2
+    assert rollup['dominant_counts']['happy'] == 2
+    assert rollup['dominant_emotion'] == 'happy'
+    assert rollup['emotion_distribution']['happy'] == pytest.approx((80 + 20 + 60) / 3)
+    assert rollup['stress_counts'] == {'Low': 1, 'Medium': 0, 'High': 1}
+    assert rollup['stress_index'] == pytest.approx(0.5)
+
+
+def test_user_scope(store):
+    rollup = store.rollup(user_id='a')
+    assert rollup['user'] == 'a'
+    assert rollup['sessions'] == 3
+    assert rollup['dominant_counts']['sad'] == 1
+    assert rollup['stress_index'] == 0.0
+    assert store.rollup(user_id='nobody')['sessions'] == 0
+
+
+def test_sessions_in_one_hour_share_a_bucket(store):
+    rollup = store.rollup(hours=3, days=1)
+    assert [(bucket['bucket'], bucket['sessions']) for bucket in rollup['hourly']] == [
+        ((NOW - timedelta(hours=2)).strftime('%Y-%m-%dT%H'), 1),
+        (NOW.strftime('%Y-%m-%dT%H'), 3)
+    ]
+    # The window only covers today; the 30 hour old session is in the totals only
+    assert rollup['daily'][-1]['bucket'] == NOW.strftime('%Y-%m-%d')
+    assert sum(bucket['sessions'] for bucket in rollup['daily']) < rollup['sessions']
+
+
+def test_version_changes_when_a_scope_gains_a_session(store):
+    versions = {user_id: store.rollup_version(user_id) for user_id in (None, 'a', 'b')}
+    store.append(emotion_session('fear', 0, fear=100.0), user_id='a')
+
+    assert store.rollup_version() != versions[None]
+    assert store.rollup_version('a') != versions['a']
+    assert store.rollup_version('b') == versions['b']
+
+
+def rounded(value):
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def test_memory_and_sqlite_rollups_agree(tmp_path):
+    memory = MemorySessionStore()
+    sqlite = SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+    for user_id, session in SESSIONS:
+        memory.append(session, user_id=user_id)
+        sqlite.append(session, user_id=user_id)
+    for user_id in (None, 'a', 'b'):
+        assert rounded(memory.rollup(user_id=user_id)) == rounded(sqlite.rollup(user_id=user_id))
+
+
+def test_sqlite_upserts_one_row_per_bucket(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    store = SQLiteSessionStore(path)
+    for _ in range(3):
+        store.append(emotion_session('happy', 0, happy=100.0), user_id='a')
+
+    rows = sqlite3.connect(path).execute(
+        "SELECT user_id, period, sessions FROM rollups ORDER BY user_id, period").fetchall()
+    assert rows == [('', 'day', 3), ('', 'hour', 3), ('', 'total', 3),
+                    ('a', 'day', 3), ('a', 'hour', 3), ('a', 'total', 3)]
+
+
+def test_sqlite_rollups_are_rebuilt_for_old_databases(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    for user_id, session in SESSIONS:
+        SQLiteSessionStore(path).append(session, user_id=user_id)
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM rollups")
+    conn.commit()
+
+    assert SQLiteSessionStore(path).rollup()['sessions'] == 5
+
+
+def test_user_rollup_is_dropped_with_the_last_session_in_memory():
+    store = MemorySessionStore(max_sessions=2)
+    store.append(emotion_session('happy', 0, happy=100.0), user_id='a')
+    store.append(emotion_session('sad', 0, sad=100.0), user_id='b')
+    store.append(emotion_session('sad', 0, sad=100.0), user_id='b')
+
+    assert store.rollup(user_id='a')['sessions'] == 0
+    assert store.rollup(user_id='b')['sessions'] == 2
+    # The all-users rollup still counts the evicted session
+    assert store.rollup()['sessions'] == 3
+
+
+def test_user_rollup_is_dropped_with_the_last_session_in_sqlite(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'), max_sessions=2)
+    store.PRUNE_EVERY = 1
+    store.append(emotion_session('happy', 0, happy=100.0), user_id='a')
+    store.append(emotion_session('sad', 0, sad=100.0), user_id='b')
+    store.append(emotion_session('sad', 0, sad=100.0), user_id='b')
+
+    assert store.rollup(user_id='a')['sessions'] == 0
+    assert store.rollup(user_id='b')['sessions'] == 2
+    assert store.rollup()['sessions'] == 3
+
+
+def test_drop_keeps_the_all_users_rollup():
+    rollups = SessionRollups()
+    rollups.add(emotion_session('happy', 0, happy=100.0), 1, user_id='a')
+    version = rollups.version('a')
+    rollups.drop('a')
+    rollups.drop('never-seen')
+
+    assert rollups.rollup('a')['sessions'] == 0
+    assert rollups.version('a') != version
+    assert rollups.rollup()['sessions'] == 1
+
+
+def test_old_buckets_fall_out_of_the_retention_window():
+    rollups = SessionRollups(max_hours=2, max_days=1)
+    rollups.add(emotion_session('happy', 5, happy=100.0), 1)
+    rollups.add(emotion_session('happy', 0, happy=100.0), 2)
+
+    rollup = rollups.rollup(hours=24, days=7)
+    assert [bucket['bucket'] for bucket in rollup['hourly']] == [NOW.strftime('%Y-%m-%dT%H')]
+    assert rollup['sessions'] == 2
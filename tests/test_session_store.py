@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from session_store import MemorySessionStore, SQLiteSessionStore, create_session_store
+
+START = datetime(2026, 1, 1, 9, 0, 0)
+
+
+def make_session(n):
+    return {'n': n, 'timestamp': (START + timedelta(minutes=n)).isoformat()}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemorySessionStore(max_sessions=100, shards=4)
+    return SQLiteSessionStore(str(tmp_path / 'sessions.db'))
+
+
+def read_all(store, limit, **kwargs):
+    pages = []
+    before = None
+    while True:
+        sessions, before = store.page(limit=limit, before=before, **kwargs)
+        pages.append([session['n'] for session in sessions])
+        if before is None:
+            return pages
+
+
+def test_pages_are_newest_first_and_cover_every_session(store):
+    for n in range(10):
+        store.append(make_session(n))
+
+    assert read_all(store, 4) == [[9, 8, 7, 6], [5, 4, 3, 2], [1, 0]]
+    assert store.count() == 10
+
+
+def test_last_full_page_has_no_cursor(store):
+    for n in range(4):
+        store.append(make_session(n))
+
+    sessions, cursor = store.page(limit=4)
+    assert [session['n'] for session in sessions] == [3, 2, 1, 0]
+    assert cursor is None
+
+
+def test_since_stops_at_older_sessions(store):
+    for n in range(6):
+        store.append(make_session(n))
+
+    sessions, cursor = store.page(limit=10, since=make_session(3)['timestamp'])
+    assert [session['n'] for session in sessions] == [5, 4, 3]
+    assert cursor is None
+
+
+def test_empty_store(store):
+    assert store.page() == ([], None)
+    assert store.count() == 0
+
+
+def test_memory_store_keeps_the_newest_sessions():
+    store = MemorySessionStore(max_sessions=5)
+    for n in range(8):
+        store.append(make_session(n))
+
+    assert read_all(store, 2) == [[7, 6], [5, 4], [3]]
+    assert store.count() == 5
+
+
+def test_sqlite_store_prunes_old_sessions(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'), max_sessions=3)
+    store.PRUNE_EVERY = 1
+    for n in range(6):
+        store.append(make_session(n))
+
+    assert read_all(store, 10) == [[5, 4, 3]]
+    assert store.count() == 3
+
+
+def test_sqlite_store_keeps_sessions_across_instances(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    SQLiteSessionStore(path).append(make_session(0))
+
+    assert [session['n'] for session in SQLiteSessionStore(path).page()[0]] == [0]
+
+
+def test_create_session_store(tmp_path):
+    assert isinstance(create_session_store('memory'), MemorySessionStore)
+    assert isinstance(create_session_store('sqlite:' + str(tmp_path / 'a.db')), SQLiteSessionStore)
+    with pytest.raises(ValueError):
+        create_session_store('redis://localhost')
@@ -0,0 +1,87 @@
+import json
+from itertools import combinations
+
+import pytest
+
+from study_recommendations import (ACTIVITIES_PER_RECOMMENDATION, TIPS_PER_RECOMMENDATION,
+                                   StudyRecommendations)
+
+
+@pytest.fixture
+def recommender():
+    return StudyRecommendations(seed=1)
+
+
+def test_every_combination_of_items_can_be_drawn(recommender):
+    tips = recommender.recommendations['happy']['study_tips']
+    activities = recommender.recommendations['happy']['activities']
+    drawn_tips, drawn_activities = set(), set()
+    for _ in range(3000):
+        recommendation = recommender.get_recommendations('happy')
+        drawn_tips.add(frozenset(recommendation['study_tips']))
+        drawn_activities.add(frozenset(recommendation['recommended_activities']))
+
+    assert drawn_tips == {frozenset(pair) for pair in combinations(tips, TIPS_PER_RECOMMENDATION)}
+    assert drawn_activities == {frozenset(triple) for triple in combinations(activities, ACTIVITIES_PER_RECOMMENDATION)}
+
+
+def test_picked_items_are_distinct_and_match_their_ids(recommender):
+    for _ in range(200):
+        recommendation = recommender.get_recommendations('sad', 'High')
+        tips = recommendation['study_tips']
+        assert len(set(tips)) == len(tips)
+        texts = tips + [recommendation['motivational_quote']] + recommendation['recommended_activities']
+        assert [recommender.get_item(i) for i in recommendation['item_ids']] == texts
+
+
+def test_same_seed_gives_the_same_picks():
+    first, second = StudyRecommendations(seed=7), StudyRecommendations(seed=7)
+    picks = [first.get_recommendations('neutral')['item_ids'] for _ in range(20)]
+    assert picks == [second.get_recommendations('neutral')['item_ids'] for _ in range(20)]
+    other = StudyRecommendations(seed=8)
+    assert picks != [other.get_recommendations('neutral')['item_ids'] for _ in range(20)]
+
+
+def test_stress_tips_are_added(recommender):
+    stress_tips = recommender.get_stress_adjustment('High')
+    recommendation = recommender.get_recommendations('happy', 'High')
+    assert recommendation['study_tips'][TIPS_PER_RECOMMENDATION:] == stress_tips
+
+
+@pytest.mark.parametrize('emotion', [None, 7, '', 'bored'])
+def test_missing_or_unknown_emotion_falls_back_to_neutral(recommender, emotion):
+    recommendation = recommender.get_recommendations(emotion)
+    neutral = recommender.recommendations['neutral']
+    assert recommendation['motivational_quote'] in neutral['motivational_quotes']
+
+
+def test_blended_shares_skip_malformed_scores(recommender):
+    recommendation = recommender.get_blended_recommendations({'happy': 'x', 'sad': 60, 'angry': 40, None: 5})
+    assert recommendation['blend'] == {'sad': 0.6, 'angry': 0.4}
+    assert recommender.get_blended_recommendations({})['blend'] == {'neutral': 1.0}
+
+
+def test_bulk_shares_one_timestamp(recommender):
+    recommendations = recommender.get_recommendations_bulk([('happy', None), (None, 'Low')])
+    assert len({recommendation['timestamp'] for recommendation in recommendations}) == 1
+
+
+def test_catalogue_file_replaces_emotions_and_changes_the_version(tmp_path, recommender):
+    path = tmp_path / 'catalogue.json'
+    path.write_text(json.dumps({'happy': {
+        'study_tips': ['Tip A', 'Tip B'], 'motivational_quotes': ['Quote'], 'activities': ['Walk']
+    }}))
+    loaded = StudyRecommendations(catalogue_path=str(path), seed=1)
+
+    recommendation = loaded.get_recommendations('happy')
+    assert sorted(recommendation['study_tips']) == ['Tip A', 'Tip B']
+    assert recommendation['recommended_activities'] == ['Walk']
+    assert loaded.catalogue_version != recommender.catalogue_version
+    assert recommendation['catalogue_version'] == loaded.catalogue_version
+
+
+def test_catalogue_entry_without_quotes_is_rejected(tmp_path):
+    path = tmp_path / 'catalogue.json'
+    path.write_text(json.dumps({'calm': {'study_tips': [], 'activities': []}}))
+    with pytest.raises(ValueError, match='motivational_quotes'):
+        StudyRecommendations(catalogue_path=str(path))
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from text_analyzer import TextAnalyzer, stress_level
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return TextAnalyzer(lexicon_path=None)
+
+
+def test_neutral_text_scores_zero(analyzer):
+    result = analyzer.analyze("the lecture starts at nine in room four")
+    assert result['stress_score'] == 0.0
+    assert result['stress_level'] == 'Low'
+    assert result['sentiment'] == 0.0
+    assert result['energy_level'] == 0.0
+    assert result['word_count'] == 8
+    assert result['terms'] == []
+
+
+def test_stressful_text_scores_high(analyzer):
+    result = analyzer.analyze("I'm so stressed out and overwhelmed, I'm falling behind and can't focus")
+    assert result['stress_level'] == 'High'
+    assert result['sentiment'] < 0
+    assert 'stressed out' in result['terms']
+    assert 'falling behind' in result['terms']
+
+
+def test_positive_text_has_positive_sentiment(analyzer):
+    result = analyzer.analyze("I feel confident and on track, this is going great")
+    assert result['sentiment'] > 0
+    assert result['stress_level'] == 'Low'
+
+
+def test_longest_phrase_wins(analyzer):
+    assert analyzer.analyze("stressed out")['terms'] == ['stressed out']
+
+
+def test_negation_flips_a_term(analyzer):
+    plain = analyzer.analyze("I am worried")
+    negated = analyzer.analyze("I am not worried")
+    assert plain['stress_score'] > 0
+    assert negated['stress_score'] == 0.0
+    assert negated['sentiment'] > plain['sentiment']
+
+
+def test_intensifier_raises_the_score(analyzer):
+    assert analyzer.analyze("I am really worried")['stress_score'] > analyzer.analyze("I am worried")['stress_score']
+
+
+def test_exclamations_add_energy(analyzer):
+    assert analyzer.analyze("I am worried!!!")['energy_level'] > analyzer.analyze("I am worried")['energy_level']
+
+
+def test_empty_text(analyzer):
+    assert analyzer.analyze(None)['word_count'] == 0
+    assert analyzer.analyze_batch(["", "I am worried"])[1]['terms'] == ['worried']
+
+
+def test_lexicon_file_extends_the_terms(tmp_path):
+    path = tmp_path / 'lexicon.json'
+    path.write_text(json.dumps({'terms': {'deadline crunch': [3.0, -1.0]}, 'negations': ['nah']}))
+    analyzer = TextAnalyzer(lexicon_path=str(path))
+    assert analyzer.analyze("deadline crunch")['terms'] == ['deadline crunch']
+    assert analyzer.analyze("nah deadline crunch")['stress_score'] == 0.0
+
+
+@pytest.mark.parametrize('score, level', [(0.0, 'Low'), (3.49, 'Low'), (3.5, 'Medium'), (6.5, 'High'), (10.0, 'High')])
+def test_stress_level_bands(score, level):
+    assert stress_level(score) == level
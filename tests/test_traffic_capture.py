@@ -0,0 +1,128 @@
+import gzip
+import io
+import json
+import os
+
+import pytest
+
+from traffic_capture import TrafficRecorder, read_records
+
+
+def echo_app(environ, start_response):
+    body = environ['wsgi.input'].read()
+    start_response('201 Created', [('Content-Type', 'application/octet-stream')])
+    return [body]
+
+
+def call(app, path='/analyze_emotion_frame', body=b'', **environ):
+    environ = dict({
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body)
+    }, **environ)
+    statuses = []
+    result = app(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    chunks = b''.join(result)
+    if hasattr(result, 'close'):
+        result.close()
+    return statuses[0], chunks
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / 'traffic.log')
+
+
+def test_records_are_a_json_line_then_the_raw_body(log_path):
+    recorder = TrafficRecorder(echo_app, log_path)
+    body = b'\xff\xd8 binary\nwith newlines\xff\xd9'
+    assert call(recorder, body=body, QUERY_STRING='client_id=1', CONTENT_TYPE='image/jpeg',
+                HTTP_ACCEPT='application/json') == ('201 Created', body)
+    call(recorder, path='/session_history', REQUEST_METHOD='GET')
+    recorder.close()
+
+    with open(log_path, 'rb') as f:
+        header = json.loads(f.readline())
+        assert f.read(header['len']) == body
+        assert f.read(1) == b'\n'
+    assert header['method'] == 'POST'
+    assert header['path'] == '/analyze_emotion_frame'
+    assert header['query'] == 'client_id=1'
+    assert header['headers'] == {'Content-Type': 'image/jpeg', 'Accept': 'application/json'}
+    assert header['status'] == 201
+    assert header['ms'] >= 0.0
+
+    records = list(read_records(log_path))
+    assert [(record['path'], body) for record, body in records] == [
+        ('/analyze_emotion_frame', body), ('/session_history', b'')]
+
+
+def test_unlisted_chunked_and_oversized_requests_pass_through(log_path):
+    recorder = TrafficRecorder(echo_app, log_path, max_body_bytes=4)
+    assert call(recorder, path='/static/app.js', body=b'x') == ('201 Created', b'x')
+    assert call(recorder, body=b'12345') == ('201 Created', b'12345')
+    assert call(recorder, body=b'x', HTTP_TRANSFER_ENCODING='chunked') == ('201 Created', b'x')
+    recorder.close()
+
+    assert recorder.recorded == 0
+    assert list(read_records(log_path)) == []
+
+
+def test_sample_rate_records_about_that_fraction(log_path):
+    recorder = TrafficRecorder(echo_app, log_path, sample_rate=0.25)
+    recorder._random.seed(3)
+    for _ in range(2000):
+        call(recorder)
+    recorder.close()
+
+    assert 400 < recorder.recorded < 600
+    assert len(list(read_records(log_path))) == recorder.recorded
+
+
+def test_cookies_are_replaced_by_a_pseudonymous_user_id(log_path):
+    recorder = TrafficRecorder(echo_app, log_path)
+    call(recorder, HTTP_COOKIE='session=abc')
+    call(recorder, HTTP_COOKIE='session=abc')
+    call(recorder, HTTP_COOKIE='session=xyz')
+    call(recorder, HTTP_COOKIE='session=abc', HTTP_X_USER_ID='alice')
+    recorder.close()
+
+    users = [record['headers']['X-User-Id'] for record, _ in read_records(log_path)]
+    assert users[0] == users[1] != users[2]
+    assert users[0].startswith('replay-')
+    assert users[3] == 'alice'
+    with open(log_path, 'rb') as f:
+        assert b'abc' not in f.read()
+
+
+def test_gzip_log_with_a_file_per_process(tmp_path):
+    recorder = TrafficRecorder(echo_app, str(tmp_path / 'traffic-{pid}.log.gz'))
+    call(recorder, body=b'frame')
+    recorder.close()
+
+    path = str(tmp_path / f'traffic-{os.getpid()}.log.gz')
+    assert recorder.path == path
+    with gzip.open(path, 'rb') as f:
+        assert f.read().endswith(b'\nframe\n')
+    assert [body for _, body in read_records(path)] == [b'frame']
+
+
+def test_records_started_outside_the_middleware_share_the_log(log_path):
+    # The path asgi.py takes for the routes it serves natively
+    recorder = TrafficRecorder(echo_app, log_path)
+    headers = {'accept': 'application/x-msgpack', 'cookie': 'session=abc'}
+    assert recorder.should_record('/session_history')
+    assert not recorder.should_record('/ws/emotion')
+    assert not recorder.should_record('/analyze_emotion_frame', transfer_encoding='chunked')
+    record = recorder.start_record('GET', '/session_history', 'limit=5', lambda name: headers.get(name.lower()))
+    recorder.finish_record(record, b'', 200, 1.5)
+    call(recorder, HTTP_COOKIE='session=abc')
+    recorder.close()
+
+    (native, _), (wsgi, _) = read_records(log_path)
+    assert native['query'] == 'limit=5'
+    assert native['status'] == 200 and native['ms'] == 1.5
+    assert native['headers']['Accept'] == 'application/x-msgpack'
+    assert native['headers']['X-User-Id'] == wsgi['headers']['X-User-Id']
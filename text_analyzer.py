@@ -0,0 +1,193 @@
+import json
+import math
+import os
+import re
+
+# Optional JSON file extending the built-in lexicon: {"terms": {"phrase":
+# [stress, valence], ...}, "negations": [...], "intensifiers": {"word": factor}}
+TEXT_LEXICON_FILE = os.environ.get('TEXT_LEXICON_FILE')
+
+# Stress and sentiment weight of each word or phrase. Stress is roughly -1
+# (calming) to 2 (acute), valence -3 (very negative) to 3 (very positive).
+LEXICON = {
+    # Acute stress and overload
+    'stressed': (1.5, -2.0), 'stressed out': (2.0, -2.2), 'stressful': (1.5, -1.8), 'stress': (1.2, -1.5),
+    'overwhelmed': (2.0, -2.2), 'overwhelming': (1.8, -2.0), 'panic': (2.0, -2.5), 'panicking': (2.0, -2.5),
+    'freaking out': (2.0, -2.0), 'anxious': (1.6, -2.0), 'anxiety': (1.6, -2.0), 'nervous': (1.3, -1.5),
+    'worried': (1.3, -1.6), 'worry': (1.1, -1.4), 'scared': (1.4, -2.0), 'afraid': (1.3, -1.8),
+    'terrified': (2.0, -2.6), 'pressure': (1.2, -1.2), 'under pressure': (1.6, -1.5), 'tense': (1.2, -1.2),
+    'burned out': (2.0, -2.4), 'burnt out': (2.0, -2.4), 'burnout': (2.0, -2.4), 'exhausted': (1.4, -2.0),
+    'tired': (0.8, -1.3), 'sleepy': (0.5, -0.8), 'no sleep': (1.4, -1.5), 'all nighter': (1.4, -1.0),
+    'deadline': (1.0, -0.8), 'deadlines': (1.0, -0.8), 'due tomorrow': (1.3, -1.0), 'due today': (1.5, -1.2),
+    'running out of time': (1.8, -1.8), 'not enough time': (1.6, -1.6), 'too much': (1.2, -1.2),
+    'behind': (0.8, -1.0), 'falling behind': (1.6, -1.8), 'so far behind': (1.8, -2.0),
+    'cram': (1.0, -0.6), 'cramming': (1.2, -0.8), 'exam': (0.4, -0.2), 'exams': (0.4, -0.2),
+    'test': (0.2, 0.0), 'fail': (1.5, -2.2), 'failing': (1.6, -2.4), 'failed': (1.4, -2.4),
+    'give up': (1.6, -2.4), 'giving up': (1.6, -2.4), 'hopeless': (1.8, -2.8), 'helpless': (1.6, -2.4),
+    # Frustration and confusion
+    'frustrated': (1.4, -2.0), 'frustrating': (1.3, -1.8), 'annoyed': (1.0, -1.6), 'angry': (1.4, -2.3),
+    'mad': (1.2, -2.0), 'hate': (1.2, -2.7), 'confused': (1.0, -1.3), 'confusing': (0.9, -1.2),
+    'lost': (0.8, -1.3), 'stuck': (1.0, -1.4), "don't understand": (1.2, -1.5),
+    "doesn't make sense": (1.0, -1.4), "can't focus": (1.5, -1.6), "can't concentrate": (1.5, -1.6),
+    "can't do this": (1.8, -2.4), 'distracted': (0.8, -1.0), 'impossible': (1.2, -1.8),
+    'hard': (0.6, -0.8), 'difficult': (0.7, -0.9), 'struggling': (1.3, -1.8), 'struggle': (1.1, -1.5),
+    'bad': (0.5, -1.8), 'terrible': (0.9, -2.5), 'awful': (0.9, -2.5), 'horrible': (0.9, -2.5),
+    'sad': (0.6, -2.1), 'upset': (1.0, -1.9), 'depressed': (1.4, -2.7), 'lonely': (0.8, -2.0),
+    'bored': (0.0, -1.2), 'boring': (0.0, -1.3), 'problem': (0.5, -0.8), 'mistake': (0.7, -1.2),
+    # Calm, confidence and progress
+    'calm': (-1.0, 1.5), 'relaxed': (-1.0, 1.8), 'relax': (-0.8, 1.5), 'peaceful': (-1.0, 1.8),
+    'fine': (-0.4, 0.8), 'okay': (-0.3, 0.6), 'ok': (-0.3, 0.6), 'good': (-0.4, 1.9), 'great': (-0.6, 3.1),
+    'happy': (-0.6, 2.7), 'excited': (0.2, 2.2), 'glad': (-0.5, 2.0), 'love': (-0.4, 3.0),
+    'enjoy': (-0.5, 2.2), 'fun': (-0.5, 2.3), 'interesting': (-0.3, 1.7), 'easy': (-0.6, 1.9),
+    'confident': (-0.8, 2.2), 'ready': (-0.6, 1.5), 'prepared': (-0.7, 1.6), 'on track': (-0.8, 1.6),
+    'ahead': (-0.5, 1.2), 'understand': (-0.4, 1.2), 'makes sense': (-0.5, 1.5), 'got it': (-0.5, 1.6),
+    'figured it out': (-0.8, 2.2), 'progress': (-0.5, 1.6), 'done': (-0.4, 1.0), 'finished': (-0.6, 1.4),
+    'focused': (-0.5, 1.5), 'motivated': (-0.4, 2.0), 'proud': (-0.5, 2.4), 'better': (-0.4, 1.9),
+    'rested': (-0.8, 1.6), 'take a break': (-0.6, 0.8), 'no problem': (-0.6, 1.4), 'no worries': (-0.8, 1.6),
+    'thanks': (-0.3, 1.5), 'thank you': (-0.3, 1.5), 'help': (0.2, 0.6), 'helps': (-0.2, 1.0),
+}
+
+# Words that flip the next few words ("not stressed", "never easy")
+NEGATIONS = {'not', 'no', 'never', 'none', 'nothing', 'nobody', 'neither', 'nor', 'without', 'hardly',
+             "don't", "doesn't", "didn't", "isn't", "aren't", "wasn't", "weren't", "won't", "wouldn't",
+             "can't", "cannot", "couldn't", "shouldn't", "haven't", "hasn't", "ain't"}
+NEGATION_SCOPE = 3
+# A negated stressor calms a little ("not worried"), a negated calming word stresses a little
+NEGATED_STRESS = -0.5
+NEGATED_VALENCE = -0.75
+
+# Words that scale the next matched term ("really stressed", "a bit tired")
+INTENSIFIERS = {
+    'very': 1.3, 'really': 1.3, 'so': 1.3, 'too': 1.3, 'extremely': 1.6, 'super': 1.5, 'totally': 1.4,
+    'completely': 1.4, 'absolutely': 1.5, 'incredibly': 1.5, 'seriously': 1.3, 'such': 1.2,
+    'kinda': 0.7, 'somewhat': 0.7, 'slightly': 0.6, 'little': 0.7, 'bit': 0.7, 'barely': 0.6,
+}
+INTENSIFIER_SCOPE = 2
+
+# stress_score = 10 * (1 - exp(-stress / STRESS_SCALE)): one strong term is
+# Medium, two are High
+STRESS_SCALE = 2.0
+ENERGY_SCALE = 3.0
+# Normalizes summed valence onto (-1, 1) the way VADER does
+SENTIMENT_ALPHA = 15.0
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+class TextAnalyzer:
+    """
+    Stress and sentiment scores for speech transcripts
+
+    The lexicon is compiled once into a table keyed by each phrase's first
+    word, longest phrase first. A transcript is then scored in a single pass
+    over its words: at each word one dict lookup finds every phrase that can
+    start there, negations and intensifiers are tracked as running state, and
+    the totals are turned into scores at the end. A typical interim
+    speech-recognition result takes a few microseconds.
+    """
+
+    def __init__(self, lexicon_path=TEXT_LEXICON_FILE):
+        """
+        Args:
+            lexicon_path: Optional JSON file extending the built-in lexicon
+                (see TEXT_LEXICON_FILE); its terms replace built-in ones
+        """
+        terms = dict(LEXICON)
+        negations = set(NEGATIONS)
+        intensifiers = dict(INTENSIFIERS)
+        if lexicon_path:
+            with open(lexicon_path, encoding='utf-8') as f:
+                extra = json.load(f)
+            terms.update({term: tuple(weights) for term, weights in extra.get('terms', {}).items()})
+            negations.update(extra.get('negations', ()))
+            intensifiers.update(extra.get('intensifiers', {}))
+
+        # first word -> ((words, stress, valence, phrase), ...), longest first
+        table = {}
+        for phrase, (stress, valence) in terms.items():
+            words = tuple(_TOKEN.findall(phrase.lower()))
+            if words:
+                table.setdefault(words[0], []).append((words, float(stress), float(valence), phrase))
+        self._table = {first: tuple(sorted(entries, key=lambda e: -len(e[0]))) for first, entries in table.items()}
+        self._negations = frozenset(negations)
+        self._intensifiers = intensifiers
+
+    def analyze(self, text):
+        """
+        Score one transcript
+
+        Returns:
+            dict: 'stress_level' (Low/Medium/High), 'stress_score' (0-10),
+            'sentiment' (-1 to 1), 'energy_level' (0-100, emotional
+            intensity), 'word_count' and the matched lexicon 'terms'
+        """
+        text = (text or '').lower().replace('’', "'")
+        words = _TOKEN.findall(text)
+        table = self._table
+        negations = self._negations
+        intensifiers = self._intensifiers
+
+        stress = valence = arousal = 0.0
+        terms = []
+        negated_until = -1
+        boost = 1.0
+        boosted_until = -1
+        i = 0
+        n = len(words)
+        while i < n:
+            word = words[i]
+            match = None
+            entries = table.get(word)
+            if entries is not None:
+                for entry in entries:
+                    length = len(entry[0])
+                    if length == 1 or tuple(words[i:i + length]) == entry[0]:
+                        match = entry
+                        break
+
+            if match is None:
+                if word in negations:
+                    negated_until = i + NEGATION_SCOPE
+                else:
+                    factor = intensifiers.get(word)
+                    if factor is not None:
+                        boost = factor
+                        boosted_until = i + INTENSIFIER_SCOPE
+                i += 1
+                continue
+
+            phrase_words, term_stress, term_valence, phrase = match
+            scale = boost if i <= boosted_until else 1.0
+            if i <= negated_until:
+                term_stress *= NEGATED_STRESS
+                term_valence *= NEGATED_VALENCE
+            stress += term_stress * scale
+            valence += term_valence * scale
+            arousal += (abs(term_stress) + 0.5 * abs(term_valence)) * scale
+            terms.append(phrase)
+            i += len(phrase_words)
+
+        arousal += 0.5 * text.count('!')
+        stress_score = 10.0 * (1.0 - math.exp(-max(stress, 0.0) / STRESS_SCALE))
+        return {
+            'stress_level': stress_level(stress_score),
+            'stress_score': stress_score,
+            'sentiment': valence / math.sqrt(valence * valence + SENTIMENT_ALPHA),
+            'energy_level': 100.0 * (1.0 - math.exp(-arousal / ENERGY_SCALE)),
+            'word_count': n,
+            'terms': terms
+        }
+
+    def analyze_batch(self, texts):
+        """Score many transcripts; one result per text, in order (see analyze)"""
+        analyze = self.analyze
+        return [analyze(text) for text in texts]
+
+
+def stress_level(stress_score):
+    """Low/Medium/High bands of a 0-10 stress score, as for voice tone"""
+    if stress_score < 3.5:
+        return "Low"
+    elif stress_score < 6.5:
+        return "Medium"
+    return "High"
@@ -0,0 +1,207 @@
+import atexit
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Routes recorded by default; everything else passes straight through
+RECORDED_ROUTES = (
+    '/analyze_emotion', '/analyze_emotion_frame', '/analyze_emotion_batch', '/analyze_voice',
+    '/analyze_transcripts', '/session_history', '/session_rollups', '/get_recommendations',
+    '/get_recommendations_bulk', '/recommendation_catalogue'
+)
+# Request headers kept with each record; the rest are not needed for replay
+RECORDED_HEADERS = ('Content-Type', 'Accept', 'Accept-Encoding', 'X-User-Id', 'X-Client-Id')
+TRAFFIC_MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+def open_log(path, mode):
+    """Open a traffic log; '.gz' paths are gzip-compressed"""
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+def write_record(f, record, body):
+    """Append one record: a JSON header line, then the raw body and a newline"""
+    record = dict(record, len=len(body))
+    f.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n' + body + b'\n')
+
+
+def read_records(path):
+    """Yield (record, body) pairs from a traffic log"""
+    with open_log(path, 'rb') as f:
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            record = json.loads(line)
+            body = f.read(record['len'])
+            f.read(1)
+            yield record, body
+
+
+class TrafficRecorder:
+    """WSGI middleware recording a sample of requests for later replay
+
+    Each sampled request to one of ``routes`` is written to the log with its
+    method, path, query string, a few headers, the raw body and the status
+    and latency the app answered with. Bodies are stored as raw bytes after
+    a JSON header line rather than base64-encoded, so a log of JPEG frames
+    stays about the size of the frames themselves. Callers identified only
+    by the session cookie are given a pseudonymous X-User-Id, so a replay
+    keeps each user's sessions apart without the cookie being stored.
+    Chunked request bodies (streamed voice uploads) are not recorded.
+
+    Under ASGI the routes asgi.py serves natively are recorded through
+    ``should_record``, ``start_record`` and ``finish_record``, into the same
+    log with the same sampling. WebSocket traffic (/ws/emotion, /ws/voice)
+    is never recorded.
+    """
+
+    def __init__(self, wsgi_app, path, sample_rate=1.0, routes=RECORDED_ROUTES,
+                 max_body_bytes=TRAFFIC_MAX_BODY_BYTES):
+        """
+        Args:
+            wsgi_app: The application to wrap
+            path: Log file; '{pid}' is replaced by the process id so every
+                server worker writes its own file, '.gz' compresses it
+            sample_rate: Fraction of matching requests recorded
+            routes: Paths to record
+            max_body_bytes: Larger requests are not recorded
+        """
+        self.wsgi_app = wsgi_app
+        self.path = path.replace('{pid}', str(os.getpid()))
+        self.sample_rate = sample_rate
+        self.routes = frozenset(routes)
+        self.max_body_bytes = max_body_bytes
+        self.recorded = 0
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._file = open_log(self.path, 'ab')
+        self._last_flush = time.monotonic()
+        atexit.register(self.close)
+        logger.info("Recording %.0f%% of requests to %s", sample_rate * 100, self.path)
+
+    def __call__(self, environ, start_response):
+        if not self.should_record(environ.get('PATH_INFO'), environ.get('CONTENT_LENGTH'),
+                                  environ.get('HTTP_TRANSFER_ENCODING')):
+            return self.wsgi_app(environ, start_response)
+
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else b''
+        environ['wsgi.input'] = io.BytesIO(body)
+
+        record = self.start_record(environ['REQUEST_METHOD'], environ.get('PATH_INFO', ''),
+                                   environ.get('QUERY_STRING', ''), lambda name: self._environ_header(environ, name))
+        status = []
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(' ', 1)[0]))
+            return start_response(status_line, headers, exc_info)
+
+        def finish():
+            self.finish_record(record, body, status[0] if status else None,
+                               (time.perf_counter() - start) * 1000.0)
+
+        start = time.perf_counter()
+        result = self.wsgi_app(environ, recording_start_response)
+        return _RecordedResponse(result, finish)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def should_record(self, path, content_length=None, transfer_encoding=None):
+        """Whether to record a request, drawing the sample for routes that are recorded"""
+        if path not in self.routes:
+            return False
+        if 'chunked' in (transfer_encoding or '').lower():
+            return False
+        if int(content_length or 0) > self.max_body_bytes:
+            return False
+        return self.sample_rate >= 1.0 or self._random.random() < self.sample_rate
+
+    def start_record(self, method, path, query, header):
+        """
+        Record for a request that is about to be served
+
+        Args:
+            header: Function returning a request header's value by name, or None
+        """
+        return {
+            'ts': time.time(),
+            'method': method,
+            'path': path,
+            'query': query,
+            'headers': self._headers(header)
+        }
+
+    def finish_record(self, record, body, status, ms):
+        """Write a record started with ``start_record`` once its response is finished"""
+        record['ms'] = ms
+        record['status'] = status
+        try:
+            with self._lock:
+                if self._file.closed:
+                    return
+                write_record(self._file, record, body)
+                self.recorded += 1
+                # Buffered, but never more than a second behind
+                if time.monotonic() - self._last_flush > 1.0:
+                    self._file.flush()
+                    self._last_flush = time.monotonic()
+        except OSError as e:
+            logger.warning("Could not write traffic record: %s", e)
+
+    @staticmethod
+    def _environ_header(environ, name):
+        key = name.upper().replace('-', '_')
+        return environ.get(key if name == 'Content-Type' else f'HTTP_{key}')
+
+    @staticmethod
+    def _headers(header):
+        headers = {}
+        for name in RECORDED_HEADERS:
+            value = header(name)
+            if value:
+                headers[name] = value
+        cookie = header('Cookie')
+        if 'X-User-Id' not in headers and cookie:
+            digest = hashlib.sha1(cookie.encode('utf-8')).hexdigest()[:16]
+            headers['X-User-Id'] = f'replay-{digest}'
+        return headers
+
+
+class _RecordedResponse:
+    """Response iterable that records the request once the response is finished
+
+    That is when the body has been iterated to the end, or when the server
+    closes the response, whichever comes first.
+    """
+
+    def __init__(self, result, on_finish):
+        self._result = result
+        self._on_finish = on_finish
+
+    def __iter__(self):
+        yield from self._result
+        self._finish()
+
+    def close(self):
+        try:
+            if hasattr(self._result, 'close'):
+                self._result.close()
+        finally:
+            self._finish()
+
+    def _finish(self):
+        on_finish, self._on_finish = self._on_finish, None
+        if on_finish is not None:
+            on_finish()
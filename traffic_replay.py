@@ -0,0 +1,247 @@
+"""
+Replay recorded traffic against the app and report latency and errors
+
+Logs are written by traffic_capture.TrafficRecorder (set TRAFFIC_LOG). By
+default requests run in-process through the Flask test client, so a release
+can be capacity-tested without a server; --url sends them to a running one.
+
+Usage:
+    python traffic_replay.py traffic-*.log                    # original pacing, in-process
+    python traffic_replay.py traffic.log --speed 4            # four times as fast
+    python traffic_replay.py traffic.log --speed 0 -c 32      # as fast as 32 clients can go
+    python traffic_replay.py traffic.log --url http://localhost:5000 --output replay.json
+    python traffic_replay.py traffic.log --compare replay.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from response_encoding import decompress, unpack
+from traffic_capture import read_records
+
+
+def load_records(paths, routes=None, limit=None):
+    """Records of every log, merged into one timeline ordered by arrival"""
+    records = []
+    for path in paths:
+        for record, body in read_records(path):
+            if routes and not any(record['path'].startswith(route) for route in routes):
+                continue
+            records.append((record, body))
+    records.sort(key=lambda item: item[0]['ts'])
+    return records[:limit] if limit else records
+
+
+class InProcessTarget:
+    """Sends requests through the Flask test client, one client per thread"""
+
+    def __init__(self):
+        import app as app_module
+        # Load the models first, as a server worker does before taking traffic
+        app_module.warm_up()
+        self.app = app_module.app
+        self._local = threading.local()
+
+    def send(self, record, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(record['path'], method=record['method'], query_string=record['query'],
+                               headers=record['headers'], data=body)
+        return (response.status_code, response.content_type,
+                decompress(response.get_data(), response.headers.get('Content-Encoding')))
+
+
+class HttpTarget:
+    """Sends requests to a running server over one keep-alive connection per thread"""
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def send(self, record, body):
+        target = self.prefix + record['path'] + (f"?{record['query']}" if record['query'] else '')
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = self.connection_class(self.netloc, timeout=self.timeout)
+            try:
+                connection.request(record['method'], target, body=body or None, headers=record['headers'])
+                response = connection.getresponse()
+                return (response.status, response.getheader('Content-Type', ''),
+                        decompress(response.read(), response.getheader('Content-Encoding')))
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+
+def is_error(status, content_type, payload):
+    """HTTP errors, and JSON/MessagePack results with "success": false (the app's error convention)"""
+    if status >= 400:
+        return True
+    if status != 200:
+        return False
+    try:
+        if content_type.startswith('application/json'):
+            result = json.loads(payload)
+        elif content_type.startswith('application/msgpack'):
+            result = unpack(payload)
+        else:
+            return False
+    except ValueError:
+        return True
+    return isinstance(result, dict) and result.get('success') is False
+
+
+def replay(records, target, speed=1.0, concurrency=8):
+    """
+    Send the records to the target and time every request
+
+    With speed > 0 each request is sent at its recorded offset from the
+    first one, divided by speed (open loop: a slow server does not slow the
+    arrivals down). With speed 0 the requests are sent back to back by
+    `concurrency` clients.
+
+    Returns:
+        list: One (record, seconds, error, lag_seconds) tuple per request
+    """
+    results = [None] * len(records)
+
+    def send(i, scheduled):
+        record, body = records[i]
+        start = time.perf_counter()
+        lag = start - scheduled if scheduled is not None else 0.0
+        try:
+            error = is_error(*target.send(record, body))
+        except Exception:
+            error = True
+        results[i] = (record, time.perf_counter() - start, error, lag)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        if speed > 0:
+            origin = records[0][0]['ts'] if records else 0.0
+            start = time.perf_counter()
+            for i, (record, _) in enumerate(records):
+                scheduled = start + (record['ts'] - origin) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, i, scheduled)
+        else:
+            for i in range(len(records)):
+                pool.submit(send, i, None)
+
+    return results
+
+
+def summarize(results, elapsed):
+    """Latency percentiles, error rate and throughput per route and overall"""
+    groups = {}
+    for result in results:
+        groups.setdefault(result[0]['path'], []).append(result)
+    groups['all'] = results
+
+    report = {}
+    for name, group in sorted(groups.items()):
+        latencies = np.array([seconds for _, seconds, _, _ in group]) * 1000
+        recorded = np.array([record['ms'] for record, _, _, _ in group if record.get('ms') is not None])
+        errors = sum(1 for _, _, error, _ in group if error)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        report[name] = {
+            'calls': len(group),
+            'errors': errors,
+            'error_rate': errors / len(group),
+            'mean_ms': float(latencies.mean()),
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'max_ms': float(latencies.max()),
+            'recorded_p50_ms': float(np.percentile(recorded, 50)) if len(recorded) else None,
+            # How late requests were sent; growing lag means the server fell behind the recorded rate
+            'max_lag_ms': float(max(lag for _, _, _, lag in group) * 1000),
+            'rps': len(group) / elapsed if elapsed > 0 else 0.0
+        }
+    return report
+
+
+def format_report(report, baseline=None):
+    lines = [f"{'route':<28} {'calls':>7} {'err %':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+             f"{'rec p50':>9} {'req/s':>9}"]
+    for name, row in report.items():
+        recorded = f"{row['recorded_p50_ms']:9.2f}" if row['recorded_p50_ms'] is not None else f"{'-':>9}"
+        line = (f"{name:<28} {row['calls']:7d} {row['error_rate'] * 100:6.1f} {row['p50_ms']:9.2f} "
+                f"{row['p95_ms']:9.2f} {row['p99_ms']:9.2f} {recorded} {row['rps']:9.1f}")
+        previous = (baseline or {}).get(name)
+        if previous and previous['p95_ms']:
+            line += f"   p95 {(row['p95_ms'] / previous['p95_ms'] - 1) * 100:+6.1f}%"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('logs', nargs='+', help="traffic logs written by TRAFFIC_LOG")
+    parser.add_argument('--url', help="base URL of a running server (default: in-process test client)")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="replay rate relative to the recording; 0 sends requests back to back")
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="requests in flight at most")
+    parser.add_argument('--only', action='append', default=[], metavar='PREFIX',
+                        help="replay only routes starting with PREFIX (repeatable)")
+    parser.add_argument('--limit', type=int, help="replay at most this many requests")
+    parser.add_argument('--output', help="write the report as JSON to this file")
+    parser.add_argument('--compare', help="JSON report of an earlier replay to compare against")
+    parser.add_argument('--verbose', action='store_true', help="keep the application's info logging")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    records = load_records(args.logs, args.only, args.limit)
+    if not records:
+        print("No requests to replay")
+        return 1
+    target = HttpTarget(args.url) if args.url else InProcessTarget()
+
+    start = time.perf_counter()
+    results = replay(records, target, speed=args.speed, concurrency=args.concurrency)
+    report = summarize(results, time.perf_counter() - start)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['report']
+    print(format_report(report, baseline))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(),
+                'logs': args.logs,
+                'target': args.url or 'in-process',
+                'speed': args.speed,
+                'concurrency': args.concurrency,
+                'report': report
+            }, f, indent=2, sort_keys=True)
+        print(f"Report written to {args.output}")
+
+    return 1 if report['all']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
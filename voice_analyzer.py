@@ -1,18 +1,37 @@
+import logging
 import speech_recognition as sr
 import numpy as np
-import librosa
 from datetime import datetime
+from audio_features import analyze_samples, decode_audio, pcm_to_float
+from instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+# Calibration of the stress features, roughly spanning calm speech to
+# agitated or shouted speech: (value mapped to 0, value mapped to 1)
+ENERGY_DB_RANGE = (-40.0, -10.0)
+ZCR_RANGE = (0.03, 0.20)
+PITCH_STD_RANGE = (10.0, 60.0)
+STRESS_WEIGHTS = (0.4, 0.3, 0.3)
 
 class VoiceAnalyzer:
     def __init__(self):
         self.recognizer = sr.Recognizer()
-        self.microphone = None
-        # Lazy initialization of microphone to avoid crash if not available
-        try:
-            self.microphone = sr.Microphone()
-        except Exception as e:
-            print(f"Warning: Could not initialize microphone: {e}")
-            print("Voice analysis will rely on browser-based speech recognition.")
+        self._microphone = None
+        self._microphone_checked = False
+    
+    @property
+    def microphone(self):
+        """Microphone, probed on first use so creating the analyzer stays cheap"""
+        if not self._microphone_checked:
+            self._microphone_checked = True
+            # Lazy initialization of microphone to avoid crash if not available
+            try:
+                self._microphone = sr.Microphone()
+            except Exception as e:
+                logger.warning("Could not initialize microphone: %s. "
+                               "Voice analysis will rely on browser-based speech recognition.", e)
+        return self._microphone
     
     def analyze_voice_tone(self, duration=5):
         """Analyze voice tone and extract features"""
@@ -27,9 +46,9 @@ class VoiceAnalyzer:
         
         try:
             with self.microphone as source:
-                print("Adjusting for ambient noise...")
+                logger.info("Adjusting for ambient noise...")
                 self.recognizer.adjust_for_ambient_noise(source)
-                print("Listening... Please speak for analysis")
+                logger.info("Listening... Please speak for analysis")
                 
                 # Record audio
                 audio = self.recognizer.listen(source, timeout=duration)
@@ -37,45 +56,82 @@ class VoiceAnalyzer:
                 # Convert to text
                 try:
                     text = self.recognizer.recognize_google(audio)
-                    print(f"Recognized text: {text}")
+                    logger.debug("Recognized text: %s", text)
                 except sr.UnknownValueError:
                     text = "Could not understand audio"
                 except sr.RequestError:
                     text = "Error with speech recognition service"
                 
-                # Analyze audio features (simplified)
-                audio_data = np.frombuffer(audio.get_raw_data(), dtype=np.int16)
-                
-                # Basic audio analysis
-                energy = np.sum(audio_data ** 2)
-                zero_crossing_rate = np.sum(np.diff(np.sign(audio_data)) != 0)
-                
-                # Estimate stress level based on energy and zero crossing rate
-                stress_level = self.estimate_stress_level(energy, zero_crossing_rate)
-                
-                return {
-                    'text': text,
-                    'energy_level': float(energy),
-                    'zero_crossing_rate': int(zero_crossing_rate),
-                    'estimated_stress': stress_level,
-                    'timestamp': datetime.now().isoformat()
-                }
+                # Analyze audio features (float conversion avoids int16 overflow)
+                audio_data = pcm_to_float(np.frombuffer(audio.get_raw_data(), dtype=np.int16))
+                result = self.analyze_audio(audio_data, audio.sample_rate)
+                result['text'] = text
+                return result
                 
         except Exception as e:
-            print(f"Error in voice analysis: {e}")
+            logger.error("Error in voice analysis: %s", e)
             return None
     
-    def estimate_stress_level(self, energy, zcr):
-        """Estimate stress level based on audio features"""
-        # Simplified stress estimation
-        normalized_energy = min(energy / 1000000, 10)  # Normalize energy
-        normalized_zcr = min(zcr / 1000, 10)  # Normalize ZCR
+    def analyze_audio(self, samples, sample_rate):
+        """
+        Extract voice features from raw samples and estimate stress
         
-        stress_score = (normalized_energy + normalized_zcr) / 2
+        Args:
+            samples: Mono float samples in [-1, 1]
+            sample_rate: Sampling rate in Hz
+            
+        Returns:
+            dict: Stress level, energy level (0-100) and the feature statistics
+        """
+        with timed('audio_features'):
+            features = analyze_samples(samples, sample_rate)
+        stress_level = self.estimate_stress_level(
+            features['rms_db_mean'], features['zcr_mean'], features['pitch_std']
+        )
         
-        if stress_score < 2:
+        return {
+            'energy_level': self.energy_level(features['rms_db_mean']),
+            'zero_crossing_rate': features['zcr_mean'],
+            'estimated_stress': stress_level,
+            'features': features,
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def analyze_audio_file(self, audio_bytes):
+        """Decode an uploaded audio file (WAV, or any format librosa can read) and analyze it"""
+        with timed('audio_decode'):
+            samples, sample_rate = decode_audio(audio_bytes)
+        return self.analyze_audio(samples, sample_rate)
+    
+    @staticmethod
+    def energy_level(energy_db):
+        """Map mean frame loudness (dBFS) onto a 0-100 scale"""
+        return 100.0 * _normalize(energy_db, ENERGY_DB_RANGE)
+    
+    def estimate_stress_level(self, energy_db, zcr, pitch_std=0.0):
+        """
+        Estimate stress level from calibrated audio statistics
+        
+        Args:
+            energy_db: Mean RMS energy of non-silent frames in dBFS
+            zcr: Mean zero-crossing rate (crossings per sample)
+            pitch_std: Standard deviation of the voiced pitch in Hz
+        """
+        weights = STRESS_WEIGHTS
+        stress_score = 10 * (
+            weights[0] * _normalize(energy_db, ENERGY_DB_RANGE)
+            + weights[1] * _normalize(zcr, ZCR_RANGE)
+            + weights[2] * _normalize(pitch_std, PITCH_STD_RANGE)
+        )
+        
+        if stress_score < 3.5:
             return "Low"
-        elif stress_score < 5:
+        elif stress_score < 6.5:
             return "Medium"
         else:
-            return "High"
\ No newline at end of file
+            return "High"
+
+
+def _normalize(value, value_range):
+    low, high = value_range
+    return float(min(1.0, max(0.0, (value - low) / (high - low))))
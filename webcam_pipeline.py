@@ -0,0 +1,212 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+from emotion_aggregator import EmotionAggregator
+
+logger = logging.getLogger(__name__)
+
+# Camera index (or video URL/path) read by analyze_webcam_emotion
+WEBCAM_DEVICE = os.environ.get('WEBCAM_DEVICE', '0')
+# Frames analyzed per second across all inference workers (0 for as many as they can)
+WEBCAM_TARGET_FPS = float(os.environ.get('WEBCAM_TARGET_FPS', 5))
+WEBCAM_INFERENCE_WORKERS = int(os.environ.get('WEBCAM_INFERENCE_WORKERS', 1))
+# Consecutive failed reads after which the camera is given up on
+WEBCAM_MAX_READ_FAILURES = int(os.environ.get('WEBCAM_MAX_READ_FAILURES', 50))
+WEBCAM_READ_RETRY_SECONDS = 0.05
+
+
+def open_camera(device=WEBCAM_DEVICE):
+    """Open a camera by index ('0') or a video file / stream URL"""
+    capture = cv2.VideoCapture(int(device) if str(device).isdigit() else device)
+    # Keep the driver from queueing frames that would only go stale
+    capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return capture
+
+
+class WebcamPipeline:
+    """Capture thread plus rate-limited inference workers for a live camera
+
+    The capture thread reads frames as fast as the camera delivers them and
+    keeps only the newest one, so the driver's buffer never fills with stale
+    frames while the model runs. Inference workers take the newest frame
+    they have not seen yet, at most ``target_fps`` times per second in
+    total, and pass each result to ``on_result``. Frames replaced before any
+    worker took them are counted as dropped.
+    """
+
+    def __init__(self, capture, analyze_fn, on_result, target_fps=WEBCAM_TARGET_FPS,
+                 workers=WEBCAM_INFERENCE_WORKERS, max_read_failures=WEBCAM_MAX_READ_FAILURES):
+        self.capture = capture
+        self.analyze_fn = analyze_fn
+        self.on_result = on_result
+        self.interval = 1.0 / target_fps if target_fps > 0 else 0.0
+        self.target_fps = target_fps
+        self.workers = max(1, int(workers))
+        self.max_read_failures = max(1, int(max_read_failures))
+
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._frame = None
+        self._frame_time = None
+        self._frame_seq = 0
+        self._taken_seq = 0
+        self._next_due = 0.0
+
+        self.captured = 0
+        self.analyzed = 0
+        self.dropped = 0
+        self.read_failures = 0
+        self.errors = 0
+        self._latency_total = 0.0
+
+    def run(self, duration):
+        """Run for `duration` seconds (or until the camera fails) and return stats()"""
+        start = time.monotonic()
+        threads = [threading.Thread(target=self._capture_loop, name='webcam-capture', daemon=True)]
+        threads += [threading.Thread(target=self._inference_loop, name=f'webcam-inference-{i}', daemon=True)
+                    for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        self._stop.wait(duration)
+        self.stop()
+        for thread in threads:
+            thread.join()
+        return self.stats(time.monotonic() - start)
+
+    def stop(self):
+        with self._cond:
+            self._stop.set()
+            self._cond.notify_all()
+
+    def stats(self, elapsed):
+        elapsed = max(elapsed, 1e-9)
+        return {
+            'seconds': elapsed,
+            'frames_captured': self.captured,
+            'frames_analyzed': self.analyzed,
+            'frames_dropped': self.dropped,
+            'read_failures': self.read_failures,
+            'errors': self.errors,
+            'capture_fps': self.captured / elapsed,
+            'achieved_fps': self.analyzed / elapsed,
+            'target_fps': self.target_fps or None,
+            # Capture to result, i.e. how old a result's frame is when it arrives
+            'mean_latency_ms': 1000.0 * self._latency_total / self.analyzed if self.analyzed else None,
+            'workers': self.workers
+        }
+
+    def _capture_loop(self):
+        consecutive_failures = 0
+        while not self._stop.is_set():
+            ok, frame = self.capture.read()
+            if not ok:
+                self.read_failures += 1
+                consecutive_failures += 1
+                if consecutive_failures >= self.max_read_failures:
+                    logger.error("Camera returned no frame %d times in a row; stopping", consecutive_failures)
+                    self.stop()
+                    return
+                # Back off instead of spinning on a camera that is not ready
+                self._stop.wait(WEBCAM_READ_RETRY_SECONDS)
+                continue
+
+            consecutive_failures = 0
+            with self._cond:
+                if self._frame_seq > self._taken_seq:
+                    self.dropped += 1
+                self._frame = frame
+                self._frame_time = time.monotonic()
+                self._frame_seq += 1
+                self.captured += 1
+                self._cond.notify()
+
+    def _inference_loop(self):
+        while self._wait_for_slot():
+            with self._cond:
+                while self._frame_seq == self._taken_seq and not self._stop.is_set():
+                    self._cond.wait()
+                if self._stop.is_set():
+                    return
+                frame, frame_time = self._frame, self._frame_time
+                self._taken_seq = self._frame_seq
+
+            try:
+                result = self.analyze_fn(frame)
+            except Exception as e:
+                with self._cond:
+                    self.errors += 1
+                logger.warning("Error analyzing frame: %s", e)
+                continue
+
+            with self._cond:
+                self.analyzed += 1
+                self._latency_total += time.monotonic() - frame_time
+            self.on_result(result)
+
+    def _wait_for_slot(self):
+        # Slots are handed out on one shared schedule, so the workers together
+        # stay at target_fps however many of them there are
+        with self._cond:
+            now = time.monotonic()
+            slot = max(self._next_due, now)
+            self._next_due = slot + self.interval
+        return not self._stop.wait(slot - now) if slot > now else not self._stop.is_set()
+
+
+def analyze_webcam(detector, duration=10, device=WEBCAM_DEVICE, target_fps=WEBCAM_TARGET_FPS,
+                   workers=WEBCAM_INFERENCE_WORKERS):
+    """
+    Analyze emotion from a camera over a specified duration
+
+    Args:
+        detector: Emotion detector with analyze_image()
+        duration: Duration in seconds to analyze
+        device: Camera index or video source (see open_camera)
+        target_fps: Frames analyzed per second (0 for as many as possible)
+        workers: Inference threads
+
+    Returns:
+        dict: 'dominant_emotion', 'emotion_percentages', 'total_detections',
+        'session_timestamp' and the pipeline's frame and FPS counts under
+        'pipeline', or None if the camera could not be opened or no frame
+        was analyzed
+    """
+    capture = open_camera(device)
+    if not capture.isOpened():
+        logger.error("Could not open webcam")
+        return None
+
+    logger.info("Analyzing emotion for %s seconds...", duration)
+    aggregator = EmotionAggregator(capacity=4096, labels=detector.labels)
+    pipeline = WebcamPipeline(
+        capture,
+        analyze_fn=lambda frame: detector.analyze_image(frame, client_id='webcam', max_faces=1),
+        on_result=lambda result: aggregator.update(result['emotion_percentages']),
+        target_fps=target_fps,
+        workers=workers
+    )
+    try:
+        stats = pipeline.run(duration)
+    finally:
+        capture.release()
+
+    logger.info("Webcam analysis: %d frames analyzed (%.1f fps), %d captured, %d dropped",
+                stats['frames_analyzed'], stats['achieved_fps'], stats['frames_captured'], stats['frames_dropped'])
+    if aggregator.count == 0:
+        return None
+
+    # Session averages come straight from the running totals
+    emotion_percentages = aggregator.summary()['session']
+    return {
+        'dominant_emotion': max(emotion_percentages, key=emotion_percentages.get),
+        'emotion_percentages': emotion_percentages,
+        'total_detections': aggregator.count,
+        'session_timestamp': datetime.now().isoformat(),
+        'pipeline': stats
+    }